@@ -1,37 +1,102 @@
 import com.atlassian.jira.component.ComponentAccessor
+import com.atlassian.jira.issue.customfields.option.Option
+import com.atlassian.jira.user.ApplicationUser
 import groovy.json.JsonOutput
+import java.net.HttpURLConnection
 import java.net.URL
 import java.nio.charset.StandardCharsets
+import java.text.SimpleDateFormat
 
 // куда отправляем
 final String BOT_URL = "http://localhost:8081/jira-webhook"
+// = JIRA_WEBHOOK_SECRET бота; пусто — заголовок не отправляется
+final String WEBHOOK_SECRET = ""
+// листенер выполняется в потоке Jira: бот не должен его задерживать
+final int CONNECT_TIMEOUT_MS = 2000
+final int READ_TIMEOUT_MS = 3000
+
+// поля карточки и маршрутизации (app/formatters.py: FIELD_ID и DEPARTMENT_FIELD_ID);
+// если какого-то поля нет в payload, бот перечитает задачу из Jira
+final List<String> FIELD_IDS = [
+  "customfield_10100", // Отдел
+  "customfield_10201", // Лицензии
+  "customfield_10205", // Система
+  "customfield_10208", // Актуальные скрипты
+  "customfield_10202", // Вендоры
+  "customfield_10207", // Инструкция
+  "customfield_10203", // Контакты поставщиков
+  "customfield_10204", // Ответственные
+  "customfield_10206", // Ссылки на документацию
+]
+
+// значения — в том же виде, что отдаёт REST API Jira (/rest/api/2/issue)
+def jiraTime = { Date d -> d ? new SimpleDateFormat("yyyy-MM-dd'T'HH:mm:ss.SSSZ").format(d) : null }
+def toRest
+toRest = { value ->
+  if (value == null) return null
+  if (value instanceof Option) return [value: value.value, id: value.optionId?.toString()]
+  if (value instanceof ApplicationUser) return [
+    name: value.username, key: value.key, displayName: value.displayName,
+    emailAddress: value.emailAddress, active: value.active,
+  ]
+  if (value instanceof Collection) return value.collect { toRest(it) }
+  if (value instanceof Date) return jiraTime(value)
+  return value.toString()
+}
 
-// достаём значение поля "Отдел"
 def cfm = ComponentAccessor.getCustomFieldManager()
-def deptCf = cfm.getCustomFieldObject("customfield_10100") // <-- замени, если у тебя другой ID
-def deptVal = issue.getCustomFieldValue(deptCf)
-def dept = (deptVal?.hasProperty('value')) ? deptVal.value : (deptVal?.toString())
+def fields = [
+  updated: jiraTime(issue.updated),
+  status : issue.status ? [name: issue.status.name, id: issue.status.id] : null,
+]
+FIELD_IDS.each { id ->
+  def cf = cfm.getCustomFieldObject(id)
+  if (cf != null) {
+    fields[id] = toRest(issue.getCustomFieldValue(cf))
+  }
+}
+
+// что именно поменялось (для IssueCreated changelog пустой)
+def changeItems = (event?.changeLog?.getRelated("ChildChangeItem") ?: []).collect { gv ->
+  [
+    field     : gv.getString("field"),
+    fieldtype : gv.getString("fieldtype"),
+    from      : gv.getString("oldvalue"),
+    fromString: gv.getString("oldstring"),
+    to        : gv.getString("newvalue"),
+    toString  : gv.getString("newstring"),
+  ]
+}
 
-// соберём payload в формате, который бот понимает
+// v: 2 — issue содержит все поля карточки, бот не запрашивает задачу из Jira
 def payload = [
-  issue: [
-    key   : issue.key,
-    fields: [
-      // сервер поймёт и строку, и объект {value: "..."}
-      (deptCf.id): dept ? [value: dept] : null
-    ]
-  ],
-  webhookEvent: event?.getClass()?.simpleName ?: "Unknown"
+  v           : 2,
+  issue       : [id: issue.id?.toString(), key: issue.key, fields: fields],
+  changelog   : [items: changeItems],
+  webhookEvent: event?.getClass()?.simpleName ?: "Unknown",
 ]
 
-def conn = new URL(BOT_URL).openConnection()
-conn.setRequestMethod("POST")
-conn.setDoOutput(true)
-conn.setRequestProperty("Content-Type", "application/json; charset=UTF-8")
+HttpURLConnection conn = null
+try {
+  conn = (HttpURLConnection) new URL(BOT_URL).openConnection()
+  conn.setConnectTimeout(CONNECT_TIMEOUT_MS)
+  conn.setReadTimeout(READ_TIMEOUT_MS)
+  conn.setRequestMethod("POST")
+  conn.setDoOutput(true)
+  conn.setRequestProperty("Content-Type", "application/json; charset=UTF-8")
+  if (WEBHOOK_SECRET) {
+    conn.setRequestProperty("X-Webhook-Secret", WEBHOOK_SECRET)
+  }
 
-def bytes = JsonOutput.toJson(payload).getBytes(StandardCharsets.UTF_8)
-conn.getOutputStream().write(bytes)
+  def bytes = JsonOutput.toJson(payload).getBytes(StandardCharsets.UTF_8)
+  conn.getOutputStream().withCloseable { it.write(bytes) }
 
-int code = conn.getResponseCode()
-// можно посмотреть в журнале ScriptRunner, что вернул бот
-log.info("IT-Registry: webhook -> ${BOT_URL} responded HTTP ${code}")
+  int code = conn.getResponseCode()
+  // можно посмотреть в журнале ScriptRunner, что вернул бот
+  log.info("IT-Registry: webhook ${issue.key} -> ${BOT_URL} responded HTTP ${code}")
+} catch (IOException e) {
+  // бот недоступен или не ответил вовремя — изменение подберёт сверка (RECONCILE_INTERVAL_SEC)
+  log.warn("IT-Registry: webhook ${issue.key} -> ${BOT_URL} failed: ${e}")
+} finally {
+  conn?.disconnect()
+}
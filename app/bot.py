@@ -1,16 +1,42 @@
 # -*- coding: utf-8 -*-
 from __future__ import annotations
 
-from telegram.ext import ApplicationBuilder
+from telegram.ext import Application, ApplicationBuilder
 from telegram.request import HTTPXRequest
 
-from .config import TELEGRAM_BOT_TOKEN
+from .config import TELEGRAM_BOT_TOKEN, TELEGRAM_API_BASE
+from .settings import TG_SEND_WORKERS
 from .handlers import register
+from . import runtime
+from .tracing import span
+
+
+class _TracedRequest(HTTPXRequest):
+    """Вызовы Bot API попадают в trace текущего апдейта (span 'telegram <метод>')."""
+
+    async def do_request(self, url: str, method: str, *args, **kwargs):
+        with span(f"telegram {url.rsplit('/', 1)[-1]}"):
+            return await super().do_request(url, method, *args, **kwargs)
+
+
+async def _post_init(app: Application) -> None:
+    # используется только при запуске через run_polling/run_webhook
+    await runtime.startup(app)
+
+
+async def _post_shutdown(app: Application) -> None:
+    await runtime.shutdown(app)
+
+
+# соединения сверх воркеров рассылки — для ответов обработчиков команд
+_HANDLER_CONNECTIONS = 8
 
 
 def build_application():
-    # используем HTTPXRequest с явными таймаутами и HTTP/1.1
-    request = HTTPXRequest(
+    # используем HTTPXRequest с явными таймаутами и HTTP/1.1;
+    # по соединению на воркер notifier, иначе рассылка идёт по одному сообщению
+    request = _TracedRequest(
+        connection_pool_size=max(1, TG_SEND_WORKERS) + _HANDLER_CONNECTIONS,
         connect_timeout=30.0,
         read_timeout=60.0,
         write_timeout=60.0,
@@ -21,7 +47,10 @@ def build_application():
     app = (
         ApplicationBuilder()
         .token(TELEGRAM_BOT_TOKEN)
+        .base_url(TELEGRAM_API_BASE)
         .request(request)
+        .post_init(_post_init)
+        .post_shutdown(_post_shutdown)
         .build()
     )
 
@@ -0,0 +1,132 @@
+# -*- coding: utf-8 -*-
+"""
+Автоматический выключатель (circuit breaker) для запросов к Jira.
+
+closed    — запросы идут как обычно; failures ошибок подряд (сеть, таймаут,
+            5xx, 429) переводят в open;
+open      — запросы сразу отклоняются CircuitOpenError, не дожидаясь
+            HTTP_TIMEOUT; через reset_after секунд — half_open;
+half_open — пропускается один пробный запрос: успех -> closed, ошибка -> open,
+            остальные запросы пока отклоняются.
+
+CircuitOpenError — разновидность httpx.TransportError, поэтому код, который
+уже обрабатывает недоступность Jira (httpx.RequestError), ловит и её.
+"""
+from __future__ import annotations
+import logging
+import threading
+import time
+from typing import Any, Dict, Optional
+
+import httpx
+
+log = logging.getLogger("it_registry.breaker")
+
+CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+# значение метрики состояния
+STATE_CODE = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+
+class CircuitOpenError(httpx.TransportError):
+    pass
+
+
+class CircuitBreaker:
+    def __init__(self, name: str, failures: int, reset_after: float):
+        self.name = name
+        self.failures = failures
+        self.reset_after = reset_after
+        self._lock = threading.Lock()
+        self._state = CLOSED
+        self._consecutive = 0
+        self._opened_at = 0.0
+        self._probe = False
+        self._last_error = ""
+        self.rejected = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.failures > 0
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._state
+
+    def _set(self, state: str) -> None:
+        # вызывается под self._lock
+        old, self._state = self._state, state
+        if state == OPEN:
+            self._opened_at = time.monotonic()
+            log.warning("%s circuit %s -> open after %s consecutive failures (last: %s); "
+                        "failing fast for %.0fs", self.name, old, self._consecutive,
+                        self._last_error or "?", self.reset_after)
+        elif state == HALF_OPEN:
+            log.info("%s circuit open -> half_open: probing", self.name)
+        else:
+            log.info("%s circuit %s -> closed: %s is back", self.name, old, self.name)
+
+    def before(self, request: Optional[httpx.Request] = None) -> bool:
+        """
+        Перед запросом; CircuitOpenError — запрос не отправлять.
+        True — это пробный запрос half_open, его итог передаётся в record(probe=True).
+        """
+        if not self.enabled:
+            return False
+        with self._lock:
+            if self._state == CLOSED:
+                return False
+            if self._state == OPEN:
+                left = self._opened_at + self.reset_after - time.monotonic()
+                if left > 0:
+                    self.rejected += 1
+                    raise CircuitOpenError(
+                        f"{self.name} unavailable (circuit open, next probe in {left:.0f}s)",
+                        request=request,
+                    )
+                self._set(HALF_OPEN)
+            if self._probe:
+                self.rejected += 1
+                raise CircuitOpenError(f"{self.name} unavailable (circuit half-open, probing)",
+                                       request=request)
+            self._probe = True
+            return True
+
+    def record(self, ok: Optional[bool], error: str = "", probe: bool = False) -> None:
+        """
+        Итог запроса: True/False; None — запрос прерван, результат неизвестен.
+        probe — значение, которое вернул before() для этого запроса.
+        """
+        if not self.enabled:
+            return
+        with self._lock:
+            if probe:
+                self._probe = False
+            if ok is None:
+                return
+            # вне closed состояние меняет только пробный запрос; запросы,
+            # отправленные ещё до размыкания, завершаются позже и не в счёт
+            if self._state != CLOSED and not probe:
+                return
+            if ok:
+                self._consecutive = 0
+                if self._state != CLOSED:
+                    self._set(CLOSED)
+                return
+            self._consecutive += 1
+            self._last_error = error
+            if self._state == HALF_OPEN or self._consecutive >= self.failures:
+                self._set(OPEN)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            out: Dict[str, Any] = {
+                "state": self._state,
+                "consecutive_failures": self._consecutive,
+                "rejected": self.rejected,
+            }
+            if self._state == OPEN:
+                out["next_probe_in"] = round(max(0.0, self._opened_at + self.reset_after - time.monotonic()), 1)
+            if self._last_error:
+                out["last_error"] = self._last_error
+            return out
@@ -0,0 +1,108 @@
+# -*- coding: utf-8 -*-
+"""
+Что изменилось в карточке задачи с прошлого уведомления.
+
+Для каждой задачи помним отпечаток последней разосланной версии — по
+короткому хэшу видимого текста каждого поля карточки (formatters.card_values:
+отдел, статус, CARD_FIELDS_ORDER). Правка поля, которого нет в карточке,
+комментарий или ворклог дают тот же отпечаток — уведомление не нужно.
+
+Отпечатка нет (перезапуск, задача давно не менялась) — сравниваем с
+предыдущей версией из зеркала, а если нет и её — смотрим changelog вебхука.
+"""
+from __future__ import annotations
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, List, Optional
+
+from .settings import CARD_FINGERPRINTS_SIZE
+from .formatters import FIELD_ID, DEPARTMENT_FIELD_ID, card_values
+from .issue_cache import updated_at
+from . import fields
+
+_lock = threading.Lock()
+# key -> {подпись поля: хэш текста}
+_prints: "OrderedDict[str, Dict[str, bytes]]" = OrderedDict()
+
+
+def fingerprint(issue: Dict[str, Any]) -> Dict[str, bytes]:
+    return {label: hashlib.blake2b(text.encode("utf-8"), digest_size=8).digest()
+            for label, text in card_values(issue).items()}
+
+
+def _diff(old: Dict[str, bytes], new: Dict[str, bytes]) -> List[str]:
+    return [label for label in new if old.get(label) != new[label]] + \
+        [label for label in old if label not in new]
+
+
+def known(key: str) -> bool:
+    with _lock:
+        return key in _prints
+
+
+def remember(key: str, fp: Dict[str, bytes]) -> None:
+    if CARD_FINGERPRINTS_SIZE <= 0:
+        return
+    with _lock:
+        _prints[key] = fp
+        _prints.move_to_end(key)
+        while len(_prints) > CARD_FINGERPRINTS_SIZE:
+            _prints.popitem(last=False)
+
+
+def _label_of_change(item: Dict[str, Any]) -> Optional[str]:
+    """Пункт changelog -> подпись поля карточки (None — поле в карточке не видно)."""
+    fid = item.get("fieldId") or fields.id_of(item.get("field") or "")
+    name = (item.get("field") or "").strip().lower()
+    if fid == "status" or name == "status":
+        return "Статус"
+    if fid == DEPARTMENT_FIELD_ID or name == "отдел":
+        return "Отдел"
+    for label, label_fid in FIELD_ID.items():
+        if fid == label_fid or name == label.lower():
+            return label
+    return None
+
+
+def _from_changelog(items: Iterable[Dict[str, Any]]) -> Optional[List[str]]:
+    items = list(items)
+    if not items:
+        return None
+    visible = card_values({})   # подписи полей текущего плана карточки
+    labels: List[str] = []
+    for it in items:
+        label = _label_of_change(it)
+        if label is not None and label in visible and label not in labels:
+            labels.append(label)
+    return labels
+
+
+def changed_fields(issue: Dict[str, Any], previous: Optional[Dict[str, Any]] = None,
+                   changelog: Iterable[Dict[str, Any]] = (),
+                   new: Optional[Dict[str, bytes]] = None) -> Optional[List[str]]:
+    """
+    Подписи изменённых полей карточки.
+    [] — карточка не изменилась; None — сравнить не с чем (уведомляем как раньше).
+    previous — прошлая версия задачи (из зеркала), берётся, только если она старше issue.
+    new — уже посчитанный fingerprint(issue). Новый отпечаток не запоминается:
+    это делает вызывающий через remember(), когда уведомление отправлено
+    (или сознательно пропущено), — иначе сбой рассылки «съел» бы изменение.
+    """
+    key = issue.get("key") or ""
+    if new is None:
+        new = fingerprint(issue)
+    with _lock:
+        old = _prints.get(key)
+    if old is not None:
+        return _diff(old, new)
+    if previous is not None:
+        old_ts, new_ts = updated_at(previous), updated_at(issue)
+        if old_ts is not None and new_ts is not None and old_ts < new_ts:
+            return _diff(fingerprint(previous), new)
+    return _from_changelog(changelog)
+
+
+def stats() -> Dict[str, Any]:
+    with _lock:
+        return {"size": len(_prints), "max_size": CARD_FINGERPRINTS_SIZE}
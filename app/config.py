@@ -1,6 +1,18 @@
 import os
 
 TELEGRAM_BOT_TOKEN = os.getenv("TELEGRAM_BOT_TOKEN", "")
+# Адрес Bot API (свой telegram-bot-api сервер или фейк из tools/bench.py)
+TELEGRAM_API_BASE = os.getenv("TELEGRAM_API_BASE", "https://api.telegram.org/bot")
+
+# Получение апдейтов Telegram: "polling" (по умолчанию) или "webhook".
+# В режиме webhook апдейты приходят на TG_WEBHOOK_PATH в FastAPI-приложении;
+# если задан TG_WEBHOOK_URL (публичный https-адрес этого пути), бот сам
+# регистрирует вебхук в Telegram, иначе ждёт апдейты от локального стенда
+# (tools/tg_webhook_standin.py). Не удалось зарегистрировать — работаем через polling.
+TG_MODE = os.getenv("TG_MODE", "polling").lower()
+TG_WEBHOOK_URL = os.getenv("TG_WEBHOOK_URL", "")
+TG_WEBHOOK_PATH = os.getenv("TG_WEBHOOK_PATH", "/telegram-webhook")
+TG_WEBHOOK_SECRET = os.getenv("TG_WEBHOOK_SECRET", "")
 JIRA_BASE_URL = os.getenv("JIRA_BASE_URL", "http://localhost:8080").rstrip("/")
 PUBLIC_JIRA_BASE_URL = os.getenv("PUBLIC_JIRA_BASE_URL", "http://localhost:8080").rstrip("/")
 JIRA_USERNAME = os.getenv("JIRA_USERNAME", "")
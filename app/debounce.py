@@ -0,0 +1,83 @@
+# -*- coding: utf-8 -*-
+"""
+Склейка всплесков событий по ключу (debounce).
+
+События одного ключа, пришедшие в пределах окна window, схлопываются
+в один вызов callback. Каждое новое событие продлевает окно, но не дальше
+max_wait от первого события — непрерывно редактируемая запись всё равно
+будет обработана.
+
+merge(старый, новый) решает, какой payload получит callback
+(по умолчанию — последний).
+"""
+from __future__ import annotations
+import asyncio
+import logging
+import time
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+log = logging.getLogger("it_registry.debounce")
+
+
+@dataclass
+class _Pending:
+    first: float
+    deadline: float
+    count: int = 0
+    payload: Any = None
+    task: Optional[asyncio.Task] = field(default=None, repr=False)
+
+
+class KeyedDebouncer:
+    def __init__(self, window: float, max_wait: float,
+                 callback: Callable[[str, Any, int], Awaitable[None]],
+                 merge: Optional[Callable[[Any, Any], Any]] = None):
+        self.window = window
+        self.max_wait = max(window, max_wait)
+        self.callback = callback
+        self.merge = merge
+        self._pending: Dict[str, _Pending] = {}
+
+    def push(self, key: str, payload: Any = None) -> None:
+        """Зарегистрировать событие; callback(key, payload, count) вызовется позже."""
+        now = time.monotonic()
+        p = self._pending.get(key)
+        if p is None:
+            p = self._pending[key] = _Pending(first=now, deadline=now)
+            p.task = asyncio.get_running_loop().create_task(self._run(key, p))
+        p.deadline = min(now + self.window, p.first + self.max_wait)
+        if p.count and self.merge is not None:
+            payload = self.merge(p.payload, payload)
+        p.count += 1
+        p.payload = payload
+
+    def pending(self) -> int:
+        return len(self._pending)
+
+    async def _run(self, key: str, p: _Pending) -> None:
+        # дедлайн только сдвигается вперёд — досыпаем, пока он не наступит
+        while True:
+            delay = p.deadline - time.monotonic()
+            if delay <= 0:
+                break
+            await asyncio.sleep(delay)
+        await self._fire(key, p)
+
+    async def _fire(self, key: str, p: _Pending) -> None:
+        if self._pending.get(key) is p:
+            del self._pending[key]
+        if p.count > 1:
+            log.info("Coalesced %s events for %s", p.count, key)
+        try:
+            await self.callback(key, p.payload, p.count)
+        except Exception as e:
+            log.exception("Debounced handler failed for %s: %s", key, e)
+
+    async def drain(self) -> None:
+        """Немедленно обработать всё накопленное (при остановке приложения)."""
+        items = list(self._pending.items())
+        for _, p in items:
+            if p.task is not None:
+                p.task.cancel()
+        await asyncio.gather(*(self._fire(k, p) for k, p in items))
@@ -0,0 +1,121 @@
+# -*- coding: utf-8 -*-
+"""
+Каталог полей Jira (id <-> имя) из /rest/api/2/field.
+
+Загружается один раз при старте и обновляется в фоне (FIELD_CATALOG_TTL).
+Заменяет expand=names в каждом запросе задачи и даёт handlers/formatters
+настоящие ID полей по их названиям вместо значений «на глаз» в FIELD_ID.
+"""
+from __future__ import annotations
+import asyncio
+import logging
+import threading
+import time
+from typing import Dict, Optional
+
+from .settings import FIELD_CATALOG_TTL
+from .jira_client import list_fields
+from . import formatters, store, values_index
+
+log = logging.getLogger("it_registry.fields")
+
+_lock = threading.Lock()
+_id_to_name: Dict[str, str] = {}
+_name_to_id: Dict[str, str] = {}   # имя в нижнем регистре -> id (только однозначные)
+_loaded_at: float = 0.0
+
+_refresher: Optional[asyncio.Task] = None
+
+
+def is_loaded() -> bool:
+    return bool(_loaded_at)
+
+
+def name_of(field_id: str) -> Optional[str]:
+    with _lock:
+        return _id_to_name.get(field_id)
+
+
+def id_of(name: str) -> Optional[str]:
+    with _lock:
+        return _name_to_id.get((name or "").strip().lower())
+
+
+def names() -> Dict[str, str]:
+    """Копия карты id -> имя (аналог issue['names'] при expand=names)."""
+    with _lock:
+        return dict(_id_to_name)
+
+
+async def refresh() -> None:
+    global _loaded_at
+    items = await list_fields()
+    id_to_name: Dict[str, str] = {}
+    by_name: Dict[str, list] = {}
+    for f in items:
+        fid, fname = f.get("id"), f.get("name")
+        if not fid or not isinstance(fname, str):
+            continue
+        id_to_name[fid] = fname
+        by_name.setdefault(fname.strip().lower(), []).append(fid)
+
+    name_to_id: Dict[str, str] = {}
+    for low, ids in by_name.items():
+        if len(ids) == 1:
+            name_to_id[low] = ids[0]
+    with _lock:
+        _id_to_name.clear()
+        _id_to_name.update(id_to_name)
+        _name_to_id.clear()
+        _name_to_id.update(name_to_id)
+        _loaded_at = time.time()
+
+    # ID полей карточки — по названиям из каталога
+    resolved: Dict[str, str] = {}
+    for label in formatters.FIELD_ID:
+        ids = by_name.get(label.lower()) or []
+        if len(ids) == 1:
+            resolved[label] = ids[0]
+        elif len(ids) > 1:
+            log.warning("Field name %r is ambiguous in Jira (%s), keeping %s",
+                        label, ", ".join(ids), formatters.FIELD_ID[label])
+    renamed = formatters.apply_field_ids(resolved)
+    if renamed:
+        # подписки и индекс значений хранят ID полей — переносим на новые
+        for old, new in renamed.items():
+            moved = store.rename_filter_field(old, new)
+            if moved:
+                log.info("Moved %s subscription filters from %s to %s", moved, old, new)
+        values_index.forget_fields(list(renamed))
+    log.info("Field catalogue loaded: %s fields, %s card labels resolved",
+             len(id_to_name), len(resolved))
+
+
+async def _refresh_loop() -> None:
+    while True:
+        try:
+            await refresh()
+            delay = FIELD_CATALOG_TTL
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            log.warning("Field catalogue refresh failed: %s", e)
+            delay = min(60.0, FIELD_CATALOG_TTL)
+        await asyncio.sleep(delay)
+
+
+def start_refresher() -> None:
+    global _refresher
+    if _refresher is None or _refresher.done():
+        _refresher = asyncio.get_running_loop().create_task(_refresh_loop())
+
+
+async def stop_refresher() -> None:
+    global _refresher
+    if _refresher is not None:
+        _refresher.cancel()
+        try:
+            await _refresher
+        except (asyncio.CancelledError, Exception):
+            pass
+        _refresher = None
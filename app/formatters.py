@@ -1,8 +1,13 @@
 # -*- coding: utf-8 -*-
-from typing import Any, Dict
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Tuple
 import logging
 import json
 import html
+import random
+import threading
+
+from .settings import LOG_PEOPLE_FIELD, OWNERS_LOG_SAMPLE, CARD_CACHE_SIZE
 
 log = logging.getLogger("it_registry.formatters")
 
@@ -22,6 +27,20 @@ FIELD_ID: Dict[str, str] = {
     "Ссылки на документацию": "customfield_10206",  # Текст/мультистрока
 }
 
+# Отдел -> какое поле используется вторым фильтром подписки (handlers и webhooks)
+DEPT_TO_LABEL: Dict[str, str] = {
+    "Закупки": "Лицензии",
+    "HelpDesk": "Система",
+}
+DEPT_TO_FIELD: Dict[str, str] = {d: FIELD_ID[label] for d, label in DEPT_TO_LABEL.items()}
+
+# Тип поля -> способ отрисовки (по умолчанию — текст)
+FIELD_TYPE: Dict[str, str] = {
+    "Лицензии":      "select",
+    "Система":       "select",
+    "Ответственные": "users",
+}
+
 # Порядок вывода полей в карточке
 CARD_FIELDS_ORDER = [
     "Система",
@@ -35,24 +54,36 @@ CARD_FIELDS_ORDER = [
 ]
 
 
+def _owners_debug(raw: Any) -> None:
+    """
+    Сырые данные поля «Ответственные» — только на DEBUG и для доли
+    рендеров OWNERS_LOG_SAMPLE, чтобы не сериализовать JSON на каждой рассылке.
+    """
+    if not LOG_PEOPLE_FIELD or not log.isEnabledFor(logging.DEBUG):
+        return
+    if random.random() >= OWNERS_LOG_SAMPLE:
+        return
+    try:
+        log.debug(
+            "OWNERS_RAW type=%s value=%s",
+            type(raw).__name__,
+            json.dumps(raw, ensure_ascii=False)[:2000],
+        )
+    except Exception as e:
+        log.debug("OWNERS_RAW cannot_dump type=%s error=%s", type(raw).__name__, e)
+
+
 def _render_value(raw: Any, field_id: str) -> str:
     """
     Нормализует значение поля для вывода в карточку.
-    Для «Ответственные» логируем сырые данные, чтобы видеть реальный формат из Jira.
+    Для «Ответственные» (выборочно) логируем сырые данные, чтобы видеть реальный формат из Jira.
     """
     if raw is None:
         return ""
 
     # Отладка формата поля «Ответственные»
     if field_id == FIELD_ID["Ответственные"]:
-        try:
-            log.info(
-                "OWNERS_RAW type=%s value=%s",
-                type(raw).__name__,
-                json.dumps(raw, ensure_ascii=False)[:2000],
-            )
-        except Exception as e:
-            log.info("OWNERS_RAW cannot_dump type=%s error=%s", type(raw).__name__, e)
+        _owners_debug(raw)
 
     # Списки (мультизначные поля, в т.ч. юзеры)
     if isinstance(raw, list):
@@ -78,20 +109,168 @@ def _render_value(raw: Any, field_id: str) -> str:
     return str(raw)
 
 
-def format_issue_card(issue: Dict[str, Any]) -> str:
+# ---- отрисовщики по типу поля: быстрый путь для ожидаемой формы значения ----
+
+def _render_text(raw: Any, field_id: str) -> str:
+    if isinstance(raw, str):
+        return raw
+    return _render_value(raw, field_id)
+
+
+def _render_select(raw: Any, field_id: str) -> str:
+    if isinstance(raw, dict):
+        return raw.get("value") or raw.get("name") or ""
+    return _render_value(raw, field_id)
+
+
+def _render_users(raw: Any, field_id: str) -> str:
+    _owners_debug(raw)
+    if isinstance(raw, list):
+        parts = []
+        for item in raw:
+            if isinstance(item, dict):
+                dn = item.get("displayName")
+                key = item.get("key") or item.get("name") or item.get("accountId")
+                if dn or key:
+                    parts.append(f"{dn or ''}{(' ('+key+')') if key else ''}".strip())
+                else:
+                    parts.append(str(item))
+            elif item:
+                parts.append(str(item))
+        return "\n".join([p for p in parts if p])
+    return _render_value(raw, field_id)
+
+
+_RENDERERS: Dict[str, Callable[[Any, str], str]] = {
+    "text": _render_text,
+    "select": _render_select,
+    "users": _render_users,
+}
+
+
+class _FieldPlan(NamedTuple):
+    label: str
+    field_id: str
+    inline_prefix: str   # "<b>Label:</b> " — уже экранировано
+    block_prefix: str    # "<b>Label:</b>\n"
+    render: Callable[[Any, str], str]
+
+
+_plan: List[_FieldPlan] = []
+
+
+def rebuild_render_plan() -> None:
+    """Скомпилировать план карточки по CARD_FIELDS_ORDER / FIELD_ID / FIELD_TYPE."""
+    plan = []
+    for label in CARD_FIELDS_ORDER:
+        field_id = FIELD_ID.get(label)
+        if not field_id:
+            continue
+        head = f"<b>{html.escape(label)}:</b>"
+        plan.append(_FieldPlan(
+            label, field_id, head + " ", head + "\n",
+            _RENDERERS.get(FIELD_TYPE.get(label, "text"), _render_text),
+        ))
+    _plan[:] = plan
+    clear_card_cache()
+
+
+# старый ID поля -> новый (после apply_field_ids): для кнопок, выданных до замены
+_renamed_ids: Dict[str, str] = {}
+
+
+def apply_field_ids(resolved: Dict[str, str]) -> Dict[str, str]:
     """
-    Собирает тело карточки (без заголовка и ссылки на KEY).
-    Заголовок и ссылка добавляются в handlers/webhooks.
+    Подставить реальные ID полей из каталога Jira (app.fields).
+    Словари меняются на месте — модули, импортировавшие FIELD_ID/DEPT_TO_FIELD,
+    видят новые значения. Возвращает заменённые ID: старый -> новый.
     """
-    f = issue.get("fields", {}) or {}
-    lines = []
+    changed = {label: fid for label, fid in resolved.items()
+               if label in FIELD_ID and FIELD_ID[label] != fid}
+    if not changed:
+        return {}
+    renamed: Dict[str, str] = {}
+    for label, fid in changed.items():
+        log.info("Field %r: %s -> %s (from Jira catalogue)", label, FIELD_ID[label], fid)
+        renamed[FIELD_ID[label]] = fid
+    FIELD_ID.update(changed)
+    DEPT_TO_FIELD.clear()
+    DEPT_TO_FIELD.update({d: FIELD_ID[label] for d, label in DEPT_TO_LABEL.items()})
+    for old, new in list(_renamed_ids.items()):
+        _renamed_ids[old] = renamed.get(new, new)
+    _renamed_ids.update(renamed)
+    rebuild_render_plan()
+    return renamed
 
-    # Отдел — жирный + подчёркнутый для значения
+
+def current_field_id(field_id: str) -> str:
+    """ID поля с учётом замен из каталога (для данных, сохранённых со старым ID)."""
+    return _renamed_ids.get(field_id, field_id)
+
+
+def label_of(field_id: str) -> Optional[str]:
+    """Подпись поля карточки по его ID."""
+    for label, fid in FIELD_ID.items():
+        if fid == field_id:
+            return label
+    return None
+
+
+def card_field_ids() -> List[str]:
+    """
+    Поля Jira, нужные карточке и маршрутизации уведомлений:
+    отдел, статус, updated (версия для кэшей), поля карточки и вторые фильтры.
+    """
+    out = ["status", "updated", DEPARTMENT_FIELD_ID]
+    out.extend(p.field_id for p in _plan)
+    out.extend(DEPT_TO_FIELD.values())
+    return list(dict.fromkeys(out))
+
+
+# ---- кэш готовых карточек: (key, updated) -> HTML ----
+
+_card_lock = threading.Lock()
+_card_cache: "OrderedDict[Tuple[str, str], str]" = OrderedDict()
+_card_hits = 0
+_card_misses = 0
+
+
+def clear_card_cache() -> None:
+    with _card_lock:
+        _card_cache.clear()
+
+
+def card_cache_stats() -> Dict[str, Any]:
+    with _card_lock:
+        total = _card_hits + _card_misses
+        return {
+            "size": len(_card_cache),
+            "hits": _card_hits,
+            "misses": _card_misses,
+            "hit_ratio": round(_card_hits / total, 4) if total else 0.0,
+        }
+
+
+def _cache_key(issue: Dict[str, Any]) -> Optional[Tuple[str, str]]:
+    key = issue.get("key")
+    updated = (issue.get("fields") or {}).get("updated")
+    if not key or not updated or CARD_CACHE_SIZE <= 0:
+        return None
+    return key, updated
+
+
+def _dept_text(f: Dict[str, Any]) -> str:
     dept_obj = f.get(DEPARTMENT_FIELD_ID)
     if isinstance(dept_obj, dict):
-        dept_val = dept_obj.get("value") or dept_obj.get("name") or ""
-    else:
-        dept_val = str(dept_obj or "")
+        return dept_obj.get("value") or dept_obj.get("name") or ""
+    return str(dept_obj or "")
+
+
+def _build_card(f: Dict[str, Any]) -> str:
+    lines = []
+
+    # Отдел — жирный + подчёркнутый для значения
+    dept_val = _dept_text(f)
     lines.append(f"<b>Отдел:</b> <u><b>{html.escape(dept_val)}</b></u>")
 
     # Статус
@@ -99,20 +278,65 @@ def format_issue_card(issue: Dict[str, Any]) -> str:
     if status:
         lines.append(f"<b>Статус:</b> {html.escape(str(status))}")
 
-    # Остальные поля по заданному порядку
-    for label in CARD_FIELDS_ORDER:
-        field_id = FIELD_ID.get(label)
-        if not field_id:
+    # Остальные поля по заранее скомпилированному плану
+    for p in _plan:
+        raw = f.get(p.field_id)
+        if raw is None:
             continue
-        raw = f.get(field_id)
-        text = _render_value(raw, field_id)
+        text = p.render(raw, p.field_id)
         if not text:
             continue
-
         safe_text = html.escape(text)
         if "\n" in text:
-            lines.append(f"<b>{html.escape(label)}:</b>\n{safe_text}")
+            lines.append(p.block_prefix + safe_text)
         else:
-            lines.append(f"<b>{html.escape(label)}:</b> {safe_text}")
+            lines.append(p.inline_prefix + safe_text)
 
     return "\n".join(lines)
+
+
+def card_values(issue: Dict[str, Any]) -> Dict[str, str]:
+    """
+    Подпись -> текст поля, как его показывает карточка: отдел, статус и поля
+    CARD_FIELDS_ORDER (пустая строка — поле не выводится). Для сравнения версий.
+    """
+    f = issue.get("fields", {}) or {}
+    out = {
+        "Отдел": _dept_text(f),
+        "Статус": str((f.get("status") or {}).get("name") or ""),
+    }
+    for p in _plan:
+        raw = f.get(p.field_id)
+        out[p.label] = p.render(raw, p.field_id) if raw is not None else ""
+    return out
+
+
+def format_issue_card(issue: Dict[str, Any]) -> str:
+    """
+    Собирает тело карточки (без заголовка и ссылки на KEY).
+    Заголовок и ссылка добавляются в handlers/webhooks.
+    Одна и та же версия задачи (key, updated) отрисовывается один раз —
+    рассылка на тысячи чатов берёт готовый HTML из кэша.
+    """
+    global _card_hits, _card_misses
+    ck = _cache_key(issue)
+    if ck is not None:
+        with _card_lock:
+            card = _card_cache.get(ck)
+            if card is not None:
+                _card_cache.move_to_end(ck)
+                _card_hits += 1
+                return card
+            _card_misses += 1
+
+    card = _build_card(issue.get("fields", {}) or {})
+
+    if ck is not None:
+        with _card_lock:
+            _card_cache[ck] = card
+            while len(_card_cache) > CARD_CACHE_SIZE:
+                _card_cache.popitem(last=False)
+    return card
+
+
+rebuild_render_plan()
@@ -0,0 +1,131 @@
+# -*- coding: utf-8 -*-
+"""
+Кэш членства в группах Jira для проверки прав /edit.
+
+Небольшая группа загружается целиком в множество и проверяется из памяти;
+по истечении GROUP_CACHE_TTL обновляется в фоне (пока идёт обновление,
+отвечаем по старому составу). Состав старше GROUP_CACHE_MAX_STALE (Jira
+долго недоступна) не используется: перечитываем его сразу, а если не
+вышло — отказываем, чтобы исключённый из группы не сохранял права.
+
+Если в группе больше GROUP_CACHE_MAX_MEMBERS участников, вместо выгрузки
+всей группы проверяем конкретного пользователя через /user?expand=groups
+и кэшируем ответ на тот же TTL.
+"""
+from __future__ import annotations
+import asyncio
+import logging
+import threading
+import time
+from typing import Dict, Optional, Set, Tuple
+
+from .settings import REG_EDITORS_GROUP, GROUP_CACHE_TTL, GROUP_CACHE_MAX_MEMBERS, GROUP_CACHE_MAX_STALE
+from .jira_client import list_group_members, get_user_groups
+
+log = logging.getLogger("it_registry.groups")
+
+_lock = threading.Lock()
+# group -> (участники или None для «большой» группы, время загрузки)
+_groups: Dict[str, Tuple[Optional[Set[str]], float]] = {}
+# (group, user) -> (состоит ли, время проверки) — только для больших групп
+_user_checks: Dict[Tuple[str, str], Tuple[bool, float]] = {}
+
+_reloading: Set[str] = set()
+_refresher: Optional[asyncio.Task] = None
+
+
+async def reload(group: str = REG_EDITORS_GROUP) -> None:
+    members = await list_group_members(group, GROUP_CACHE_MAX_MEMBERS)
+    with _lock:
+        _groups[group] = (members, time.monotonic())
+        if members is not None:
+            # для малой группы поштучные проверки не нужны
+            for k in [k for k in _user_checks if k[0] == group]:
+                del _user_checks[k]
+    if members is None:
+        log.info("Group %s is larger than %s members, checking users one by one",
+                 group, GROUP_CACHE_MAX_MEMBERS)
+    else:
+        log.info("Group %s loaded: %s members", group, len(members))
+
+
+async def _reload_in_background(group: str) -> None:
+    try:
+        await reload(group)
+    except Exception as e:
+        log.warning("Group %s refresh failed: %s", group, e)
+    finally:
+        _reloading.discard(group)
+
+
+async def _check_user(group: str, user: str) -> bool:
+    now = time.monotonic()
+    with _lock:
+        hit = _user_checks.get((group, user))
+    if hit is not None and now - hit[1] < GROUP_CACHE_TTL:
+        return hit[0]
+    ok = group in await get_user_groups(user)
+    with _lock:
+        _user_checks[(group, user)] = (ok, now)
+    return ok
+
+
+async def is_member(jira_username: str, group: str = REG_EDITORS_GROUP) -> bool:
+    user = (jira_username or "").strip().lower()
+    if not user:
+        return False
+    with _lock:
+        entry = _groups.get(group)
+    age = time.monotonic() - entry[1] if entry is not None else None
+    if entry is None:
+        await reload(group)
+        with _lock:
+            entry = _groups[group]
+    elif age > max(GROUP_CACHE_MAX_STALE, GROUP_CACHE_TTL):
+        try:
+            await reload(group)
+        except Exception as e:
+            log.warning("Group %s is %.0fs stale and cannot be reloaded (%s): denying %s",
+                        group, age, e, user)
+            return False
+        with _lock:
+            entry = _groups[group]
+    elif age > GROUP_CACHE_TTL and group not in _reloading:
+        # stale-while-revalidate: отвечаем сразу, обновляем в фоне
+        _reloading.add(group)
+        asyncio.get_running_loop().create_task(_reload_in_background(group))
+
+    members = entry[0]
+    if members is None:
+        return await _check_user(group, user)
+    return user in members
+
+
+async def _refresh_loop(group: str) -> None:
+    while True:
+        try:
+            await reload(group)
+            delay = GROUP_CACHE_TTL
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            log.warning("Group %s refresh failed: %s", group, e)
+            delay = min(60.0, GROUP_CACHE_TTL)
+        await asyncio.sleep(delay)
+
+
+def start_refresher(group: str = REG_EDITORS_GROUP) -> None:
+    global _refresher
+    if _refresher is None or _refresher.done():
+        _refresher = asyncio.get_running_loop().create_task(_refresh_loop(group))
+
+
+async def stop_refresher() -> None:
+    global _refresher
+    if _refresher is not None:
+        _refresher.cancel()
+        try:
+            await _refresher
+        except (asyncio.CancelledError, Exception):
+            pass
+        _refresher = None
@@ -1,7 +1,8 @@
 # -*- coding: utf-8 -*-
 import httpx
+import html
 import re, logging
-from typing import Optional, Dict, Any, List
+from typing import Optional, Dict, Any, List, Set
 
 from telegram import InlineKeyboardButton, InlineKeyboardMarkup, Update
 from telegram.constants import ParseMode
@@ -11,16 +12,24 @@ from telegram.ext import (
 )
 
 from .settings import (
-    PROJECT_KEY, DEPARTMENT_FIELD_ID, REG_EDITORS_GROUP, LOG_PEOPLE_FIELD
+    PROJECT_KEY, DEPARTMENT_FIELD_ID, REG_EDITORS_GROUP, LOG_PEOPLE_FIELD,
+    INFO_BATCH_LIMIT, FIND_LIMIT,
 )
 from .store import get_login, set_login, delete_login, set_pref, get_pref  # ⬅ добавили get_pref
 from .jira_client import (
-    get_issue, search_latest_by_department, list_unique_departments,
-    get_editmeta, update_issue_fields, user_in_group,
-    list_unique_values,  # уже используется для подбора вариантов
+    get_issue, search_latest_by_department,
+    get_editmeta, update_issue_fields,
     search_one_by_dept_and_field,  # ⬅ новая функция
+    iter_issues_by_keys, iter_issues_by_department,
 )
-from .formatters import format_issue_card, FIELD_ID
+from .formatters import format_issue_card, label_of, current_field_id, DEPT_TO_FIELD
+from . import values_index
+from . import issue_cache
+from . import fields as field_catalog
+from . import groups
+from . import mirror
+from .metrics import timed_handler
+from .tracing import traced_update
 
 log = logging.getLogger("it_registry.handlers")
 
@@ -40,10 +49,48 @@ async def _load_issue_by_arg(arg: str) -> Optional[Dict[str, Any]]:
     else:
         return await search_latest_by_department(x["dept"])
 
+# ---- Jira недоступна: ответ из последних сохранённых данных ----
+STALE_NOTE = ("⚠️ <i>Jira сейчас недоступна — показаны последние сохранённые данные, "
+              "они могут быть устаревшими.</i>")
+STALE_MISS = "Jira сейчас недоступна, а сохранённых данных по запросу нет. Попробуйте позже."
+
+def _jira_unavailable(e: Exception) -> bool:
+    """Сеть, таймаут, 5xx/429 или открытый breaker — можно ответить из локальных данных."""
+    if isinstance(e, httpx.HTTPStatusError):
+        code = e.response.status_code
+        return code >= 500 or code == 429
+    return isinstance(e, httpx.TransportError)
+
+async def _stale_issue(key: str) -> Optional[Dict[str, Any]]:
+    # кэш (даже просроченный), затем зеркало реестра
+    return issue_cache.peek(key) or await mirror.lookup(key)
+
+async def _stale_issue_by_arg(arg: str) -> Optional[Dict[str, Any]]:
+    x = _detect_key_or_dept(arg)
+    if "key" in x:
+        return await _stale_issue(x["key"])
+    return await mirror.latest_known(x["dept"])
+
+async def _stale_issues(keys: List[str], dept: str, skip: Optional[Set[str]] = None):
+    # skip — карточки, уже отправленные до сбоя Jira
+    skip = skip or set()
+    if keys:
+        for key in dict.fromkeys(keys):
+            if key in skip:
+                continue
+            issue = await _stale_issue(key)
+            if issue is not None:
+                yield issue
+    else:
+        for issue in await mirror.dept_issues(dept, INFO_BATCH_LIMIT):
+            if issue.get("key") not in skip:
+                yield issue
+
 def _people_debug(issue: Dict[str, Any]) -> None:
     if not LOG_PEOPLE_FIELD:
         return
-    names = issue.get("names") or {}
+    # имена полей — из общего каталога (expand=names больше не запрашиваем)
+    names = issue.get("names") or field_catalog.names()
     fields = issue.get("fields") or {}
     for fid, fname in names.items():
         if not isinstance(fname, str):
@@ -53,26 +100,22 @@ def _people_debug(issue: Dict[str, Any]) -> None:
             raw = fields.get(fid)
             log.debug("Owners raw (%s = %s): %r", fid, fname, raw)
 
-# соответствие Отдел -> какое поле показывать вторым (должно совпадать с webhooks.py)
-DEPT_TO_FIELD = {
-    "Закупки": FIELD_ID["Лицензии"],
-    "HelpDesk": FIELD_ID["Система"],
-}
-
 # ---- /start ----
 async def cmd_start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     chat = update.effective_chat
     user = update.effective_user
 
-    # (опционально) фиксируем пользователя в БД (не критично)
+    # (опционально) фиксируем пользователя в БД (не критично);
+    # запись идёт пакетом в отдельном потоке и не задерживает ответ
     try:
-        from .storage import upsert_user
-        upsert_user(tg_id=chat.id, tg_username=user.username)
+        from .storage import queue_upsert_user
+        queue_upsert_user(tg_id=chat.id, tg_username=user.username)
     except Exception:
         pass
 
     try:
-        depts = await list_unique_departments()
+        # из локального индекса; в Jira идём только если индекс ещё не построен
+        depts = await values_index.get_values(DEPARTMENT_FIELD_ID)
     except httpx.HTTPStatusError as e:
         code = e.response.status_code
         if code == 401:
@@ -127,7 +170,7 @@ async def on_pick_dept(update: Update, context: ContextTypes.DEFAULT_TYPE) -> No
         return
 
     try:
-        options = await list_unique_values(field_id)
+        options = await values_index.get_values(field_id)
     except Exception as e:
         await query.edit_message_text(
             f"Вы выбрали отдел: <b>{dept}</b>\n"
@@ -144,7 +187,7 @@ async def on_pick_dept(update: Update, context: ContextTypes.DEFAULT_TYPE) -> No
         )
         return
 
-    field_label = "Лицензии" if field_id == FIELD_ID.get("Лицензии") else "Система"
+    field_label = label_of(field_id) or field_catalog.name_of(field_id) or field_id
 
     context.user_data[f"opts_{field_id}"] = options
     kb = [
@@ -176,6 +219,8 @@ async def on_pick_filter(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
         return
 
     value = options[idx]
+    # кнопка могла быть выдана до того, как каталог Jira сменил ID поля
+    field_id = current_field_id(field_id)
     set_pref(update.effective_user.id, field_id=field_id, value=value)  # сохраняем фильтр 
 
     await q.edit_message_text(
@@ -185,19 +230,112 @@ async def on_pick_filter(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
         parse_mode="HTML",
     )
 
+# ---- /info: пакетный режим ----
+TG_MESSAGE_LIMIT = 4096
+KEYS_SPLIT_RE = re.compile(r"[\s,;]+")
+
+def _parse_keys(arg: str) -> List[str]:
+    """Несколько ключей через пробел/запятую -> список; иначе пусто."""
+    parts = [p for p in KEYS_SPLIT_RE.split(arg.strip()) if p]
+    if len(parts) > 1 and all(ISSUE_KEY_RE.match(p) for p in parts):
+        return [p.upper() for p in parts]
+    return []
+
+async def _send_cards_packed(update: Update, issues, sent: Optional[Set[str]] = None) -> int:
+    """
+    Отправляет карточки по мере получения, склеивая их в как можно меньшее
+    число сообщений в пределах лимита Telegram (4096 символов).
+    В sent добавляются ключи карточек, сообщения с которыми уже ушли.
+    """
+    buf: List[str] = []
+    buf_keys: List[str] = []
+    size = 0
+    count = 0
+
+    async def flush() -> None:
+        nonlocal buf, buf_keys, size
+        if buf:
+            await update.message.reply_text(
+                "\n\n".join(buf),
+                parse_mode=ParseMode.HTML,
+                disable_web_page_preview=True,
+            )
+            if sent is not None:
+                sent.update(buf_keys)
+        buf, buf_keys, size = [], [], 0
+
+    async for issue in issues:
+        block = f"<code>{issue.get('key', '')}</code>\n{format_issue_card(issue)}"
+        extra = len(block) + (2 if buf else 0)
+        if buf and size + extra > TG_MESSAGE_LIMIT:
+            await flush()
+            extra = len(block)
+        buf.append(block)
+        buf_keys.append(issue.get("key", ""))
+        size += extra
+        count += 1
+    await flush()
+    return count
+
+async def _info_batch(update: Update, keys: List[str], dept: str) -> None:
+    if keys:
+        if len(keys) > INFO_BATCH_LIMIT:
+            await update.message.reply_text(f"Не больше {INFO_BATCH_LIMIT} ключей за раз.")
+            return
+        issues = iter_issues_by_keys(keys)
+    else:
+        issues = iter_issues_by_department(dept, limit=INFO_BATCH_LIMIT)
+
+    sent: Set[str] = set()
+    try:
+        count = await _send_cards_packed(update, issues, sent)
+    except httpx.HTTPError as e:
+        if not _jira_unavailable(e):
+            raise
+        log.warning("/info batch from local data after %s cards: %s", len(sent), e)
+        await update.message.reply_text(STALE_NOTE, parse_mode=ParseMode.HTML)
+        count = len(sent) + await _send_cards_packed(update, _stale_issues(keys, dept, sent))
+    if not count:
+        await update.message.reply_text("Не нашёл задач. Проверь ключи/отдел.")
+    elif not keys and count >= INFO_BATCH_LIMIT:
+        await update.message.reply_text(f"Показаны первые {INFO_BATCH_LIMIT} записей отдела.")
+
 # ---- /info ----
 async def cmd_info(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     arg = " ".join(context.args) if context.args else ""
 
+    # 0) Пакетный режим: несколько ключей или «* Отдел» — все записи отдела
+    keys = _parse_keys(arg)
+    if keys:
+        await _info_batch(update, keys, "")
+        return
+    if arg.startswith("*"):
+        dept = arg[1:].strip() or (get_pref(update.effective_user.id) or {}).get("dept")
+        if not dept:
+            await update.message.reply_text("Укажите отдел: /info * <Отдел>")
+            return
+        await _info_batch(update, [], dept)
+        return
+
     # 1) Если аргумент указан, ведём себя как раньше: ключ задачи или название отдела
     if arg:
-        issue = await _load_issue_by_arg(arg)
+        note = ""
+        try:
+            issue = await _load_issue_by_arg(arg)
+        except httpx.HTTPError as e:
+            if not _jira_unavailable(e):
+                raise
+            log.warning("/info %s from local data: %s", arg, e)
+            issue, note = await _stale_issue_by_arg(arg), STALE_NOTE + "\n\n"
+            if not issue:
+                await update.message.reply_text(STALE_MISS)
+                return
         if not issue:
             await update.message.reply_text("Не нашёл задачу. Проверь ключ/отдел.")
             return
         _people_debug(issue)
         await update.message.reply_text(
-            format_issue_card(issue),
+            note + format_issue_card(issue),
             parse_mode=ParseMode.HTML,
             disable_web_page_preview=True,
         )
@@ -212,11 +350,21 @@ async def cmd_info(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
 
     # Берём первый сохранённый фильтр (по ТЗ — он ровно один)
     filters_map = (pref or {}).get("filters") or {}
-    if filters_map:
-        field_id, value = next(iter(filters_map.items()))
-        issue = await search_one_by_dept_and_field(dept, field_id, value)
-    else:
-        issue = await search_latest_by_department(dept)
+    field_id, value = next(iter(filters_map.items())) if filters_map else (None, None)
+    note = ""
+    try:
+        if field_id:
+            issue = await search_one_by_dept_and_field(dept, field_id, value)
+        else:
+            issue = await search_latest_by_department(dept)
+    except httpx.HTTPError as e:
+        if not _jira_unavailable(e):
+            raise
+        log.warning("/info by subscription from local data: %s", e)
+        issue, note = await mirror.latest_known(dept, field_id, value), STALE_NOTE + "\n\n"
+        if not issue:
+            await update.message.reply_text(STALE_MISS)
+            return
 
     if not issue:
         await update.message.reply_text("По вашей подписке задач пока не найдено.")
@@ -224,18 +372,52 @@ async def cmd_info(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
 
     _people_debug(issue)
     await update.message.reply_text(
-        f"<code>{issue.get('key','')}</code>\n"  # компактный заголовок с ключом
+        f"{note}<code>{issue.get('key','')}</code>\n"  # компактный заголовок с ключом
         f"{format_issue_card(issue)}",
         parse_mode=ParseMode.HTML,
         disable_web_page_preview=True,
     )
 
+# ---- /find: полнотекстовый поиск по локальному зеркалу ----
+def _snippet_html(snippet: str) -> str:
+    # маркеры совпадений из FTS5 (\x02..\x03) -> <b>..</b> после экранирования
+    text = html.escape(" ".join(snippet.split()))
+    return text.replace("\x02", "<b>").replace("\x03", "</b>")
+
+async def cmd_find(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    text = " ".join(context.args) if context.args else ""
+    if not text.strip():
+        await update.message.reply_text("Использование: /find <текст> — система, вендор, скрипт или контакт")
+        return
+    if not await mirror.last_sync():
+        await update.message.reply_text("Локальный индекс реестра ещё строится, попробуйте через минуту.")
+        return
+
+    hits = await mirror.find(text, FIND_LIMIT)
+    if not hits:
+        await update.message.reply_text("Ничего не нашёл.")
+        return
+
+    lines = []
+    for h in hits:
+        head = f"<code>{h['key']}</code> — {html.escape(h['system'] or '—')} ({html.escape(h['dept'] or '—')})"
+        lines.append(f"{head}\n{_snippet_html(h['snippet'])}" if h["snippet"] else head)
+    lines.append("\nКарточка: /info KEY")
+    await update.message.reply_text(
+        "\n".join(lines),
+        parse_mode=ParseMode.HTML,
+        disable_web_page_preview=True,
+    )
+
 # ---- /help & /whoami & /unlink (без изменений по логике) ----
 async def cmd_help(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     text = (
         "Команды\n"
         "/start — выбрать отдел и фильтр\n"
         "/info [KEY|Отдел] — показать карточку. Без аргументов — по вашей подписке\n"
+        "/info KEY1 KEY2 ... — несколько карточек сразу\n"
+        "/info * [Отдел] — все записи отдела (по умолчанию — вашего)\n"
+        "/find <текст> — поиск по системе, вендорам, скриптам и контактам\n"
         "/edit <KEY|Отдел> — изменить поле (только для группы reg_editors)\n"
         "/whoami — показать привязанный Jira-логин\n"
         "/unlink — отвязать свой TG от Jira-логина\n"
@@ -279,7 +461,7 @@ async def on_login(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
         await update.message.reply_text("Пусто. Введите логин.")
         return ASK_LOGIN
 
-    if not await user_in_group(jira_login):
+    if not await groups.is_member(jira_login):
         await update.message.reply_text("Нет прав (вы не состоите в группе reg_editors).")
         return ConversationHandler.END
 
@@ -290,14 +472,19 @@ async def _continue_edit(update: Update, context: ContextTypes.DEFAULT_TYPE, jir
     # ... без изменений (редактирование Criticality) ...
     return ConversationHandler.END  # укорочено ради компактности примера
 
+def _h(fn):
+    return timed_handler(traced_update(fn))
+
 def register(app: Application) -> None:
-    app.add_handler(CommandHandler("start", cmd_start))
-    app.add_handler(CallbackQueryHandler(on_pick_dept,   pattern=r"^dept:"))
-    app.add_handler(CallbackQueryHandler(on_pick_filter, pattern=r"^opt:"))
-
-    app.add_handler(CommandHandler("info", cmd_info))
-    app.add_handler(CommandHandler("help", cmd_help))
-    app.add_handler(CommandHandler("whoami", cmd_whoami))
-    app.add_handler(CommandHandler("unlink", cmd_unlink))
+    # _h: время обработчиков -> /metrics, trace апдейта -> лог медленных
+    app.add_handler(CommandHandler("start", _h(cmd_start)))
+    app.add_handler(CallbackQueryHandler(_h(on_pick_dept),   pattern=r"^dept:"))
+    app.add_handler(CallbackQueryHandler(_h(on_pick_filter), pattern=r"^opt:"))
+
+    app.add_handler(CommandHandler("info", _h(cmd_info)))
+    app.add_handler(CommandHandler("find", _h(cmd_find)))
+    app.add_handler(CommandHandler("help", _h(cmd_help)))
+    app.add_handler(CommandHandler("whoami", _h(cmd_whoami)))
+    app.add_handler(CommandHandler("unlink", _h(cmd_unlink)))
 
     # edit flow и setcrit — как у тебя было
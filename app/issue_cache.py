@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+"""
+LRU-кэш задач Jira: ключ задачи -> JSON задачи.
+Версия записи — fields.updated: более старая версия никогда не вытесняет
+более новую (например, медленный /info, завершившийся после вебхука).
+"""
+from __future__ import annotations
+import datetime as dt
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+from .settings import ISSUE_CACHE_SIZE, ISSUE_CACHE_TTL
+
+# Доступ и из цикла бота, и из потока uvicorn
+_lock = threading.Lock()
+# key -> (время сохранения, задача)
+_items: "OrderedDict[str, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+_hits = 0
+_misses = 0
+
+
+def updated_at(issue: Dict[str, Any]) -> Optional[dt.datetime]:
+    """fields.updated как datetime (формат Jira: 2024-05-01T12:34:56.000+0300)."""
+    raw = (issue.get("fields") or {}).get("updated")
+    if not raw:
+        return None
+    for fmt in ("%Y-%m-%dT%H:%M:%S.%f%z", "%Y-%m-%dT%H:%M:%S%z"):
+        try:
+            return dt.datetime.strptime(raw, fmt)
+        except ValueError:
+            continue
+    return None
+
+
+def get(key: str) -> Optional[Dict[str, Any]]:
+    """Свежая (моложе ISSUE_CACHE_TTL) запись или None; учитывается в hit/miss."""
+    global _hits, _misses
+    with _lock:
+        item = _items.get(key)
+        if item is None or time.monotonic() - item[0] > ISSUE_CACHE_TTL:
+            _misses += 1
+            return None
+        _items.move_to_end(key)
+        _hits += 1
+        return item[1]
+
+
+def peek(key: str) -> Optional[Dict[str, Any]]:
+    """Последняя сохранённая версия, даже просроченная (ответ при недоступной Jira); без учёта в hit/miss."""
+    with _lock:
+        item = _items.get(key)
+        return item[1] if item is not None else None
+
+
+def put(issue: Dict[str, Any]) -> bool:
+    """Сохранить задачу; False — в кэше уже более новая версия."""
+    key = issue.get("key")
+    if not key or ISSUE_CACHE_SIZE <= 0:
+        return False
+    new_ts = updated_at(issue)
+    with _lock:
+        item = _items.get(key)
+        if item is not None and new_ts is not None:
+            old_ts = updated_at(item[1])
+            if old_ts is not None and old_ts > new_ts:
+                return False
+        _items[key] = (time.monotonic(), issue)
+        _items.move_to_end(key)
+        while len(_items) > ISSUE_CACHE_SIZE:
+            _items.popitem(last=False)
+    return True
+
+
+def invalidate(key: str) -> None:
+    with _lock:
+        _items.pop(key, None)
+
+
+def stats() -> Dict[str, Any]:
+    with _lock:
+        total = _hits + _misses
+        return {
+            "size": len(_items),
+            "max_size": ISSUE_CACHE_SIZE,
+            "hits": _hits,
+            "misses": _misses,
+            "hit_ratio": round(_hits / total, 4) if total else 0.0,
+        }
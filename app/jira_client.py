@@ -1,23 +1,115 @@
 # -*- coding: utf-8 -*-
+import asyncio
 import logging
-from typing import Dict, Any, List, Optional, Set
+import time
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Dict, Any, List, Optional, Set
 
 import httpx
+from . import issue_cache, metrics, tracing
+from .breaker import CircuitBreaker
+from .formatters import card_field_ids
 from .settings import (
     JIRA_BASE_URL, JIRA_USER, JIRA_PASS, PROJECT_KEY,
-    DEPARTMENT_FIELD_ID, HTTP_TIMEOUT, REG_EDITORS_GROUP, VERIFY_SSL
+    DEPARTMENT_FIELD_ID, HTTP_TIMEOUT, VERIFY_SSL,
+    JIRA_HTTP2, JIRA_MAX_CONNECTIONS, JIRA_MAX_KEEPALIVE, JIRA_KEEPALIVE_EXPIRY,
+    JIRA_BREAKER_FAILURES, JIRA_BREAKER_RESET_SEC,
+    SEARCH_PAGE_SIZE, SEARCH_CONCURRENCY, SELECT_OPTIONS_FROM_META, JIRA_FULL_FETCH,
 )
 
 log = logging.getLogger("it_registry.jira")
 
-def _client() -> httpx.AsyncClient:
+# Долгоживущий клиент (keep-alive пул). Бот и API работают в одном event loop,
+# поэтому клиент один; словарь по циклам — страховка для утилит и тестов,
+# запускающих свой цикл (httpx.AsyncClient нельзя использовать из чужого цикла).
+_clients: Dict[asyncio.AbstractEventLoop, httpx.AsyncClient] = {}
+
+# общий для всех запросов к Jira: при недоступности отвечаем сразу, а не через HTTP_TIMEOUT
+breaker = CircuitBreaker("Jira", JIRA_BREAKER_FAILURES, JIRA_BREAKER_RESET_SEC)
+
+def _http2_enabled() -> bool:
+    if not JIRA_HTTP2:
+        return False
+    try:
+        import h2  # noqa: F401
+    except ImportError:
+        log.warning("JIRA_HTTP2=true, но пакет h2 не установлен (pip install httpx[http2]) — работаем по HTTP/1.1")
+        return False
+    return True
+
+class _MeteredTransport(httpx.AsyncHTTPTransport):
+    """
+    Время каждого запроса к Jira -> jira_request_duration_seconds{method, endpoint, status};
+    исход запроса -> breaker (сеть, таймаут, 5xx и 429 — ошибки).
+    """
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        endpoint = metrics.jira_endpoint(request.url.path)
+        probe = breaker.before(request)
+        t0 = time.perf_counter()
+        status = "error"
+        ok: Optional[bool] = None
+        error = ""
+        try:
+            with tracing.span(f"jira {request.method} {endpoint}"):
+                response = await super().handle_async_request(request)
+            status = str(response.status_code)
+            ok = response.status_code < 500 and response.status_code != 429
+            error = "" if ok else f"HTTP {status} {endpoint}"
+            return response
+        except httpx.TransportError as e:
+            ok = False
+            error = f"{type(e).__name__} {endpoint}"
+            raise
+        finally:
+            breaker.record(ok, error, probe)
+            metrics.JIRA_LATENCY.observe(
+                time.perf_counter() - t0,
+                method=request.method,
+                endpoint=endpoint,
+                status=status,
+            )
+
+def _new_client() -> httpx.AsyncClient:
+    transport = _MeteredTransport(
+        verify=VERIFY_SSL,
+        http2=_http2_enabled(),
+        limits=httpx.Limits(
+            max_connections=JIRA_MAX_CONNECTIONS,
+            max_keepalive_connections=JIRA_MAX_KEEPALIVE,
+            keepalive_expiry=JIRA_KEEPALIVE_EXPIRY,
+        ),
+    )
     return httpx.AsyncClient(
         base_url=JIRA_BASE_URL.rstrip("/"),
         auth=(JIRA_USER, JIRA_PASS),
         timeout=HTTP_TIMEOUT,
-        verify=VERIFY_SSL,
+        transport=transport,
     )
 
+async def open_client() -> httpx.AsyncClient:
+    """Общий клиент Jira для текущего event loop (создаётся при старте приложения)."""
+    loop = asyncio.get_running_loop()
+    c = _clients.get(loop)
+    if c is None or c.is_closed:
+        c = _new_client()
+        _clients[loop] = c
+        log.info("Jira HTTP client opened (max_connections=%s, keepalive=%s)",
+                 JIRA_MAX_CONNECTIONS, JIRA_MAX_KEEPALIVE)
+    return c
+
+async def close_client() -> None:
+    """Закрыть общий клиент текущего event loop (при остановке приложения)."""
+    c = _clients.pop(asyncio.get_running_loop(), None)
+    if c is not None:
+        await c.aclose()
+        log.info("Jira HTTP client closed")
+
+@asynccontextmanager
+async def _client() -> AsyncIterator[httpx.AsyncClient]:
+    # соединение остаётся в пуле — клиент не закрываем
+    yield await open_client()
+
 def _jql_field(field_id_or_name: str) -> str:
     """customfield_10100 -> cf[10100]; 'cf[10100]' — как есть; иначе -> "Имя поля"."""
     if field_id_or_name.startswith("customfield_"):
@@ -27,13 +119,30 @@ def _jql_field(field_id_or_name: str) -> str:
         return field_id_or_name
     return f"\"{field_id_or_name}\""
 
+def _issue_params(full: bool = False) -> Dict[str, Any]:
+    """
+    По умолчанию запрашиваем только поля, которые рисует карточка (formatters);
+    full=True (или JIRA_FULL_FETCH) — все поля. Имена полей не запрашиваем:
+    они берутся из каталога app.fields.
+    """
+    if full or JIRA_FULL_FETCH:
+        return {}
+    return {"fields": ",".join(card_field_ids())}
+
 # --------------------- базовые операции ---------------------
 
-async def get_issue(key: str) -> Dict[str, Any]:
+async def get_issue(key: str, refresh: bool = False, full: bool = False) -> Dict[str, Any]:
+    """Задача из LRU-кэша; refresh=True — всегда из Jira (вебхуки) с обновлением кэша."""
+    if not refresh and not full:
+        cached = issue_cache.get(key)
+        if cached is not None:
+            return cached
     async with _client() as c:
-        r = await c.get(f"/rest/api/2/issue/{key}", params={"expand": "names"})
+        r = await c.get(f"/rest/api/2/issue/{key}", params=_issue_params(full))
         r.raise_for_status()
-        return r.json()
+        issue = r.json()
+    issue_cache.put(issue)
+    return issue
 
 async def get_editmeta(key: str) -> Dict[str, Any]:
     async with _client() as c:
@@ -41,6 +150,13 @@ async def get_editmeta(key: str) -> Dict[str, Any]:
         r.raise_for_status()
         return r.json()
 
+async def list_fields() -> List[Dict[str, Any]]:
+    """Все поля Jira (системные и кастомные): [{"id", "name", "custom", "schema"}, ...]."""
+    async with _client() as c:
+        r = await c.get("/rest/api/2/field")
+        r.raise_for_status()
+        return r.json()
+
 async def update_issue_fields(key: str, fields: Dict[str, Any]) -> None:
     async with _client() as c:
         r = await c.put(f"/rest/api/2/issue/{key}", json={"fields": fields})
@@ -48,11 +164,11 @@ async def update_issue_fields(key: str, fields: Dict[str, Any]) -> None:
 
 # --------------------- выборки для бота ---------------------
 
-async def search_latest_by_department(dept: str):
+async def search_latest_by_department(dept: str, full: bool = False):
     jf = _jql_field(DEPARTMENT_FIELD_ID)
     # для Select используем '='
     jql = f'project = "{PROJECT_KEY}" AND {jf} = "{dept}" ORDER BY created DESC'
-    params = {"jql": jql, "maxResults": 1, "expand": "names"}
+    params = {"jql": jql, "maxResults": 1, **_issue_params(full)}
     async with _client() as c:
         r = await c.get("/rest/api/2/search", params=params)
         r.raise_for_status()
@@ -60,76 +176,192 @@ async def search_latest_by_department(dept: str):
         issues = data.get("issues") or []
         return issues[0] if issues else None
 
-async def list_unique_departments(limit: int = 100_000) -> List[str]:
-    """Уникальные значения поля 'Отдел' по проекту (с пагинацией)."""
-    seen: Set[str] = set()
-    start = 0
-    step = 100
-    cf_id = DEPARTMENT_FIELD_ID
-    async with _client() as c:
-        while True:
-            r = await c.get("/rest/api/2/search", params={
-                "jql": f'project = "{PROJECT_KEY}"',
-                "fields": cf_id,
-                "startAt": start,
-                "maxResults": step,
-            })
-            r.raise_for_status()
-            data = r.json()
-            issues = data.get("issues") or []
-            if not issues:
-                break
-            for it in issues:
-                v = (it.get("fields") or {}).get(cf_id)
-                if isinstance(v, dict):
-                    val = v.get("value") or v.get("name")
-                else:
-                    val = v
-                if val:
-                    seen.add(str(val))
-            start += len(issues)
-            total = data.get("total") or 0
-            if start >= total or start >= limit:
-                break
-    return sorted(seen)
+async def _search_page(c: httpx.AsyncClient, jql: str, fields: str,
+                       start: int, size: int,
+                       extra: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    r = await c.get("/rest/api/2/search", params={
+        "jql": jql,
+        "fields": fields,
+        "startAt": start,
+        "maxResults": size,
+        **(extra or {}),
+    })
+    r.raise_for_status()
+    return r.json()
 
-async def list_unique_values(field_id: str, limit: int = 100_000) -> List[str]:
-    """Уникальные значения любого поля (Select/Text/Dict) по проекту."""
-    seen: Set[str] = set()
-    start = 0
-    step = 100
+async def iter_search(jql: str, fields: str, limit: int = 100_000,
+                      page_size: int = SEARCH_PAGE_SIZE,
+                      concurrency: int = SEARCH_CONCURRENCY,
+                      extra: Optional[Dict[str, Any]] = None,
+                      ordered: bool = False) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Потоковый обход результатов JQL.
+    Первая страница даёт total, остальные startAt запрашиваются параллельно
+    (не больше concurrency запросов одновременно); задачи отдаются по мере
+    прихода страниц, поэтому порядок между страницами не гарантируется.
+    ordered=True — порядок ORDER BY сохраняется: пришедшая раньше времени
+    страница ждёт в буфере, пока не придут предыдущие.
+    """
     async with _client() as c:
+        first = await _search_page(c, jql, fields, 0, page_size, extra)
+        issues = first.get("issues") or []
+        for it in issues[:limit]:
+            yield it
+        # Jira может урезать maxResults — шагаем по фактическому размеру страницы
+        step = len(issues)
+        total = min(first.get("total") or 0, limit)
+        if not step or step >= total:
+            return
+
+        offsets = iter(range(step, total, step))
+        pending: Set[asyncio.Task] = set()
+        # ordered: startAt -> задачи страницы, ждущей предыдущих
+        ready: Dict[int, List[Dict[str, Any]]] = {}
+        start_at: Dict[asyncio.Task, int] = {}
+        next_off = step
+
+        def _spawn() -> bool:
+            off = next(offsets, None)
+            if off is None:
+                return False
+            task = asyncio.create_task(
+                _search_page(c, jql, fields, off, min(step, total - off), extra))
+            start_at[task] = off
+            pending.add(task)
+            return True
+
+        try:
+            while len(pending) < max(1, concurrency) and _spawn():
+                pass
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for t in done:
+                    _spawn()
+                    off = start_at.pop(t)
+                    if not ordered:
+                        for it in t.result().get("issues") or []:
+                            yield it
+                        continue
+                    ready[off] = t.result().get("issues") or []
+                    while next_off in ready:
+                        for it in ready.pop(next_off):
+                            yield it
+                        next_off += step
+        finally:
+            for t in pending:
+                t.cancel()
+
+async def iter_issues_by_keys(keys: List[str]) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Карточки по списку ключей: свежие — из кэша, остальные — одним
+    поиском key in (...) с проекцией полей карточки.
+    """
+    missing: List[str] = []
+    for key in dict.fromkeys(keys):
+        cached = issue_cache.get(key)
+        if cached is not None:
+            yield cached
+        else:
+            missing.append(key)
+    if not missing:
+        return
+    # validateQuery=warn: несуществующий ключ не роняет весь запрос в 400
+    jql = f'key in ({", ".join(missing)})'
+    async for it in iter_search(jql, ",".join(card_field_ids()), limit=len(missing),
+                                extra={"validateQuery": "warn"}):
+        issue_cache.put(it)
+        yield it
+
+async def iter_issues_by_department(dept: str, limit: int = 100_000) -> AsyncIterator[Dict[str, Any]]:
+    """Все записи отдела (поля карточки) по порядку ключей, потоком по мере прихода страниц."""
+    jf = _jql_field(DEPARTMENT_FIELD_ID)
+    jql = f'project = "{PROJECT_KEY}" AND {jf} = "{dept}" ORDER BY key ASC'
+    async for it in iter_search(jql, ",".join(card_field_ids()), limit=limit, ordered=True):
+        issue_cache.put(it)
+        yield it
+
+def field_str(v: Any) -> Optional[str]:
+    if isinstance(v, dict):
+        v = v.get("value") or v.get("name")
+    if v is None:
+        return None
+    s = str(v).strip()
+    return s or None
+
+# --------------------- варианты Select-полей из метаданных ---------------------
+
+def _options_from_meta(fields_meta: List[Dict[str, Any]], out: Dict[str, Set[str]]) -> None:
+    for fm in fields_meta:
+        fid = fm.get("fieldId") or fm.get("key")
+        allowed = fm.get("allowedValues")
+        if not fid or not allowed:
+            continue
+        schema = fm.get("schema") or {}
+        if "option" not in (schema.get("type"), schema.get("items")):
+            continue
+        for opt in allowed:
+            if isinstance(opt, dict) and opt.get("disabled"):
+                continue
+            val = field_str(opt)
+            if val:
+                out.setdefault(fid, set()).add(val)
+
+async def _allowed_values_createmeta(c: httpx.AsyncClient) -> Optional[Dict[str, Set[str]]]:
+    """createmeta по типам задач проекта (Jira DC 8.4+); None — API недоступен."""
+    r = await c.get(f"/rest/api/2/issue/createmeta/{PROJECT_KEY}/issuetypes")
+    if r.status_code in (403, 404):
+        return None
+    r.raise_for_status()
+    out: Dict[str, Set[str]] = {}
+    for it_type in r.json().get("values") or []:
+        start = 0
         while True:
-            r = await c.get("/rest/api/2/search", params={
-                "jql": f'project = "{PROJECT_KEY}"',
-                "fields": field_id,
-                "startAt": start,
-                "maxResults": step,
-            })
+            r = await c.get(
+                f"/rest/api/2/issue/createmeta/{PROJECT_KEY}/issuetypes/{it_type['id']}",
+                params={"startAt": start, "maxResults": 100},
+            )
             r.raise_for_status()
             data = r.json()
-            issues = data.get("issues") or []
-            if not issues:
+            page = data.get("values") or []
+            _options_from_meta(page, out)
+            start += len(page)
+            if not page or data.get("isLast", True):
                 break
+    return out
 
-            for it in issues:
-                v = (it.get("fields") or {}).get(field_id)
-                if isinstance(v, dict):
-                    val = v.get("value") or v.get("name")
-                else:
-                    val = v
-                if val is not None:
-                    s = str(val).strip()
-                    if s:
-                        seen.add(s)
-
-            start += len(issues)
-            total = data.get("total") or 0
-            if start >= total or start >= limit:
-                break
-    return sorted(seen, key=lambda s: s.lower())
+async def _allowed_values_editmeta(c: httpx.AsyncClient) -> Dict[str, Set[str]]:
+    """Запасной путь: editmeta любой (последней) задачи проекта."""
+    r = await c.get("/rest/api/2/search", params={
+        "jql": f'project = "{PROJECT_KEY}" ORDER BY created DESC',
+        "fields": "key",
+        "maxResults": 1,
+    })
+    r.raise_for_status()
+    issues = r.json().get("issues") or []
+    out: Dict[str, Set[str]] = {}
+    if not issues:
+        return out
+    r = await c.get(f"/rest/api/2/issue/{issues[0]['key']}/editmeta")
+    r.raise_for_status()
+    meta = r.json().get("fields") or {}
+    _options_from_meta([dict(v, fieldId=k) for k, v in meta.items()], out)
+    return out
 
-async def search_one_by_dept_and_field(dept: str, field_id: str, value: str):
+async def get_select_options() -> Dict[str, List[str]]:
+    """
+    Варианты всех Select-полей проекта из метаданных Jira: field_id -> [значения].
+    Один-два небольших запроса вместо прохода по всем задачам.
+    Поля без allowedValues (текстовые, пользователи) в ответ не попадают.
+    """
+    if not SELECT_OPTIONS_FROM_META:
+        return {}
+    async with _client() as c:
+        out = await _allowed_values_createmeta(c)
+        if out is None:
+            out = await _allowed_values_editmeta(c)
+    return {fid: sorted(vals, key=lambda s: s.lower()) for fid, vals in out.items()}
+
+async def search_one_by_dept_and_field(dept: str, field_id: str, value: str, full: bool = False):
     """Одна (последняя) задача по связке Отдел + доп.поле."""
     jf_dept = _jql_field(DEPARTMENT_FIELD_ID)
     jf_extra = _jql_field(field_id)
@@ -139,7 +371,7 @@ async def search_one_by_dept_and_field(dept: str, field_id: str, value: str):
         f'AND {jf_extra} = "{value}" '
         f'ORDER BY created DESC'
     )
-    params = {"jql": jql, "maxResults": 1, "expand": "names"}
+    params = {"jql": jql, "maxResults": 1, **_issue_params(full)}
     async with _client() as c:
         r = await c.get("/rest/api/2/search", params=params)
         r.raise_for_status()
@@ -149,11 +381,14 @@ async def search_one_by_dept_and_field(dept: str, field_id: str, value: str):
 
 # --------------------- доступ/группы ---------------------
 
-async def user_in_group(jira_username: str, group: str = REG_EDITORS_GROUP) -> bool:
-    """Проверка членства через просмотр участников группы (с пагинацией)."""
+async def list_group_members(group: str, max_members: int) -> Optional[Set[str]]:
+    """
+    Логины (name/key в нижнем регистре) всех участников группы.
+    None — группа больше max_members: проверять пользователей по одному.
+    """
+    members: Set[str] = set()
     start = 0
     step = 50
-    name_lower = (jira_username or "").lower()
     async with _client() as c:
         while True:
             r = await c.get("/rest/api/2/group/member", params={
@@ -164,14 +399,27 @@ async def user_in_group(jira_username: str, group: str = REG_EDITORS_GROUP) -> b
             })
             if r.status_code == 404:
                 log.warning("Group %s not found", group)
-                return False
+                return members
             r.raise_for_status()
             data = r.json()
-            for u in data.get("values") or []:
-                cand = (u.get("name") or u.get("key") or "").lower()
-                if cand and cand == name_lower:
-                    return True
-            if data.get("isLast") is True:
+            if start == 0 and (data.get("total") or 0) > max_members:
+                return None
+            values = data.get("values") or []
+            for u in values:
+                for cand in (u.get("name"), u.get("key")):
+                    if cand:
+                        members.add(cand.lower())
+            if data.get("isLast") is True or not values:
                 break
-            start += step
-    return False
+            start += len(values)
+    return members
+
+async def get_user_groups(jira_username: str) -> Set[str]:
+    """Группы одного пользователя (GET /user?expand=groups); пусто — пользователя нет."""
+    async with _client() as c:
+        r = await c.get("/rest/api/2/user", params={"username": jira_username, "expand": "groups"})
+        if r.status_code == 404:
+            return set()
+        r.raise_for_status()
+        items = ((r.json().get("groups") or {}).get("items")) or []
+        return {g.get("name") for g in items if g.get("name")}
@@ -0,0 +1,210 @@
+# -*- coding: utf-8 -*-
+"""
+Метрики процесса в текстовом формате Prometheus (GET /metrics).
+
+Без prometheus_client: счётчики и гистограммы — в памяти под одним локом,
+значения кэшей и очередей снимаются в момент запроса (collect-функции).
+"""
+from __future__ import annotations
+import functools
+import re
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Sequence, Tuple
+
+_lock = threading.Lock()
+_metrics: List["_Metric"] = []
+_collectors: List[Callable[[], List[str]]] = []
+
+# секунды: от быстрых ответов кэша до таймаута Jira (HTTP_TIMEOUT=15)
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+# штуки: получатели одного уведомления
+FANOUT_BUCKETS = (0, 1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+
+
+def _escape(v: Any) -> str:
+    return str(v).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: Sequence[str], values: Sequence[Any], extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _num(v: float) -> str:
+    if v == float("inf"):
+        return "+Inf"
+    return repr(float(v)) if isinstance(v, float) and not v.is_integer() else str(int(v))
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, doc: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.doc = doc
+        self.labelnames = tuple(labelnames)
+        with _lock:
+            _metrics.append(self)
+
+    def _key(self, labels: Dict[str, Any]) -> Tuple[str, ...]:
+        return tuple(str(labels.get(n, "")) for n in self.labelnames)
+
+    def _header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.doc}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, doc: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, doc, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1.0, **labels: Any) -> None:
+        k = self._key(labels)
+        with _lock:
+            self._values[k] = self._values.get(k, 0.0) + amount
+
+    def render(self) -> List[str]:
+        out = self._header()
+        for k, v in sorted(self._values.items()):
+            out.append(f"{self.name}{_labels(self.labelnames, k)} {_num(v)}")
+        return out
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, doc: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, doc, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # labels -> [счётчики по бакетам..., сумма, количество]
+        self._values: Dict[Tuple[str, ...], List[float]] = {}
+
+    def observe(self, value: float, **labels: Any) -> None:
+        k = self._key(labels)
+        with _lock:
+            row = self._values.get(k)
+            if row is None:
+                row = self._values[k] = [0.0] * (len(self.buckets) + 2)
+            for i, b in enumerate(self.buckets):
+                if value <= b:
+                    row[i] += 1
+            row[-2] += value
+            row[-1] += 1
+
+    @contextmanager
+    def time(self, **labels: Any) -> Iterator[None]:
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - t0, **labels)
+
+    def render(self) -> List[str]:
+        out = self._header()
+        for k, row in sorted(self._values.items()):
+            for b, n in zip(self.buckets, row):
+                le = 'le="%s"' % _num(b)
+                out.append(f"{self.name}_bucket{_labels(self.labelnames, k, le)} {_num(n)}")
+            le = 'le="+Inf"'
+            out.append(f"{self.name}_bucket{_labels(self.labelnames, k, le)} {_num(row[-1])}")
+            out.append(f"{self.name}_sum{_labels(self.labelnames, k)} {_num(row[-2])}")
+            out.append(f"{self.name}_count{_labels(self.labelnames, k)} {_num(row[-1])}")
+        return out
+
+
+def sample_lines(name: str, doc: str, samples: Dict[Tuple[Tuple[str, Any], ...], float],
+                 kind: str = "gauge") -> List[str]:
+    """Строки экспозиции для collect-функций: {((label, value), ...): число}."""
+    out = [f"# HELP {name} {doc}", f"# TYPE {name} {kind}"]
+    for labels, v in samples.items():
+        names = [n for n, _ in labels]
+        values = [x for _, x in labels]
+        out.append(f"{name}{_labels(names, values)} {_num(v)}")
+    return out
+
+
+def register_collector(fn: Callable[[], List[str]]) -> None:
+    """fn() вызывается на каждый запрос /metrics и возвращает строки экспозиции."""
+    with _lock:
+        _collectors.append(fn)
+
+
+def render() -> str:
+    with _lock:
+        lines: List[str] = []
+        for m in _metrics:
+            lines.extend(m.render())
+        collectors = list(_collectors)
+    for fn in collectors:
+        try:
+            lines.extend(fn())
+        except Exception:
+            # сломанный источник не должен ронять весь /metrics
+            pass
+    return "\n".join(lines) + "\n"
+
+
+# ---------------------- метрики приложения ---------------------------
+
+JIRA_LATENCY = Histogram(
+    "jira_request_duration_seconds", "Jira REST call latency until response headers",
+    ("method", "endpoint", "status"),
+)
+TG_SEND_LATENCY = Histogram(
+    "telegram_send_duration_seconds", "Telegram sendMessage latency from the notifier queue",
+)
+TG_SENT = Counter("telegram_messages_sent_total", "Notifications delivered to Telegram")
+TG_ERRORS = Counter(
+    "telegram_send_errors_total", "Failed Telegram sends by reason", ("reason",),
+)
+HANDLER_LATENCY = Histogram(
+    "bot_handler_duration_seconds", "Telegram update handler latency", ("handler",),
+)
+WEBHOOK_LATENCY = Histogram(
+    "webhook_processing_duration_seconds", "Jira webhook processing (fetch, render, enqueue)",
+)
+WEBHOOK_EVENTS = Counter(
+    "webhook_events_total", "Jira events received / found by reconciler / processed after coalescing / skipped as unchanged", ("stage",),
+)
+WEBHOOK_ISSUE_SOURCE = Counter(
+    "webhook_issue_source_total", "Where processed events took the issue from: payload (v2) or jira", ("source",),
+)
+WEBHOOK_FANOUT = Histogram(
+    "webhook_fanout_recipients", "Recipients per Jira webhook notification", buckets=FANOUT_BUCKETS,
+)
+
+_ISSUE_KEY_RE = re.compile(r"^[A-Z][A-Z0-9_]*-\d+$", re.I)
+
+
+def jira_endpoint(path: str) -> str:
+    """/rest/api/2/issue/REG-12/editmeta -> /rest/api/2/issue/{key}/editmeta (ограничиваем число серий)."""
+    parts = path.split("/")
+    out = []
+    for i, seg in enumerate(parts):
+        if _ISSUE_KEY_RE.match(seg):
+            seg = "{key}"
+        elif seg.isdigit() and i > 0 and parts[i - 1] != "api":
+            seg = "{id}"
+        elif i > 0 and parts[i - 1] == "createmeta":
+            seg = "{project}"
+        out.append(seg)
+    return "/".join(out)
+
+
+def timed_handler(fn: Callable) -> Callable:
+    """Обёртка обработчика PTB: время выполнения в bot_handler_duration_seconds{handler=имя}."""
+    name = fn.__name__
+
+    @functools.wraps(fn)
+    async def wrapper(*args: Any, **kwargs: Any) -> Any:
+        with HANDLER_LATENCY.time(handler=name):
+            return await fn(*args, **kwargs)
+
+    return wrapper
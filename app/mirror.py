@@ -0,0 +1,364 @@
+# -*- coding: utf-8 -*-
+"""
+Локальное зеркало карточек проекта в SQLite ($DATA_DIR/registry_mirror.db)
+с полнотекстовым индексом FTS5 по системе, вендорам, скриптам и контактам.
+
+Заполняется полной выгрузкой при первом запуске и раз в MIRROR_RESYNC_SEC
+(записи, пропавшие из Jira, при этом удаляются), между выгрузками —
+из /jira-webhook. /find ищет только здесь, без запросов к Jira.
+Все обращения к базе идут через один выделенный поток, как в storage.py.
+"""
+from __future__ import annotations
+import asyncio
+import functools
+import json
+import logging
+import os
+import re
+import sqlite3
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from .settings import PROJECT_KEY, DEPARTMENT_FIELD_ID, MIRROR_RESYNC_SEC
+from .store import DATA_DIR
+from .formatters import FIELD_ID, card_field_ids
+from .jira_client import iter_search, field_str
+from .issue_cache import updated_at
+
+log = logging.getLogger("it_registry.mirror")
+
+MIRROR_FILE = os.path.join(DATA_DIR, "registry_mirror.db")
+
+# колонка индекса -> поле карточки; порядок = веса bm25 ниже
+_TEXT_COLUMNS: Tuple[Tuple[str, str], ...] = (
+    ("system", "Система"),
+    ("vendors", "Вендоры"),
+    ("scripts", "Актуальные скрипты"),
+    ("contacts", "Контакты поставщиков"),
+)
+_BM25_WEIGHTS = "4.0, 2.0, 1.0, 1.0"
+_BATCH = 500
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS issues (
+    id       INTEGER PRIMARY KEY,
+    key      TEXT NOT NULL UNIQUE,
+    updated  TEXT,
+    dept     TEXT,
+    system   TEXT,
+    vendors  TEXT,
+    scripts  TEXT,
+    contacts TEXT,
+    data     TEXT NOT NULL,
+    gen      INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS meta (k TEXT PRIMARY KEY, v TEXT);
+"""
+
+_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="mirror")
+_conn: Optional[sqlite3.Connection] = None
+_fts = True
+_gen = 0   # номер текущей полной выгрузки
+
+_sync_lock: Optional[asyncio.Lock] = None
+_refresher: Optional[asyncio.Task] = None
+
+# ---------------------- синхронная часть (поток mirror) ----------------------
+
+def _db() -> sqlite3.Connection:
+    global _conn, _fts, _gen
+    if _conn is None:
+        conn = sqlite3.connect(MIRROR_FILE, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.executescript(_SCHEMA)
+        try:
+            # rowid записи индекса = issues.id
+            conn.execute(
+                "CREATE VIRTUAL TABLE IF NOT EXISTS issues_fts USING fts5("
+                + ", ".join(c for c, _ in _TEXT_COLUMNS)
+                + ", tokenize='unicode61 remove_diacritics 2')"
+            )
+        except sqlite3.OperationalError as e:
+            _fts = False
+            log.warning("SQLite without FTS5 (%s): /find falls back to LIKE", e)
+        row = conn.execute("SELECT v FROM meta WHERE k = 'gen'").fetchone()
+        _gen = int(row[0]) if row else 0
+        conn.commit()
+        _conn = conn
+    return _conn
+
+
+def _row_of(issue: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    key = issue.get("key")
+    if not key:
+        return None
+    f = issue.get("fields") or {}
+    row = {
+        "key": key,
+        "updated": f.get("updated"),
+        "dept": field_str(f.get(DEPARTMENT_FIELD_ID)),
+        "data": json.dumps(issue, ensure_ascii=False),
+    }
+    for col, label in _TEXT_COLUMNS:
+        row[col] = field_str(f.get(FIELD_ID[label]))
+    return row
+
+
+def _upsert(conn: sqlite3.Connection, issue: Dict[str, Any], gen: int) -> bool:
+    row = _row_of(issue)
+    if row is None:
+        return False
+    old = conn.execute("SELECT id, updated FROM issues WHERE key = ?", (row["key"],)).fetchone()
+    if old is not None:
+        old_ts, new_ts = updated_at({"fields": {"updated": old[1]}}), updated_at(issue)
+        if old_ts is not None and new_ts is not None and old_ts > new_ts:
+            # пришла более старая версия (медленная выгрузка после вебхука)
+            conn.execute("UPDATE issues SET gen = ? WHERE id = ?", (gen, old[0]))
+            return False
+    cols = [c for c, _ in _TEXT_COLUMNS]
+    conn.execute(
+        "INSERT INTO issues (key, updated, dept, data, gen, " + ", ".join(cols) + ") "
+        "VALUES (:key, :updated, :dept, :data, :gen, " + ", ".join(f":{c}" for c in cols) + ") "
+        "ON CONFLICT(key) DO UPDATE SET updated = excluded.updated, dept = excluded.dept, "
+        "data = excluded.data, gen = excluded.gen, "
+        + ", ".join(f"{c} = excluded.{c}" for c in cols),
+        dict(row, gen=gen),
+    )
+    if _fts:
+        rowid = old[0] if old is not None else \
+            conn.execute("SELECT id FROM issues WHERE key = ?", (row["key"],)).fetchone()[0]
+        conn.execute("DELETE FROM issues_fts WHERE rowid = ?", (rowid,))
+        conn.execute(
+            "INSERT INTO issues_fts (rowid, " + ", ".join(cols) + ") VALUES (?" + ", ?" * len(cols) + ")",
+            (rowid, *(row[c] or "" for c in cols)),
+        )
+    return True
+
+
+def upsert_many(issues: Iterable[Dict[str, Any]], gen: Optional[int] = None) -> int:
+    conn = _db()
+    n = 0
+    with conn:
+        for it in issues:
+            n += _upsert(conn, it, _gen if gen is None else gen)
+    return n
+
+
+def delete(key: str) -> None:
+    conn = _db()
+    with conn:
+        row = conn.execute("SELECT id FROM issues WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return
+        if _fts:
+            conn.execute("DELETE FROM issues_fts WHERE rowid = ?", (row[0],))
+        conn.execute("DELETE FROM issues WHERE id = ?", (row[0],))
+
+
+def _begin_sync() -> int:
+    global _gen
+    conn = _db()
+    with conn:
+        _gen += 1
+        conn.execute("INSERT OR REPLACE INTO meta (k, v) VALUES ('gen', ?)", (str(_gen),))
+    return _gen
+
+
+def _finish_sync(gen: int) -> int:
+    """Удалить записи, которых не было в выгрузке gen; отметить время синхронизации."""
+    conn = _db()
+    with conn:
+        if _fts:
+            conn.execute("DELETE FROM issues_fts WHERE rowid IN (SELECT id FROM issues WHERE gen < ?)", (gen,))
+        removed = conn.execute("DELETE FROM issues WHERE gen < ?", (gen,)).rowcount
+        conn.execute("INSERT OR REPLACE INTO meta (k, v) VALUES ('synced_at', ?)", (str(time.time()),))
+    return removed
+
+
+def synced_at() -> float:
+    row = _db().execute("SELECT v FROM meta WHERE k = 'synced_at'").fetchone()
+    return float(row[0]) if row else 0.0
+
+
+def get(key: str) -> Optional[Dict[str, Any]]:
+    """Последняя известная версия задачи (JSON как из Jira) или None."""
+    row = _db().execute("SELECT data FROM issues WHERE key = ?", (key,)).fetchone()
+    return json.loads(row[0]) if row else None
+
+
+# номер задачи из ключа: REG-120 -> 120 (новее задача — больше номер)
+_KEY_NUM = "CAST(substr(key, instr(key, '-') + 1) AS INTEGER)"
+
+
+def latest(dept: str, field_id: Optional[str] = None, value: Optional[str] = None) -> Optional[Dict[str, Any]]:
+    """Последняя (по номеру) запись отдела, при field_id — с этим значением поля; как search_latest_*."""
+    sql = "SELECT data FROM issues WHERE dept = ?"
+    args: List[Any] = [dept]
+    if field_id:
+        path = f'$.fields."{field_id}"'
+        sql += " AND coalesce(json_extract(data, ?), json_extract(data, ?), json_extract(data, ?)) = ?"
+        args += [path + ".value", path + ".name", path, value]
+    row = _db().execute(sql + f" ORDER BY {_KEY_NUM} DESC LIMIT 1", args).fetchone()
+    return json.loads(row[0]) if row else None
+
+
+def of_dept(dept: str, limit: int) -> List[Dict[str, Any]]:
+    rows = _db().execute(
+        f"SELECT data FROM issues WHERE dept = ? ORDER BY {_KEY_NUM} LIMIT ?", (dept, limit),
+    ).fetchall()
+    return [json.loads(r[0]) for r in rows]
+
+
+def _fts_query(text: str) -> str:
+    # каждое слово — префиксный поиск; кавычки экранируют синтаксис FTS5
+    words = re.findall(r"\w+", text.lower())[:8]
+    return " ".join(f'"{w}"*' for w in words)
+
+
+def search(text: str, limit: int) -> List[Dict[str, Any]]:
+    """Совпадения по убыванию релевантности: key, dept, system, snippet."""
+    conn = _db()
+    if _fts:
+        q = _fts_query(text)
+        if not q:
+            return []
+        rows = conn.execute(
+            "SELECT i.key, i.dept, i.system, "
+            "snippet(issues_fts, -1, char(2), char(3), '…', 10) "
+            "FROM issues_fts JOIN issues i ON i.id = issues_fts.rowid "
+            f"WHERE issues_fts MATCH ? ORDER BY bm25(issues_fts, {_BM25_WEIGHTS}) LIMIT ?",
+            (q, limit),
+        ).fetchall()
+    else:
+        # % и _ из запроса ищутся как обычные символы
+        escaped = re.sub(r"([\\%_])", r"\\\1", text.strip())
+        like = f"%{escaped}%"
+        cols = [c for c, _ in _TEXT_COLUMNS]
+        rows = conn.execute(
+            "SELECT key, dept, system, NULL FROM issues WHERE "
+            + " OR ".join(f"{c} LIKE ? ESCAPE '\\'" for c in cols) + " ORDER BY key LIMIT ?",
+            (*([like] * len(cols)), limit),
+        ).fetchall()
+    return [{"key": k, "dept": d, "system": s, "snippet": sn} for k, d, s, sn in rows]
+
+
+def stats() -> Dict[str, Any]:
+    conn = _db()
+    return {
+        "issues": conn.execute("SELECT count(*) FROM issues").fetchone()[0],
+        "fts": _fts,
+        "synced_at": synced_at(),
+    }
+
+# ---------------------- асинхронное API ---------------------------
+
+async def _run(fn, *args, **kwargs):
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_executor, functools.partial(fn, *args, **kwargs))
+
+
+async def last_sync() -> float:
+    """Время последней полной выгрузки (0 — зеркало ещё не заполнено)."""
+    return await _run(synced_at)
+
+
+async def status() -> Dict[str, Any]:
+    return await _run(stats)
+
+
+async def observe_issue(issue: Dict[str, Any]) -> None:
+    """Актуальная версия задачи из вебхука."""
+    try:
+        await _run(upsert_many, [issue])
+    except Exception as e:
+        log.warning("Mirror update failed for %s: %s", issue.get("key"), e)
+
+
+async def lookup(key: str) -> Optional[Dict[str, Any]]:
+    """Последняя версия задачи в зеркале (None — нет или база недоступна)."""
+    try:
+        return await _run(get, key)
+    except Exception as e:
+        log.warning("Mirror lookup failed for %s: %s", key, e)
+        return None
+
+
+async def latest_known(dept: str, field_id: Optional[str] = None,
+                       value: Optional[str] = None) -> Optional[Dict[str, Any]]:
+    return await _run(latest, dept, field_id, value)
+
+
+async def dept_issues(dept: str, limit: int) -> List[Dict[str, Any]]:
+    return await _run(of_dept, dept, limit)
+
+
+async def find(text: str, limit: int) -> List[Dict[str, Any]]:
+    return await _run(search, text, limit)
+
+
+async def sync_full() -> None:
+    """Полная выгрузка проекта (поля карточки) пачками по _BATCH задач."""
+    t0 = time.monotonic()
+    gen = await _run(_begin_sync)
+    batch: List[Dict[str, Any]] = []
+    total = 0
+    async for it in iter_search(f'project = "{PROJECT_KEY}"', ",".join(card_field_ids())):
+        batch.append(it)
+        if len(batch) >= _BATCH:
+            total += len(batch)
+            await _run(upsert_many, batch, gen)
+            batch = []
+    if batch:
+        total += len(batch)
+        await _run(upsert_many, batch, gen)
+    removed = await _run(_finish_sync, gen)
+    log.info("Mirror synced: %s issues, %s removed, %.1fs", total, removed, time.monotonic() - t0)
+
+
+def _get_sync_lock() -> asyncio.Lock:
+    global _sync_lock
+    if _sync_lock is None:
+        _sync_lock = asyncio.Lock()
+    return _sync_lock
+
+
+async def ensure_synced(max_age: Optional[float] = None) -> None:
+    """Выгрузить, если зеркало ни разу не синхронизировалось (или старше max_age)."""
+    async with _get_sync_lock():
+        last = await _run(synced_at)
+        if last and (max_age is None or time.time() - last < max_age):
+            return
+        await sync_full()
+
+
+async def _refresh_loop() -> None:
+    while True:
+        try:
+            await ensure_synced(MIRROR_RESYNC_SEC)
+            last = await _run(synced_at)
+            delay = max(60.0, last + MIRROR_RESYNC_SEC - time.time())
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            log.warning("Mirror sync failed: %s", e)
+            delay = 60.0
+        await asyncio.sleep(delay)
+
+
+def start_refresher() -> None:
+    global _refresher
+    if _refresher is None or _refresher.done():
+        _refresher = asyncio.get_running_loop().create_task(_refresh_loop())
+
+
+async def stop_refresher() -> None:
+    global _refresher
+    if _refresher is not None:
+        _refresher.cancel()
+        try:
+            await _refresher
+        except (asyncio.CancelledError, Exception):
+            pass
+        _refresher = None
@@ -0,0 +1,214 @@
+# -*- coding: utf-8 -*-
+"""
+Очередь исходящих уведомлений в Telegram.
+
+- общий лимит (~30 сообщений/с на бота) и лимит на чат — токен-бакеты;
+- разные чаты отправляются параллельно пулом воркеров;
+- RetryAfter (flood control) приостанавливает все отправки на указанное время,
+  сообщение возвращается в очередь;
+- submit() только ставит сообщения в очередь, поэтому /jira-webhook
+  не ждёт рассылки. Можно вызывать из любого потока;
+- id trace, в котором вызван submit(), едет вместе с сообщением: отправка
+  идёт в trace с тем же id (spans Bot API, trace_id в строках лога).
+"""
+from __future__ import annotations
+import asyncio
+import logging
+import time
+from contextlib import nullcontext
+from dataclasses import dataclass
+from typing import Any, Dict, Iterable, List, Optional
+
+from telegram.error import Forbidden, BadRequest, NetworkError, RetryAfter, TelegramError
+
+from .settings import TG_GLOBAL_RATE, TG_CHAT_RATE, TG_SEND_WORKERS, TG_SEND_RETRIES
+from . import metrics, tracing
+
+log = logging.getLogger("it_registry.notifier")
+
+
+class TokenBucket:
+    """Классический токен-бакет: rate токенов в секунду, не больше capacity."""
+
+    def __init__(self, rate: float, capacity: float = 1.0):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.ts = time.monotonic()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.ts) * self.rate)
+        self.ts = now
+
+    def is_full(self) -> bool:
+        self._refill()
+        return self.tokens >= self.capacity
+
+    async def acquire(self) -> None:
+        while True:
+            self._refill()
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return
+            await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+@dataclass
+class _Job:
+    chat_id: int
+    text: str
+    parse_mode: Optional[str] = "HTML"
+    attempt: int = 0
+    trace_id: Optional[str] = None
+
+
+_bot: Any = None
+_loop: Optional[asyncio.AbstractEventLoop] = None
+_queue: Optional["asyncio.Queue[_Job]"] = None
+_workers: List[asyncio.Task] = []
+
+_global_bucket: Optional[TokenBucket] = None
+_chat_buckets: Dict[int, TokenBucket] = {}
+_paused_until = 0.0
+
+_sent = 0
+_failed = 0
+
+# когда чатов с бакетами становится больше — выбрасываем простаивающие
+_CHAT_BUCKETS_SOFT_MAX = 10_000
+
+
+def _chat_bucket(chat_id: int) -> TokenBucket:
+    b = _chat_buckets.get(chat_id)
+    if b is None:
+        if len(_chat_buckets) >= _CHAT_BUCKETS_SOFT_MAX:
+            for cid in [c for c, cb in _chat_buckets.items() if cb.is_full()]:
+                del _chat_buckets[cid]
+        b = _chat_buckets[chat_id] = TokenBucket(TG_CHAT_RATE)
+    return b
+
+
+async def _send(job: _Job) -> None:
+    await _chat_bucket(job.chat_id).acquire()
+    while True:
+        pause = _paused_until - time.monotonic()
+        if pause <= 0:
+            break
+        await asyncio.sleep(pause)
+    await _global_bucket.acquire()
+    # ожидание лимитов в trace не входит — только сама отправка
+    with tracing.trace("telegram send", job.trace_id) if job.trace_id else nullcontext():
+        await _send_now(job)
+
+
+async def _send_now(job: _Job) -> None:
+    global _sent, _failed, _paused_until
+    try:
+        with metrics.TG_SEND_LATENCY.time():
+            await _bot.send_message(job.chat_id, job.text, parse_mode=job.parse_mode)
+        _sent += 1
+        metrics.TG_SENT.inc()
+    except RetryAfter as e:
+        metrics.TG_ERRORS.inc(reason="retry_after")
+        delay = float(e.retry_after)
+        _paused_until = max(_paused_until, time.monotonic() + delay)
+        log.warning("Flood control: pause %.1fs (chat=%s)", delay, job.chat_id)
+        _requeue(job)
+    except (Forbidden, BadRequest) as e:
+        # бот заблокирован / чат не найден — повтор не поможет
+        metrics.TG_ERRORS.inc(reason="forbidden" if isinstance(e, Forbidden) else "bad_request")
+        _failed += 1
+        log.warning("Send fail chat=%s: %s", job.chat_id, e)
+    except TelegramError as e:
+        metrics.TG_ERRORS.inc(reason="network" if isinstance(e, NetworkError) else "other")
+        if job.attempt < TG_SEND_RETRIES:
+            await asyncio.sleep(min(30.0, 2 ** job.attempt))
+            _requeue(job)
+        else:
+            _failed += 1
+            log.warning("Send fail chat=%s after %s attempts: %s", job.chat_id, job.attempt + 1, e)
+
+
+def _requeue(job: _Job) -> None:
+    job.attempt += 1
+    _queue.put_nowait(job)
+
+
+async def _worker() -> None:
+    while True:
+        job = await _queue.get()
+        try:
+            await _send(job)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            log.exception("Unexpected send error chat=%s: %s", job.chat_id, e)
+        finally:
+            _queue.task_done()
+
+
+def start(bot: Any) -> None:
+    """Запустить воркеры в текущем event loop (вызывается из post_init бота)."""
+    global _bot, _loop, _queue, _global_bucket
+    if _workers:
+        return
+    _bot = bot
+    _loop = asyncio.get_running_loop()
+    _queue = asyncio.Queue()
+    _global_bucket = TokenBucket(TG_GLOBAL_RATE, capacity=TG_GLOBAL_RATE)
+    for _ in range(max(1, TG_SEND_WORKERS)):
+        _workers.append(_loop.create_task(_worker()))
+    log.info("Notifier started: %s workers, %.1f msg/s global, %.1f msg/s per chat",
+             len(_workers), TG_GLOBAL_RATE, TG_CHAT_RATE)
+
+
+async def stop(drain_timeout: float = 5.0) -> None:
+    """Дать очереди дослаться (не дольше drain_timeout) и остановить воркеры."""
+    global _loop
+    if not _workers:
+        return
+    try:
+        await asyncio.wait_for(_queue.join(), timeout=drain_timeout)
+    except asyncio.TimeoutError:
+        log.warning("Notifier stopped with %s messages left in queue", _queue.qsize())
+    for t in _workers:
+        t.cancel()
+    await asyncio.gather(*_workers, return_exceptions=True)
+    _workers.clear()
+    _loop = None
+
+
+def _enqueue(jobs: List[_Job]) -> None:
+    for job in jobs:
+        _queue.put_nowait(job)
+
+
+def submit(chat_ids: Iterable[int], text: str, parse_mode: Optional[str] = "HTML") -> int:
+    """Поставить одно сообщение в очередь для каждого chat_id. Не блокирует."""
+    trace_id = tracing.current_id()
+    trace_id = trace_id if trace_id != "-" else None
+    jobs = [_Job(int(cid), text, parse_mode, trace_id=trace_id) for cid in chat_ids]
+    if not jobs:
+        return 0
+    if _loop is None or _loop.is_closed():
+        log.warning("Notifier is not running, %s messages dropped", len(jobs))
+        return 0
+    try:
+        running = asyncio.get_running_loop()
+    except RuntimeError:
+        running = None
+    if running is _loop:
+        _enqueue(jobs)
+    else:
+        _loop.call_soon_threadsafe(_enqueue, jobs)
+    return len(jobs)
+
+
+def stats() -> Dict[str, Any]:
+    return {
+        "queued": _queue.qsize() if _queue is not None else 0,
+        "sent": _sent,
+        "failed": _failed,
+        "paused_for": round(max(0.0, _paused_until - time.monotonic()), 1),
+    }
@@ -0,0 +1,53 @@
+# -*- coding: utf-8 -*-
+"""
+Сэмплирующий профилировщик работающего процесса (для /admin/profile).
+
+Отдельный поток раз в interval снимает стеки всех потоков
+(sys._current_frames) и считает одинаковые стеки. Результат — формат
+collapsed stacks ("поток;модуль:функция;... N"), его понимают
+flamegraph.pl и speedscope. Код бота не инструментируется и не замедляется,
+кроме самого потока-сэмплера.
+"""
+from __future__ import annotations
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from typing import Dict
+
+_busy = threading.Lock()
+
+
+class ProfilerBusy(RuntimeError):
+    pass
+
+
+def _frame_name(frame) -> str:
+    code = frame.f_code
+    return f"{os.path.basename(code.co_filename)}:{code.co_name}"
+
+
+def sample(seconds: float, interval: float = 0.005) -> str:
+    """Блокирующий сбор профиля; вызывать из отдельного потока (asyncio.to_thread)."""
+    if not _busy.acquire(blocking=False):
+        raise ProfilerBusy("profiler is already running")
+    try:
+        me = threading.get_ident()
+        stacks: Counter = Counter()
+        deadline = time.monotonic() + seconds
+        while time.monotonic() < deadline:
+            names: Dict[int, str] = {t.ident: t.name for t in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == me:
+                    continue
+                parts = []
+                while frame is not None:
+                    parts.append(_frame_name(frame))
+                    frame = frame.f_back
+                parts.append(names.get(ident, str(ident)))
+                stacks[";".join(reversed(parts))] += 1
+            time.sleep(interval)
+        return "".join(f"{stack} {n}\n" for stack, n in stacks.most_common())
+    finally:
+        _busy.release()
@@ -0,0 +1,206 @@
+# -*- coding: utf-8 -*-
+"""
+Сверка пропущенных вебхуков.
+
+Раз в RECONCILE_INTERVAL_SEC один запрос
+    project = REG AND updated >= "-Nm"
+(N — минуты с курсора плюс RECONCILE_OVERLAP_SEC; относительная дата
+не зависит от часового пояса пользователя Jira). Задачи, чью версию
+(fields.updated) уже обработал /jira-webhook, пропускаются, остальные
+уходят в тот же конвейер уведомлений, что и вебхук.
+
+За проход отправляется не больше RECONCILE_MAX пропущенных задач; тогда
+курсор останавливается на последней просмотренной и следующий проход
+продолжает с неё.
+
+Курсор — самое позднее updated среди просмотренных задач (UTC); вместе
+с недавно обработанными версиями хранится в $DATA_DIR/reconciler.json,
+поэтому после простоя бот досылает всё, что изменилось за время простоя.
+Первый запуск начинает с текущего момента.
+"""
+from __future__ import annotations
+import asyncio
+import datetime as dt
+import logging
+import math
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional
+
+from .settings import PROJECT_KEY, RECONCILE_INTERVAL_SEC, RECONCILE_OVERLAP_SEC, RECONCILE_MAX
+from .store import DATA_DIR, load_json, save_json
+from .jira_client import iter_search
+from .issue_cache import updated_at
+
+log = logging.getLogger("it_registry.reconciler")
+
+STATE_FILE = os.path.join(DATA_DIR, "reconciler.json")
+
+_HANDLED_MAX = 20_000
+
+_lock = threading.Lock()
+# key -> fields.updated последней обработанной версии (строка как в Jira)
+_handled: "OrderedDict[str, str]" = OrderedDict()
+_cursor: Optional[dt.datetime] = None
+_loaded = False
+_last_run: Optional[dt.datetime] = None
+_enqueued = 0
+
+_refresher: Optional[asyncio.Task] = None
+
+
+def _parse(raw: Optional[str]) -> Optional[dt.datetime]:
+    return updated_at({"fields": {"updated": raw}}) if raw else None
+
+
+def mark_handled(issue: Dict[str, Any]) -> None:
+    """Версия задачи разослана (вызывает конвейер вебхуков)."""
+    key = issue.get("key")
+    raw = (issue.get("fields") or {}).get("updated")
+    if not key or not raw:
+        return
+    with _lock:
+        prev = _parse(_handled.get(key))
+        new = _parse(raw)
+        if prev is not None and new is not None and prev > new:
+            return
+        _handled[key] = raw
+        _handled.move_to_end(key)
+        while len(_handled) > _HANDLED_MAX:
+            _handled.popitem(last=False)
+
+
+def is_handled(issue: Dict[str, Any]) -> bool:
+    """Эта (или более новая) версия задачи уже разослана."""
+    return _is_handled(issue.get("key") or "", (issue.get("fields") or {}).get("updated"))
+
+
+def _is_handled(key: str, raw: Optional[str]) -> bool:
+    with _lock:
+        prev = _handled.get(key)
+    if prev is None or not raw:
+        return False
+    p, n = _parse(prev), _parse(raw)
+    return p is not None and n is not None and p >= n
+
+
+def _load_state() -> None:
+    global _cursor, _loaded
+    if _loaded:
+        return
+    data = load_json(STATE_FILE)
+    with _lock:
+        if data.get("cursor"):
+            try:
+                _cursor = dt.datetime.fromisoformat(data["cursor"])
+            except ValueError:
+                log.warning("Bad reconciler cursor %r, starting from now", data["cursor"])
+        for key, raw in (data.get("handled") or {}).items():
+            _handled.setdefault(key, raw)
+    _loaded = True
+
+
+def _save_state() -> None:
+    with _lock:
+        if _cursor is None:
+            return
+        # повторно запрос вернёт только задачи не старше курсора минус перекрытие
+        horizon = _cursor - dt.timedelta(seconds=RECONCILE_OVERLAP_SEC)
+        handled = {k: raw for k, raw in _handled.items()
+                   if (_parse(raw) or horizon) >= horizon}
+        data = {"cursor": _cursor.isoformat(), "handled": handled}
+    try:
+        save_json(STATE_FILE, data)
+    except Exception as e:
+        log.warning("Cannot save reconciler state: %s", e)
+
+
+async def reconcile_once(submit: Callable[[str], None]) -> int:
+    """Один проход; submit(key) ставит задачу в конвейер. Возвращает число отправленных."""
+    global _cursor, _last_run, _enqueued
+    _load_state()
+    now = dt.datetime.now(dt.timezone.utc)
+    _last_run = now
+    if _cursor is None:
+        _cursor = now
+        _save_state()
+        log.info("Reconciler cursor initialised at %s", now.isoformat())
+        return 0
+
+    minutes = math.ceil(max(0.0, (now - _cursor).total_seconds() + RECONCILE_OVERLAP_SEC) / 60) or 1
+    jql = f'project = "{PROJECT_KEY}" AND updated >= "-{minutes}m" ORDER BY updated ASC'
+    newest = _cursor
+    seen = sent = 0
+    capped = False
+    # страницы по порядку (concurrency=1): курсор двигается только до задачи,
+    # все предшественники которой уже просмотрены. Обработанные вебхуком
+    # задачи в RECONCILE_MAX не засчитываются — иначе окно, целиком занятое
+    # ими, не давало бы дойти до пропущенных
+    async for it in iter_search(jql, "updated", concurrency=1):
+        key = it.get("key")
+        raw = (it.get("fields") or {}).get("updated")
+        if key and not _is_handled(key, raw):
+            if sent >= RECONCILE_MAX:
+                capped = True
+                break
+            submit(key)
+            sent += 1
+        seen += 1
+        ts = _parse(raw)
+        if ts is not None and ts > newest:
+            newest = ts
+
+    _cursor = newest.astimezone(dt.timezone.utc)
+    _enqueued += sent
+    _save_state()
+    if sent:
+        log.info("Reconciler: %s changed issues in the last %s min, %s missed by webhooks",
+                 seen, minutes, sent)
+    if capped:
+        log.warning("Reconciler sent RECONCILE_MAX=%s missed issues, the rest (after %s) "
+                    "is picked up on the next pass", RECONCILE_MAX, _cursor.isoformat())
+    return sent
+
+
+async def _refresh_loop(submit: Callable[[str], None]) -> None:
+    # первый проход сразу: досылаем то, что пропустили, пока бот был выключен
+    while True:
+        try:
+            await reconcile_once(submit)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            log.warning("Reconcile pass failed: %s", e)
+        await asyncio.sleep(RECONCILE_INTERVAL_SEC)
+
+
+def start_refresher(submit: Callable[[str], None]) -> None:
+    global _refresher
+    if RECONCILE_INTERVAL_SEC <= 0:
+        return
+    if _refresher is None or _refresher.done():
+        _refresher = asyncio.get_running_loop().create_task(_refresh_loop(submit))
+
+
+async def stop_refresher() -> None:
+    global _refresher
+    if _refresher is not None:
+        _refresher.cancel()
+        try:
+            await _refresher
+        except (asyncio.CancelledError, Exception):
+            pass
+        _refresher = None
+    if _loaded:
+        _save_state()
+
+
+def stats() -> Dict[str, Any]:
+    with _lock:
+        return {
+            "cursor": _cursor.isoformat() if _cursor else None,
+            "last_run": _last_run.isoformat() if _last_run else None,
+            "enqueued": _enqueued,
+            "handled_tracked": len(_handled),
+        }
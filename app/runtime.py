@@ -0,0 +1,60 @@
+# -*- coding: utf-8 -*-
+"""
+Общий жизненный цикл сервисов бота: пул Jira, каталог полей, кэш группы
+редакторов, индекс отделов и очередь уведомлений.
+
+server.py запускает uvicorn и Telegram Application в одном event loop
+и вызывает startup()/shutdown() сам; при запуске бота отдельно
+(Application.run_polling) их вызывают post_init/post_shutdown из bot.py.
+"""
+from __future__ import annotations
+import logging
+from typing import Optional
+
+from telegram.ext import Application
+
+from .jira_client import open_client, close_client
+from . import values_index, notifier, fields, groups, mirror, reconciler, webhooks
+
+log = logging.getLogger("it_registry.runtime")
+
+_started = False
+
+
+async def startup(tg_app: Optional[Application]) -> None:
+    """tg_app=None — Telegram отключён (DISABLE_TG=1), уведомления не отправляются."""
+    global _started
+    if _started:
+        return
+    _started = True
+    # общий пул соединений к Jira
+    await open_client()
+    # каталог полей Jira (имена полей, ID полей карточки)
+    fields.start_refresher()
+    # состав группы редакторов — в памяти, проверка /edit без запросов к Jira
+    groups.start_refresher()
+    # индекс отделов/фильтров: построение при первом запуске и фоновое обновление
+    values_index.start_refresher()
+    # локальное зеркало реестра для /find: полная выгрузка и периодическая сверка
+    mirror.start_refresher()
+    # сверка пропущенных вебхуков: updated >= курсор -> тот же конвейер уведомлений
+    reconciler.start_refresher(webhooks.enqueue_reconciled)
+    # очередь уведомлений; вебхук только ставит в неё сообщения
+    if tg_app is not None:
+        notifier.start(tg_app.bot)
+
+
+async def shutdown(tg_app: Optional[Application]) -> None:
+    global _started
+    if not _started:
+        return
+    _started = False
+    from .storage import flush_users
+    await flush_users()
+    await reconciler.stop_refresher()
+    await notifier.stop()
+    await values_index.stop_refresher()
+    await mirror.stop_refresher()
+    await fields.stop_refresher()
+    await groups.stop_refresher()
+    await close_client()
@@ -14,8 +14,94 @@ DEPARTMENT_FIELD_ID = getenv("DEPARTMENT_FIELD_ID", "customfield_10100")  # "О
 REG_EDITORS_GROUP = getenv("REG_EDITORS_GROUP", "reg_editors")
 VERIFY_SSL = (getenv("JIRA_VERIFY_SSL", "true").lower() not in {"0", "false", "no"})
 
+# Пакетный /info: максимум ключей/записей отдела за одну команду
+INFO_BATCH_LIMIT = int(getenv("INFO_BATCH_LIMIT", "100"))
+
+# Кэш членства в группе редакторов: период обновления, сек; порог «большой» группы
+GROUP_CACHE_TTL = float(getenv("GROUP_CACHE_TTL", "600"))
+GROUP_CACHE_MAX_MEMBERS = int(getenv("GROUP_CACHE_MAX_MEMBERS", "5000"))
+# старше этого состав не используется: перечитываем сразу, при ошибке — отказ
+GROUP_CACHE_MAX_STALE = float(getenv("GROUP_CACHE_MAX_STALE", "1800"))
+
 # Таймауты/прочее
 HTTP_TIMEOUT = float(getenv("HTTP_TIMEOUT", "15"))
 
+# Пул соединений к Jira (один долгоживущий клиент на всё приложение)
+JIRA_HTTP2 = getenv("JIRA_HTTP2", "false").lower() in {"1", "true", "yes", "on"}  # нужен пакет h2
+JIRA_MAX_CONNECTIONS = int(getenv("JIRA_MAX_CONNECTIONS", "20"))
+JIRA_MAX_KEEPALIVE = int(getenv("JIRA_MAX_KEEPALIVE", "10"))
+JIRA_KEEPALIVE_EXPIRY = float(getenv("JIRA_KEEPALIVE_EXPIRY", "30"))
+# Circuit breaker: после стольких ошибок Jira подряд запросы сразу отклоняются
+# (0 — выключен); через сколько секунд пробовать снова
+JIRA_BREAKER_FAILURES = int(getenv("JIRA_BREAKER_FAILURES", "5"))
+JIRA_BREAKER_RESET_SEC = float(getenv("JIRA_BREAKER_RESET_SEC", "30"))
+
+# true — читать задачи целиком (все поля) вместо полей карточки
+JIRA_FULL_FETCH = getenv("JIRA_FULL_FETCH", "false").lower() in {"1", "true", "yes", "on"}
+
+# Каталог полей Jira (/rest/api/2/field): период обновления, сек
+FIELD_CATALOG_TTL = float(getenv("FIELD_CATALOG_TTL", "3600"))
+
+# Пагинация /search: размер страницы и число параллельных запросов страниц
+SEARCH_PAGE_SIZE = int(getenv("SEARCH_PAGE_SIZE", "100"))
+SEARCH_CONCURRENCY = int(getenv("SEARCH_CONCURRENCY", "4"))
+
+# Варианты Select-полей брать из метаданных Jira (createmeta/editmeta), а не сканом задач
+SELECT_OPTIONS_FROM_META = getenv("SELECT_OPTIONS_FROM_META", "true").lower() not in {"0", "false", "no"}
+
+# LRU-кэш задач (/info, вебхуки): размер и срок жизни записи, сек
+ISSUE_CACHE_SIZE = int(getenv("ISSUE_CACHE_SIZE", "1000"))
+ISSUE_CACHE_TTL = float(getenv("ISSUE_CACHE_TTL", "300"))
+
+# Индекс уникальных значений (отделы/фильтры): период фоновой перестройки, сек
+VALUES_INDEX_TTL = float(getenv("VALUES_INDEX_TTL", "3600"))
+
+# Склейка событий /jira-webhook по ключу задачи: окно тишины и предел ожидания, сек
+WEBHOOK_DEBOUNCE_SEC = float(getenv("WEBHOOK_DEBOUNCE_SEC", "3"))
+WEBHOOK_DEBOUNCE_MAX_SEC = float(getenv("WEBHOOK_DEBOUNCE_MAX_SEC", "15"))
+# Вебхук версии 2 (Groovy/groovyListener.groovy) несёт поля карточки — задача
+# берётся из него без запроса к Jira; false — всегда перечитывать из Jira.
+WEBHOOK_TRUST_PAYLOAD = getenv("WEBHOOK_TRUST_PAYLOAD", "true").lower() in {"1", "true", "yes", "on"}
+# Общий секрет листенера (заголовок X-Webhook-Secret); пусто — без проверки
+JIRA_WEBHOOK_SECRET = getenv("JIRA_WEBHOOK_SECRET", "")
+
+# Рассылка уведомлений в Telegram: общий лимит и лимит на чат (сообщений/с),
+# число параллельных отправок и повторов при сетевых ошибках
+TG_GLOBAL_RATE = float(getenv("TG_GLOBAL_RATE", "25"))
+TG_CHAT_RATE = float(getenv("TG_CHAT_RATE", "1"))
+TG_SEND_WORKERS = int(getenv("TG_SEND_WORKERS", "16"))
+TG_SEND_RETRIES = int(getenv("TG_SEND_RETRIES", "3"))
+
 # Включить подробный лог сырого значения для поля типа "Owners"/"Ответственные"
+# (пишется только на уровне DEBUG и лишь для доли рендеров OWNERS_LOG_SAMPLE)
 LOG_PEOPLE_FIELD = True
+OWNERS_LOG_SAMPLE = float(getenv("OWNERS_LOG_SAMPLE", "0.01"))
+
+# Кэш готовых карточек (key, updated) -> HTML
+CARD_CACHE_SIZE = int(getenv("CARD_CACHE_SIZE", "512"))
+
+# Уведомлять, только если изменилось видимое в карточке (отдел, статус, поля карточки);
+# помечать изменённые поля в заголовке; сколько задач помнить (отпечатки карточек)
+NOTIFY_ONLY_CARD_CHANGES = getenv("NOTIFY_ONLY_CARD_CHANGES", "true").lower() in {"1", "true", "yes", "on"}
+NOTIFY_MARK_CHANGES = getenv("NOTIFY_MARK_CHANGES", "true").lower() in {"1", "true", "yes", "on"}
+CARD_FINGERPRINTS_SIZE = int(getenv("CARD_FINGERPRINTS_SIZE", "20000"))
+
+# Трассировка апдейтов: обработка дольше порога (мс) пишется в лог как медленная
+SLOW_UPDATE_MS = float(getenv("SLOW_UPDATE_MS", "1000"))
+
+# /admin/profile: токен в заголовке X-Admin-Token (пусто — эндпоинт выключен)
+# и максимальная длительность снятия профиля, сек
+ADMIN_TOKEN = getenv("ADMIN_TOKEN", "")
+PROFILE_MAX_SECONDS = float(getenv("PROFILE_MAX_SECONDS", "60"))
+
+# Локальное зеркало реестра для /find: период полной пересинхронизации, сек;
+# сколько совпадений показывать
+MIRROR_RESYNC_SEC = float(getenv("MIRROR_RESYNC_SEC", "21600"))
+FIND_LIMIT = int(getenv("FIND_LIMIT", "10"))
+
+# Сверка пропущенных вебхуков: период запроса updated >= курсор, сек (0 — выключено);
+# перекрытие окна на задержку индексации Jira и расхождение часов, сек;
+# максимум задач за один проход (остальные — на следующем)
+RECONCILE_INTERVAL_SEC = float(getenv("RECONCILE_INTERVAL_SEC", "300"))
+RECONCILE_OVERLAP_SEC = float(getenv("RECONCILE_OVERLAP_SEC", "120"))
+RECONCILE_MAX = int(getenv("RECONCILE_MAX", "500"))
@@ -1,19 +1,40 @@
 from __future__ import annotations
-import os, datetime as dt
-from typing import Optional
-from sqlalchemy import create_engine, Column, Integer, BigInteger, String, Boolean, DateTime, select
+import os, asyncio, functools, logging, datetime as dt
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, List, Optional, Tuple
+from sqlalchemy import create_engine, event, func, Integer, BigInteger, String, Boolean, DateTime, Index, select
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 from sqlalchemy.orm import DeclarativeBase, Session, Mapped, mapped_column
 
+from .tracing import span
+
+log = logging.getLogger("it_registry.storage")
+
 DB_PATH = os.getenv("DB_PATH", "/data/bot.db")
 os.makedirs(os.path.dirname(DB_PATH), exist_ok=True)
+# задержка группировки upsert'ов из /start, сек
+DB_FLUSH_DELAY = float(os.getenv("DB_FLUSH_DELAY", "0.5"))
 
 engine = create_engine(f"sqlite:///{DB_PATH}", future=True, echo=False)
 
+@event.listens_for(engine, "connect")
+def _sqlite_pragmas(dbapi_conn, _record):
+    # WAL: читатели не ждут писателя; NORMAL достаточно для WAL
+    cur = dbapi_conn.cursor()
+    cur.execute("PRAGMA journal_mode=WAL")
+    cur.execute("PRAGMA synchronous=NORMAL")
+    cur.execute("PRAGMA busy_timeout=5000")
+    cur.close()
+
 class Base(DeclarativeBase):
     pass
 
 class User(Base):
     __tablename__ = "users"
+    __table_args__ = (
+        # выборка подписчиков отдела: WHERE dept = ? AND subscribed = 1
+        Index("ix_users_dept_subscribed", "dept", "subscribed"),
+    )
     id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
     tg_id: Mapped[int] = mapped_column(BigInteger, unique=True, nullable=False)
     tg_username: Mapped[Optional[str]] = mapped_column(String(255))
@@ -23,9 +44,14 @@ class User(Base):
     created_at: Mapped[dt.datetime] = mapped_column(DateTime, default=dt.datetime.utcnow)
 
 Base.metadata.create_all(engine)
+# create_all не добавляет индексы в уже существующую таблицу
+for _ix in User.__table__.indexes:
+    _ix.create(engine, checkfirst=True)
+
+# ---------------------- синхронное API ---------------------------
 
 def upsert_user(tg_id: int, tg_username: Optional[str]) -> User:
-    with Session(engine) as s:
+    with Session(engine, expire_on_commit=False) as s:
         u = s.scalar(select(User).where(User.tg_id == tg_id))
         if not u:
             u = User(tg_id=tg_id, tg_username=tg_username, subscribed=True)
@@ -38,6 +64,26 @@ def upsert_user(tg_id: int, tg_username: Optional[str]) -> User:
                 s.commit()
         return u
 
+def upsert_users(rows: Iterable[Tuple[int, Optional[str]]], chunk: int = 200) -> int:
+    """Пакетный upsert (tg_id, tg_username) одним INSERT ... ON CONFLICT на чанк."""
+    latest: Dict[int, Optional[str]] = {}
+    for tg_id, tg_username in rows:
+        latest[int(tg_id)] = tg_username or latest.get(int(tg_id))
+    items = list(latest.items())
+    with engine.begin() as conn:
+        for i in range(0, len(items), chunk):
+            stmt = sqlite_insert(User).values([
+                {"tg_id": tg_id, "tg_username": name, "subscribed": True}
+                for tg_id, name in items[i:i + chunk]
+            ])
+            stmt = stmt.on_conflict_do_update(
+                index_elements=[User.tg_id],
+                # пустой username не затирает сохранённый
+                set_={"tg_username": func.coalesce(stmt.excluded.tg_username, User.tg_username)},
+            )
+            conn.execute(stmt)
+    return len(items)
+
 def set_dept(tg_id: int, dept: str) -> None:
     with Session(engine) as s:
         u = s.scalar(select(User).where(User.tg_id == tg_id))
@@ -55,9 +101,64 @@ def set_jira_username(tg_id: int, jira_username: str) -> None:
         s.commit()
 
 def get_users_by_dept(dept: str):
-    with Session(engine) as s:
+    with Session(engine, expire_on_commit=False) as s:
         return list(s.scalars(select(User).where(User.dept == dept, User.subscribed == True)).all())
 
 def get_user(tg_id: int):
-    with Session(engine) as s:
+    with Session(engine, expire_on_commit=False) as s:
         return s.scalar(select(User).where(User.tg_id == tg_id))
+
+# ---------------------- асинхронное API ---------------------------
+# Все обращения к SQLite идут через один выделенный поток: event loop
+# бота не блокируется, а писатель у базы всегда один.
+
+_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="sqlite")
+
+async def _run(fn, *args, **kwargs):
+    loop = asyncio.get_running_loop()
+    with span(f"sqlite {fn.__name__}"):
+        return await loop.run_in_executor(_executor, functools.partial(fn, *args, **kwargs))
+
+async def upsert_user_async(tg_id: int, tg_username: Optional[str]) -> User:
+    return await _run(upsert_user, tg_id, tg_username)
+
+async def upsert_users_async(rows: Iterable[Tuple[int, Optional[str]]]) -> int:
+    return await _run(upsert_users, list(rows))
+
+async def set_dept_async(tg_id: int, dept: str) -> None:
+    await _run(set_dept, tg_id, dept)
+
+async def set_jira_username_async(tg_id: int, jira_username: str) -> None:
+    await _run(set_jira_username, tg_id, jira_username)
+
+async def get_users_by_dept_async(dept: str) -> List[User]:
+    return await _run(get_users_by_dept, dept)
+
+async def get_user_async(tg_id: int) -> Optional[User]:
+    return await _run(get_user, tg_id)
+
+# ---- отложенная пакетная запись пользователей из /start ----
+
+_pending_users: Dict[int, Optional[str]] = {}
+_flush_task: Optional[asyncio.Task] = None
+
+def queue_upsert_user(tg_id: int, tg_username: Optional[str]) -> None:
+    """Не ждёт БД: пользователь попадёт в пакет, который запишется через DB_FLUSH_DELAY."""
+    global _flush_task
+    _pending_users[int(tg_id)] = tg_username or _pending_users.get(int(tg_id))
+    if _flush_task is None or _flush_task.done():
+        _flush_task = asyncio.get_running_loop().create_task(_flush_later())
+
+async def _flush_later() -> None:
+    await asyncio.sleep(DB_FLUSH_DELAY)
+    await flush_users()
+
+async def flush_users() -> None:
+    if not _pending_users:
+        return
+    rows = list(_pending_users.items())
+    _pending_users.clear()
+    try:
+        await upsert_users_async(rows)
+    except Exception as e:
+        log.warning("Batch upsert of %s users failed: %s", len(rows), e)
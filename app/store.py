@@ -1,9 +1,13 @@
 # -*- coding: utf-8 -*-
 from __future__ import annotations
 import json
+import logging
 import os
 import threading
-from typing import Dict, Tuple, List, Optional
+import time
+from typing import Any, Dict, Tuple, List, Optional, Set
+
+log = logging.getLogger("it_registry.store")
 
 # Файл для простой персистентности внутри контейнера
 DATA_DIR = os.getenv("DATA_DIR", "/app/data")
@@ -11,6 +15,15 @@ os.makedirs(DATA_DIR, exist_ok=True)
 PREFS_FILE = os.path.join(DATA_DIR, "tg_prefs.json")
 LOGINS_FILE = os.path.join(DATA_DIR, "tg_logins.json")
 
+# Режим записи:
+#   snapshot — каждый вызов переписывает весь JSON (как раньше);
+#   journal  — изменение дописывается одной строкой в <файл>.journal,
+#              снапшот пересобирается в фоне раз в STORE_COMPACT_EVERY записей.
+STORE_MODE = os.getenv("STORE_MODE", "snapshot").lower()
+# fsync журнала: 0 — после каждой записи, N>0 — групповой раз в N секунд, <0 — не делать
+STORE_FSYNC_INTERVAL = float(os.getenv("STORE_FSYNC_INTERVAL", "1"))
+STORE_COMPACT_EVERY = int(os.getenv("STORE_COMPACT_EVERY", "1000"))
+
 _prefs_lock = threading.RLock()
 _logins_lock = threading.RLock()
 
@@ -19,7 +32,15 @@ _prefs: Dict[str, Dict] = {}
 # logins: chat_id -> "jira-userkey"
 _logins: Dict[str, str] = {}
 
-def _load(path: str) -> Dict:
+# Обратные индексы подписок (под _prefs_lock), чтобы выбор получателей
+# вебхука стоил O(получателей), а не O(всех пользователей):
+#   dept -> {chat_id}
+#   (dept, field_id, value) -> {chat_id}
+_by_dept: Dict[str, Set[str]] = {}
+_by_filter: Dict[Tuple[str, str, str], Set[str]] = {}
+
+def load_json(path: str) -> Dict:
+    """JSON-файл из DATA_DIR; нет файла или он битый — пустой словарь."""
     if not os.path.exists(path):
         return {}
     try:
@@ -28,15 +49,194 @@ def _load(path: str) -> Dict:
     except Exception:
         return {}
 
-def _save(path: str, data: Dict) -> None:
+def save_json(path: str, data: Dict) -> None:
+    """Атомарная запись JSON (через временный файл и os.replace)."""
     tmp = path + ".tmp"
     with open(tmp, "w", encoding="utf-8") as f:
         json.dump(data, f, ensure_ascii=False, indent=2)
     os.replace(tmp, path)
 
+class _Persistence:
+    """
+    Сохранение словаря chat_id -> значение в одном из режимов STORE_MODE.
+    record() вызывается под блокировкой владельца данных (lock).
+    """
+
+    def __init__(self, path: str, data: Dict[str, Any], lock: threading.RLock):
+        self.path = path
+        self.journal = path + ".journal"
+        self.journal_old = self.journal + ".old"
+        self.data = data
+        self.lock = lock
+        self.journaled = STORE_MODE == "journal"
+        self._fh = None
+        self._records = 0
+        self._dirty = False
+        self._compacting = False
+
+    # ---- загрузка ----
+    def _replay(self, path: str) -> int:
+        if not os.path.exists(path):
+            return 0
+        n = 0
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    op = json.loads(line)
+                except ValueError:
+                    # оборванная последняя строка после аварийной остановки
+                    log.warning("Skip broken journal line in %s", path)
+                    continue
+                if op.get("v") is None:
+                    self.data.pop(op["k"], None)
+                else:
+                    self.data[op["k"]] = op["v"]
+                n += 1
+        return n
+
+    def load(self) -> None:
+        self.data.update(load_json(self.path))
+        # журнал реплеим и в режиме snapshot, чтобы переключение режима не теряло данные
+        n = self._replay(self.journal_old) + self._replay(self.journal)
+        if n:
+            log.info("Replayed %s journal records into %s", n, os.path.basename(self.path))
+        if self.journaled:
+            self._fh = open(self.journal, "a", encoding="utf-8")
+            self._records = n
+            if n:
+                self._start_compaction()
+        elif n:
+            save_json(self.path, self.data)
+            for p in (self.journal_old, self.journal):
+                if os.path.exists(p):
+                    os.remove(p)
+
+    # ---- запись ----
+    def record(self, key: str, value: Any) -> None:
+        if not self.journaled:
+            save_json(self.path, self.data)
+            return
+        self._fh.write(json.dumps({"k": key, "v": value}, ensure_ascii=False) + "\n")
+        self._fh.flush()
+        if STORE_FSYNC_INTERVAL == 0:
+            os.fsync(self._fh.fileno())
+        elif STORE_FSYNC_INTERVAL > 0:
+            self._dirty = True
+            _ensure_fsync_thread()
+        self._records += 1
+        if self._records >= STORE_COMPACT_EVERY:
+            self._start_compaction()
+
+    def fsync(self) -> None:
+        with self.lock:
+            if self._dirty and self._fh is not None:
+                os.fsync(self._fh.fileno())
+                self._dirty = False
+
+    # ---- компакция ----
+    def _write_snapshot(self, snap: Dict[str, Any]) -> None:
+        tmp = self.path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(snap, f, ensure_ascii=False)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.path)
+
+    def _start_compaction(self) -> None:
+        if self._compacting:
+            return
+        self._compacting = True
+        threading.Thread(target=self._compact, name="store-compact", daemon=True).start()
+
+    def _compact(self) -> None:
+        try:
+            with self.lock:
+                snap = dict(self.data)
+                self._fh.flush()
+                os.fsync(self._fh.fileno())
+                self._fh.close()
+                if os.path.exists(self.journal_old):
+                    # хвост прошлой прерванной компакции — дописываем, порядок сохраняется
+                    with open(self.journal_old, "a", encoding="utf-8") as dst, \
+                         open(self.journal, "r", encoding="utf-8") as src:
+                        dst.write(src.read())
+                    os.remove(self.journal)
+                else:
+                    os.replace(self.journal, self.journal_old)
+                self._fh = open(self.journal, "a", encoding="utf-8")
+                self._records = 0
+                self._dirty = False
+            # снапшот пишем без блокировки: всё из .old уже в snap
+            self._write_snapshot(snap)
+            os.remove(self.journal_old)
+            log.info("Compacted %s (%s records)", os.path.basename(self.path), len(snap))
+        except Exception as e:
+            log.exception("Journal compaction failed for %s: %s", self.path, e)
+        finally:
+            self._compacting = False
+
+_persistences: List[_Persistence] = []
+_fsync_thread: Optional[threading.Thread] = None
+
+def _fsync_loop() -> None:
+    # групповой fsync: одна синхронизация на все записи за интервал
+    while True:
+        time.sleep(STORE_FSYNC_INTERVAL)
+        for p in _persistences:
+            try:
+                p.fsync()
+            except Exception as e:
+                log.warning("fsync failed for %s: %s", p.journal, e)
+
+def _ensure_fsync_thread() -> None:
+    global _fsync_thread
+    if _fsync_thread is None:
+        _fsync_thread = threading.Thread(target=_fsync_loop, name="store-fsync", daemon=True)
+        _fsync_thread.start()
+
+def _index_keys(rec: Dict) -> Tuple[Optional[str], List[Tuple[str, str, str]]]:
+    dept = rec.get("dept")
+    if dept is None:
+        return None, []
+    return dept, [(dept, fid, val) for fid, val in (rec.get("filters") or {}).items()]
+
+def _index_add(cid: str, rec: Dict) -> None:
+    dept, fkeys = _index_keys(rec)
+    if dept is not None:
+        _by_dept.setdefault(dept, set()).add(cid)
+    for k in fkeys:
+        _by_filter.setdefault(k, set()).add(cid)
+
+def _index_remove(cid: str, rec: Dict) -> None:
+    dept, fkeys = _index_keys(rec)
+    if dept is not None:
+        ids = _by_dept.get(dept)
+        if ids is not None:
+            ids.discard(cid)
+            if not ids:
+                del _by_dept[dept]
+    for k in fkeys:
+        ids = _by_filter.get(k)
+        if ids is not None:
+            ids.discard(cid)
+            if not ids:
+                del _by_filter[k]
+
+def _rebuild_index() -> None:
+    _by_dept.clear()
+    _by_filter.clear()
+    for cid, rec in _prefs.items():
+        _index_add(cid, rec)
+
 # загружаем при импорте
-_prefs.update(_load(PREFS_FILE))
-_logins.update(_load(LOGINS_FILE))
+_prefs_store = _Persistence(PREFS_FILE, _prefs, _prefs_lock)
+_logins_store = _Persistence(LOGINS_FILE, _logins, _logins_lock)
+_persistences.extend([_prefs_store, _logins_store])
+with _prefs_lock:
+    _prefs_store.load()
+    _rebuild_index()
+with _logins_lock:
+    _logins_store.load()
 
 # ---------------------- Публичное API: prefs ---------------------------
 
@@ -45,13 +245,37 @@ def set_pref(chat_id: int, dept: Optional[str] = None,
     """Установить/обновить предпочтения пользователя: отдел и опциональный фильтр."""
     cid = str(chat_id)
     with _prefs_lock:
-        rec = _prefs.get(cid, {"dept": None, "filters": {}})
+        old = _prefs.get(cid)
+        rec = {
+            "dept": (old or {}).get("dept"),
+            "filters": dict((old or {}).get("filters") or {}),
+        }
         if dept is not None:
             rec["dept"] = dept
         if field_id is not None:
-            rec.setdefault("filters", {})[field_id] = value
+            rec["filters"][field_id] = value
+        if old is not None:
+            _index_remove(cid, old)
         _prefs[cid] = rec
-        _save(PREFS_FILE, _prefs)
+        _index_add(cid, rec)
+        _prefs_store.record(cid, rec)
+
+def rename_filter_field(old_id: str, new_id: str) -> int:
+    """Перенести фильтры подписок со старого ID поля на новый; возвращает число подписок."""
+    moved = 0
+    with _prefs_lock:
+        for cid, rec in list(_prefs.items()):
+            filters = rec.get("filters") or {}
+            if old_id not in filters:
+                continue
+            new_filters = {(new_id if fid == old_id else fid): val for fid, val in filters.items()}
+            _index_remove(cid, rec)
+            rec = {"dept": rec.get("dept"), "filters": new_filters}
+            _prefs[cid] = rec
+            _index_add(cid, rec)
+            _prefs_store.record(cid, rec)
+            moved += 1
+    return moved
 
 def get_pref(chat_id: int) -> Dict:
     """Вернуть текущие настройки пользователя (может быть пустым)."""
@@ -61,25 +285,19 @@ def get_pref(chat_id: int) -> Dict:
 def users_by_dept(dept: str) -> List[int]:
     """Все chat_id, подписанные на отдел."""
     with _prefs_lock:
-        return [int(cid) for cid, rec in _prefs.items() if rec.get("dept") == dept]
+        return [int(cid) for cid in _by_dept.get(dept, ())]
 
 def users_by_dept_and_filter(dept: str, field_id: str, value: str) -> List[int]:
     """Все chat_id, подписанные на отдел и конкретное значение дополнительного фильтра."""
     with _prefs_lock:
-        out: List[int] = []
-        for cid, rec in _prefs.items():
-            if rec.get("dept") != dept:
-                continue
-            if rec.get("filters", {}).get(field_id) == value:
-                out.append(int(cid))
-        return out
+        return [int(cid) for cid in _by_filter.get((dept, field_id, value), ())]
 
 # ---------------------- Публичное API: logins --------------------------
 
 def set_login(chat_id: int, jira_userkey: str) -> None:
     with _logins_lock:
         _logins[str(chat_id)] = jira_userkey
-        _save(LOGINS_FILE, _logins)
+        _logins_store.record(str(chat_id), jira_userkey)
 
 def get_login(chat_id: int) -> Optional[str]:
     with _logins_lock:
@@ -89,10 +307,11 @@ def delete_login(chat_id: int) -> None:
     with _logins_lock:
         if str(chat_id) in _logins:
             _logins.pop(str(chat_id), None)
-            _save(LOGINS_FILE, _logins)
+            _logins_store.record(str(chat_id), None)
 
 __all__ = [
-    "set_pref", "get_pref",
+    "set_pref", "get_pref", "rename_filter_field",
     "users_by_dept", "users_by_dept_and_filter",
     "set_login", "get_login", "delete_login",
+    "load_json", "save_json",
 ]
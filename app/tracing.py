@@ -0,0 +1,120 @@
+# -*- coding: utf-8 -*-
+"""
+Лёгкая трассировка: один trace на апдейт Telegram или событие Jira,
+внутри — spans вызовов Jira, SQLite и Bot API.
+
+Текущий trace живёт в contextvar, поэтому доходит до вложенных корутин
+и задач, созданных внутри обработчика; очередь уведомлений (notifier)
+переносит id trace к отправке сама. Вне trace span() ничего не пишет.
+Обработка дольше SLOW_UPDATE_MS попадает в лог с разбивкой по spans;
+id trace добавляется в каждую строку лога (TraceIdFilter).
+"""
+from __future__ import annotations
+import functools
+import itertools
+import logging
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+from .settings import SLOW_UPDATE_MS
+
+log = logging.getLogger("it_registry.tracing")
+
+_ids = itertools.count(1)
+
+
+class Trace:
+    __slots__ = ("id", "name", "started", "spans", "done")
+
+    def __init__(self, trace_id: str, name: str):
+        self.id = trace_id
+        self.name = name
+        self.started = time.perf_counter()
+        self.spans: List[Tuple[str, float]] = []
+        self.done = False
+
+    def add(self, name: str, seconds: float) -> None:
+        # фоновые задачи, пережившие обработчик, в завершённый trace не пишут
+        if not self.done:
+            self.spans.append((name, seconds))
+
+    def breakdown(self, top: int = 8) -> str:
+        """'jira GET /rest/api/2/search 3x 420ms, sqlite upsert_user 1x 12ms'."""
+        agg: Dict[str, List[float]] = {}
+        for name, sec in self.spans:
+            a = agg.setdefault(name, [0, 0.0])
+            a[0] += 1
+            a[1] += sec
+        items = sorted(agg.items(), key=lambda kv: kv[1][1], reverse=True)[:top]
+        return ", ".join(f"{name} {n}x {sec * 1000:.0f}ms" for name, (n, sec) in items) or "no spans"
+
+
+_current: ContextVar[Optional[Trace]] = ContextVar("it_registry_trace", default=None)
+
+
+def current_id() -> str:
+    t = _current.get()
+    return t.id if t is not None else "-"
+
+
+def unique_id(prefix: str) -> str:
+    """'<prefix>.000123': id trace, которое не повторится в этом процессе."""
+    return f"{prefix}.{next(_ids):06d}"
+
+
+@contextmanager
+def trace(name: str, trace_id: Optional[str] = None) -> Iterator[Trace]:
+    """Корневой trace; при превышении SLOW_UPDATE_MS — предупреждение в лог."""
+    t = Trace(trace_id or f"t{next(_ids)}", name)
+    token = _current.set(t)
+    try:
+        yield t
+    finally:
+        t.done = True
+        total_ms = (time.perf_counter() - t.started) * 1000
+        if total_ms >= SLOW_UPDATE_MS:
+            log.warning("Slow %s: %.0f ms — %s", t.name, total_ms, t.breakdown())
+        elif log.isEnabledFor(logging.DEBUG):
+            log.debug("%s: %.0f ms — %s", t.name, total_ms, t.breakdown())
+        _current.reset(token)
+
+
+@contextmanager
+def span(name: str) -> Iterator[None]:
+    t = _current.get()
+    if t is None:
+        yield
+        return
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        t.add(name, time.perf_counter() - t0)
+
+
+def traced_update(fn: Callable) -> Callable:
+    """Обёртка обработчика PTB: trace с id апдейта Telegram (u<update_id>)."""
+    name = fn.__name__
+
+    @functools.wraps(fn)
+    async def wrapper(update: Any, *args: Any, **kwargs: Any) -> Any:
+        uid = getattr(update, "update_id", None)
+        with trace(name, f"u{uid}" if uid is not None else None):
+            return await fn(update, *args, **kwargs)
+
+    return wrapper
+
+
+class TraceIdFilter(logging.Filter):
+    """Добавляет record.trace_id для формата '%(trace_id)s'."""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.trace_id = current_id()
+        return True
+
+
+def install_log_filter() -> None:
+    for h in logging.getLogger().handlers:
+        h.addFilter(TraceIdFilter())
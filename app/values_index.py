@@ -0,0 +1,243 @@
+# -*- coding: utf-8 -*-
+"""
+Локальный индекс уникальных значений полей реестра:
+«Отдел» и поля второго фильтра (DEPT_TO_FIELD).
+
+Строится один раз полным проходом по проекту, дополняется из /jira-webhook,
+периодически перестраивается в фоне (VALUES_INDEX_TTL) и сохраняется
+в $DATA_DIR, чтобы /start отвечал без обращений к Jira даже после рестарта.
+Файл пишется в потоке (asyncio.to_thread); новые значения из вебхуков
+копятся и сохраняются одной записью не чаще раза в _PERSIST_DELAY секунд.
+"""
+from __future__ import annotations
+import asyncio
+import logging
+import os
+import threading
+import time
+from typing import Any, Dict, List, Optional, Set
+
+import httpx
+
+from .settings import PROJECT_KEY, DEPARTMENT_FIELD_ID, VALUES_INDEX_TTL
+from .formatters import DEPT_TO_FIELD
+from .store import DATA_DIR, load_json, save_json
+from .jira_client import iter_search, get_select_options, field_str
+
+log = logging.getLogger("it_registry.values_index")
+
+INDEX_FILE = os.path.join(DATA_DIR, "values_index.json")
+
+_lock = threading.RLock()
+# field_id -> множество значений
+_values: Dict[str, Set[str]] = {}
+_built_at: float = 0.0
+
+_rebuild_lock: Optional[asyncio.Lock] = None
+_refresher: Optional[asyncio.Task] = None
+
+_PERSIST_DELAY = 5.0
+# порядок записей: снимок и запись файла идут под одной блокировкой
+_write_lock = threading.Lock()
+_persist_task: Optional[asyncio.Task] = None
+
+
+def tracked_fields() -> List[str]:
+    """Отдел + все поля второго фильтра (без повторов, в стабильном порядке)."""
+    out = [DEPARTMENT_FIELD_ID]
+    for fid in DEPT_TO_FIELD.values():
+        if fid not in out:
+            out.append(fid)
+    return out
+
+
+def _persist() -> None:
+    # синхронная запись — вызывается из потока; _lock держим только на снимок,
+    # чтобы observe_issue в event loop не ждал диска
+    with _write_lock:
+        with _lock:
+            data = {
+                "built_at": _built_at,
+                "fields": {fid: sorted(vals) for fid, vals in _values.items()},
+            }
+        try:
+            save_json(INDEX_FILE, data)
+        except Exception as e:
+            log.warning("Cannot save values index: %s", e)
+
+
+async def _persist_later() -> None:
+    global _persist_task
+    await asyncio.sleep(_PERSIST_DELAY)
+    # изменения, пришедшие во время записи, запланируют следующую
+    _persist_task = None
+    await asyncio.to_thread(_persist)
+
+
+def _schedule_persist() -> None:
+    global _persist_task
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        _persist()
+        return
+    if _persist_task is None or _persist_task.done():
+        _persist_task = loop.create_task(_persist_later())
+
+
+def _restore() -> None:
+    global _built_at
+    data = load_json(INDEX_FILE)
+    fields = data.get("fields") or {}
+    with _lock:
+        _values.clear()
+        for fid, vals in fields.items():
+            _values[fid] = {str(v) for v in vals}
+        _built_at = float(data.get("built_at") or 0.0)
+
+
+def is_ready() -> bool:
+    with _lock:
+        return bool(_built_at) and all(fid in _values for fid in tracked_fields())
+
+
+def values(field_id: str) -> List[str]:
+    """Значения поля из индекса (пусто, если индекс ещё не построен)."""
+    with _lock:
+        vals = list(_values.get(field_id) or ())
+    return sorted(vals, key=lambda s: s.lower())
+
+
+def forget_fields(field_ids: List[str]) -> None:
+    """
+    Убрать значения полей, чей ID сменился (каталог Jira): для новых ID
+    индекс неполон, is_ready() -> False, и ближайший get_values/цикл обновления
+    его перестроит.
+    """
+    with _lock:
+        dropped = [fid for fid in field_ids if _values.pop(fid, None) is not None]
+    if dropped:
+        log.info("Values index: dropped %s, rebuild pending", ", ".join(dropped))
+        _schedule_persist()
+
+
+def observe_issue(issue: Dict[str, Any]) -> None:
+    """Добавить в индекс значения из задачи (вызывается из /jira-webhook)."""
+    f = issue.get("fields") or {}
+    changed = False
+    with _lock:
+        for fid in tracked_fields():
+            if fid not in f:
+                continue
+            val = field_str(f.get(fid))
+            if val and val not in _values.setdefault(fid, set()):
+                _values[fid].add(val)
+                changed = True
+    if changed:
+        _schedule_persist()
+
+
+async def rebuild() -> None:
+    """
+    Select-поля — из метаданных Jira (один небольшой запрос),
+    остальные (текстовые) — одним проходом по проекту сразу по всем полям.
+    """
+    global _built_at
+    fields = tracked_fields()
+    fresh: Dict[str, Set[str]] = {fid: set() for fid in fields}
+
+    try:
+        meta = await get_select_options()
+    except httpx.HTTPError as e:
+        log.warning("Field metadata unavailable (%s), falling back to issue scan", e)
+        meta = {}
+    for fid in fields:
+        if fid in meta:
+            fresh[fid].update(meta[fid])
+
+    scan = [fid for fid in fields if fid not in meta]
+    if scan:
+        async for it in iter_search(f'project = "{PROJECT_KEY}"', ",".join(scan)):
+            f = it.get("fields") or {}
+            for fid in scan:
+                val = field_str(f.get(fid))
+                if val:
+                    fresh[fid].add(val)
+    with _lock:
+        _values.clear()
+        _values.update(fresh)
+        _built_at = time.time()
+    await asyncio.to_thread(_persist)
+    log.info("Values index rebuilt: %s",
+             ", ".join(f"{fid}={len(v)}" for fid, v in fresh.items()))
+
+
+def _get_rebuild_lock() -> asyncio.Lock:
+    global _rebuild_lock
+    if _rebuild_lock is None:
+        _rebuild_lock = asyncio.Lock()
+    return _rebuild_lock
+
+
+async def ensure_built() -> None:
+    if is_ready():
+        return
+    async with _get_rebuild_lock():
+        if not is_ready():
+            await rebuild()
+
+
+async def get_values(field_id: str) -> List[str]:
+    """Значения поля; в Jira идём только если индекс ещё ни разу не строился."""
+    await ensure_built()
+    return values(field_id)
+
+
+async def _refresh_loop() -> None:
+    while True:
+        with _lock:
+            due = _built_at + VALUES_INDEX_TTL if is_ready() else 0.0
+        await asyncio.sleep(max(0.0, due - time.time()))
+        try:
+            async with _get_rebuild_lock():
+                await rebuild()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            log.warning("Values index refresh failed: %s", e)
+            await asyncio.sleep(min(60.0, VALUES_INDEX_TTL))
+
+
+def start_refresher() -> None:
+    global _refresher
+    if _refresher is None or _refresher.done():
+        _refresher = asyncio.get_running_loop().create_task(_refresh_loop())
+
+
+async def stop_refresher() -> None:
+    global _refresher
+    if _refresher is not None:
+        _refresher.cancel()
+        try:
+            await _refresher
+        except (asyncio.CancelledError, Exception):
+            pass
+        _refresher = None
+    await flush()
+
+
+async def flush() -> None:
+    """Сохранить отложенные изменения сейчас (остановка бота)."""
+    global _persist_task
+    task, _persist_task = _persist_task, None
+    if task is not None and not task.done():
+        task.cancel()
+        try:
+            await task
+        except (asyncio.CancelledError, Exception):
+            pass
+        await asyncio.to_thread(_persist)
+
+
+# загружаем при импорте
+_restore()
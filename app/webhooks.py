@@ -1,20 +1,80 @@
 # -*- coding: utf-8 -*-
-from fastapi import FastAPI, Request
-from typing import Any, Dict
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Request, HTTPException
+from fastapi.responses import PlainTextResponse
+from typing import Any, Dict, List, Optional
+import asyncio
+import hmac
+import html
 import logging
 
-from .formatters import format_issue_card, DEPARTMENT_FIELD_ID, FIELD_ID
+from telegram import Update
+
+from .formatters import format_issue_card, card_cache_stats, card_field_ids, DEPARTMENT_FIELD_ID, DEPT_TO_FIELD
 from .store import users_by_dept, users_by_dept_and_filter
-from .jira_client import get_issue
+from .jira_client import get_issue, breaker as jira_breaker
+from .breaker import STATE_CODE
+from .debounce import KeyedDebouncer
+from .settings import (
+    WEBHOOK_DEBOUNCE_SEC, WEBHOOK_DEBOUNCE_MAX_SEC, WEBHOOK_TRUST_PAYLOAD, JIRA_WEBHOOK_SECRET,
+    NOTIFY_ONLY_CARD_CHANGES, NOTIFY_MARK_CHANGES,
+    ADMIN_TOKEN, PROFILE_MAX_SECONDS,
+)
+from .config import TG_MODE, TG_WEBHOOK_PATH, TG_WEBHOOK_SECRET
+from . import values_index, issue_cache, notifier, metrics, tracing, profiler, mirror, reconciler, card_changes
 
 log = logging.getLogger("it_registry.webhooks")
 BROWSE_BASE = "http://localhost:8080/browse"
 
-# DEPT→FILTER поле (должно совпадать с handlers)
-DEPT_FILTER_FIELD = {
-    "Закупки": FIELD_ID["Лицензии"],
-    "HelpDesk": FIELD_ID["Система"],
-}
+# DEPT→FILTER поле (общая карта с handlers)
+DEPT_FILTER_FIELD = DEPT_TO_FIELD
+
+# версия контракта Groovy-листенера, в которой issue содержит поля карточки
+PAYLOAD_VERSION = 2
+
+def _payload_issue(payload: Any) -> Optional[Dict[str, Any]]:
+    """Задача из вебхука v2, если в ней есть updated и все поля карточки; иначе None."""
+    # без JIRA_WEBHOOK_SECRET отправитель не проверен: содержимое карточки
+    # (которое уйдёт в кэш, зеркало и подписчикам) берём только из Jira
+    if not WEBHOOK_TRUST_PAYLOAD or not JIRA_WEBHOOK_SECRET or not isinstance(payload, dict):
+        return None
+    if payload.get("v") != PAYLOAD_VERSION:
+        return None
+    issue = payload.get("issue")
+    if not isinstance(issue, dict) or not issue.get("key"):
+        return None
+    f = issue.get("fields")
+    if not isinstance(f, dict) or not f.get("updated"):
+        return None
+    # поле может быть null, но ключ обязан быть: иначе листенер не знает о поле
+    missing = [fid for fid in card_field_ids() if fid not in f]
+    if missing:
+        log.debug("Webhook payload for %s lacks %s, reading from Jira", issue["key"], ", ".join(missing))
+        return None
+    return issue
+
+def _changelog_items(payload: Any) -> List[Dict[str, Any]]:
+    if not isinstance(payload, dict):
+        return []
+    items = (payload.get("changelog") or {}).get("items")
+    return [it for it in items if isinstance(it, dict)] if isinstance(items, list) else []
+
+def _merge_payloads(old: Any, new: Any) -> Any:
+    """Склейка событий одной задачи: более свежая версия issue и пункты changelog всех событий."""
+    if not isinstance(old, dict) or not isinstance(new, dict):
+        return new if new is not None else old
+    base = new
+    old_issue, new_issue = old.get("issue"), new.get("issue")
+    if isinstance(old_issue, dict) and isinstance(new_issue, dict):
+        old_ts, new_ts = issue_cache.updated_at(old_issue), issue_cache.updated_at(new_issue)
+        if old_ts is not None and new_ts is not None and old_ts > new_ts:
+            # события пришли не по порядку — оставляем более новую версию
+            base = old
+    merged = dict(base)
+    items = _changelog_items(old) + _changelog_items(new)
+    if items:
+        merged["changelog"] = {"items": items}
+    return merged
 
 def _extract_dept_and_filter(issue: Dict[str, Any]) -> (str, str, str):
     f = issue.get("fields", {})
@@ -37,41 +97,194 @@ def _extract_dept_and_filter(issue: Dict[str, Any]) -> (str, str, str):
             val = str(v or "")
     return dept, field_id or "", val
 
+async def process_issue_event(key: str, payload: Any = None, events: int = 1) -> None:
+    """Загрузить актуальную задачу и разослать уведомления подписчикам."""
+    metrics.WEBHOOK_EVENTS.inc(stage="processed")
+    # REG-5#1.000123: ключ, число склеенных событий и порядковый номер — у каждого
+    # обновления задачи свой id
+    with tracing.trace("jira event", tracing.unique_id(f"{key}#{events}")), metrics.WEBHOOK_LATENCY.time():
+        await _process_issue_event(key, payload, events)
+
+async def _process_issue_event(key: str, payload: Any, events: int) -> None:
+    issue = _payload_issue(payload)
+    if issue is None:
+        issue = await get_issue(key, refresh=True)
+        metrics.WEBHOOK_ISSUE_SOURCE.inc(source="jira")
+    else:
+        issue_cache.put(issue)
+        metrics.WEBHOOK_ISSUE_SOURCE.inc(source="payload")
+    if isinstance(payload, dict) and payload.get("source") == "reconciler" and reconciler.is_handled(issue):
+        # вебхук успел разослать эту версию, пока событие сверки ждало в очереди
+        return
+    changed = fp = None
+    if NOTIFY_ONLY_CARD_CHANGES or NOTIFY_MARK_CHANGES:
+        # прошлая версия из зеркала — пока зеркало не увидело новую
+        previous = None if card_changes.known(key) else await mirror.lookup(key)
+        fp = card_changes.fingerprint(issue)
+        changed = card_changes.changed_fields(issue, previous, _changelog_items(payload), fp)
+    values_index.observe_issue(issue)
+    await mirror.observe_issue(issue)
+    if changed == [] and NOTIFY_ONLY_CARD_CHANGES:
+        # правка полей, которых нет в карточке (или та же версия повторно)
+        log.info("Webhook %s events=%s: card unchanged, no notification", key, events)
+        metrics.WEBHOOK_EVENTS.inc(stage="unchanged")
+        card_changes.remember(key, fp)
+        reconciler.mark_handled(issue)
+        return
+    dept, field_id, value = _extract_dept_and_filter(issue)
+
+    # Кому отправлять
+    if field_id and value:
+        chat_ids = users_by_dept_and_filter(dept, field_id, value)
+    else:
+        chat_ids = users_by_dept(dept)
+
+    log.info("Webhook %s dept=%s filter=(%s=%s) events=%s -> %s users",
+             key, dept, field_id, value, events, len(chat_ids))
+
+    marks = ""
+    if NOTIFY_MARK_CHANGES and changed:
+        marks = "Изменено: " + ", ".join(f"<b>{html.escape(label)}</b>" for label in changed) + "\n"
+    header = (
+        "⚠️ <i><b>Внимание!</b></i> ⚠️\n"
+        "— Внеслись новые корректировки в информационную карту — <u><b>Отдел: "
+        f"{dept or '—'}</b></u>.\n{marks}\n"
+        f"<code>{key}</code>\n{BROWSE_BASE}/{key}\n"
+    )
+    card = format_issue_card(issue)
+    metrics.WEBHOOK_FANOUT.observe(len(chat_ids))
+
+    # рассылка идёт в фоне с учётом лимитов Telegram
+    notifier.submit(chat_ids, f"{header}\n{card}")
+    # отпечаток — только после постановки в рассылку: при сбое выше повтор
+    # события снова увидит изменение
+    if fp is not None:
+        card_changes.remember(key, fp)
+    reconciler.mark_handled(issue)
+
+def _collect_runtime_metrics():
+    """Кэши и очереди — те же цифры, что в /health."""
+    caches = {"issue": issue_cache.stats(), "card": card_cache_stats()}
+    out = []
+    for name, doc, field, kind in (
+        ("cache_hits_total", "Cache hits", "hits", "counter"),
+        ("cache_misses_total", "Cache misses", "misses", "counter"),
+        ("cache_hit_ratio", "Cache hit ratio since start", "hit_ratio", "gauge"),
+        ("cache_entries", "Entries in cache", "size", "gauge"),
+    ):
+        out += metrics.sample_lines(name, doc, {(("cache", c),): st[field] for c, st in caches.items()}, kind)
+    ns = notifier.stats()
+    out += metrics.sample_lines("telegram_queue_size", "Notifications waiting in the send queue",
+                                {(): ns["queued"]})
+    out += metrics.sample_lines("telegram_paused_seconds", "Remaining flood-control pause",
+                                {(): ns["paused_for"]})
+    out += metrics.sample_lines("webhooks_pending", "Jira events waiting in the debounce window",
+                                {(): _debouncer.pending()})
+    bs = jira_breaker.stats()
+    out += metrics.sample_lines("jira_circuit_state", "Jira circuit breaker: 0 closed, 1 half-open, 2 open",
+                                {(): STATE_CODE[bs["state"]]})
+    out += metrics.sample_lines("jira_circuit_rejected_total", "Jira requests rejected by the open breaker",
+                                {(): bs["rejected"]}, "counter")
+    return out
+
+metrics.register_collector(_collect_runtime_metrics)
+
+# серия правок одной записи -> один запрос в Jira и одно уведомление
+_debouncer = KeyedDebouncer(WEBHOOK_DEBOUNCE_SEC, WEBHOOK_DEBOUNCE_MAX_SEC, process_issue_event,
+                            merge=_merge_payloads)
+
+def enqueue_issue_event(key: str, payload: Any = None, stage: str = "received") -> None:
+    """Задача изменилась (вебхук или сверка): в окно склейки и дальше в process_issue_event."""
+    issue = _payload_issue(payload)
+    if issue is not None:
+        # новая версия из вебхука v2 сразу видна /info
+        issue_cache.put(issue)
+    else:
+        # старую версию из кэша больше не отдаём
+        issue_cache.invalidate(key)
+    metrics.WEBHOOK_EVENTS.inc(stage=stage)
+    _debouncer.push(key, payload)
+
+def enqueue_reconciled(key: str) -> None:
+    """Изменение, найденное сверкой (app.reconciler), — тем же путём, что вебхук."""
+    enqueue_issue_event(key, {"source": "reconciler"}, stage="reconciled")
+
+@asynccontextmanager
+async def _lifespan(app: FastAPI):
+    # пул Jira и очередь уведомлений общие с ботом (app.runtime);
+    # здесь — только дообработка накопленных событий при остановке
+    try:
+        yield
+    finally:
+        await _debouncer.drain()
+
 def create_app(tg_application):
-    app = FastAPI()
+    app = FastAPI(lifespan=_lifespan)
+    if WEBHOOK_TRUST_PAYLOAD and not JIRA_WEBHOOK_SECRET:
+        log.warning("JIRA_WEBHOOK_SECRET is not set: webhook payloads are not trusted, every event re-reads the issue from Jira")
 
     @app.post("/jira-webhook")
     async def jira_webhook(req: Request):
+        if JIRA_WEBHOOK_SECRET:
+            got = req.headers.get("X-Webhook-Secret", "")
+            if not hmac.compare_digest(got, JIRA_WEBHOOK_SECRET):
+                raise HTTPException(status_code=403, detail="bad webhook secret")
         data = await req.json()
         key = (data.get("issue") or {}).get("key")
         if not key:
             return {"ok": True}
 
-        issue = await get_issue(key)
-        dept, field_id, value = _extract_dept_and_filter(issue)
-
-        # Кому отправлять
-        if field_id and value:
-            chat_ids = users_by_dept_and_filter(dept, field_id, value)
-        else:
-            chat_ids = users_by_dept(dept)
+        enqueue_issue_event(key, data)
+        return {"ok": True}
 
-        log.info("Webhook %s dept=%s filter=(%s=%s) -> %s users", key, dept, field_id, value, len(chat_ids))
+    # маршрут есть только в режиме webhook; без секрета он закрыт, иначе апдейт
+    # от имени любого пользователя мог бы прислать кто угодно
+    if TG_MODE == "webhook":
+        @app.post(TG_WEBHOOK_PATH)
+        async def telegram_webhook(req: Request):
+            """Апдейты Telegram в режиме TG_MODE=webhook -> очередь PTB Application."""
+            got = req.headers.get("X-Telegram-Bot-Api-Secret-Token", "")
+            if not TG_WEBHOOK_SECRET or not hmac.compare_digest(got, TG_WEBHOOK_SECRET):
+                raise HTTPException(status_code=403, detail="bad secret token")
+            if tg_application is None or not tg_application.running:
+                raise HTTPException(status_code=503, detail="telegram disabled")
+            data = await req.json()
+            update = Update.de_json(data, tg_application.bot)
+            if update is not None:
+                await tg_application.update_queue.put(update)
+            return {"ok": True}
 
-        header = (
-            "⚠️ <i><b>Внимание!</b></i> ⚠️\n"
-            "— Внеслись новые корректировки в информационную карту — <u><b>Отдел: "
-            f"{dept or '—'}</b></u>.\n\n"
-            f"<code>{key}</code>\n{BROWSE_BASE}/{key}\n"
-        )
-        card = format_issue_card(issue)
+    @app.get("/health")
+    async def health():
+        return {
+            "ok": True,
+            "jira_breaker": jira_breaker.stats(),
+            "issue_cache": issue_cache.stats(),
+            "card_cache": card_cache_stats(),
+            "notifier": notifier.stats(),
+            "webhooks_pending": _debouncer.pending(),
+            "mirror": await mirror.status(),
+            "reconciler": reconciler.stats(),
+            "card_fingerprints": card_changes.stats(),
+        }
 
-        for cid in chat_ids:
-            try:
-                await tg_application.bot.send_message(cid, f"{header}\n{card}", parse_mode="HTML")
-            except Exception as e:
-                log.warning("Send fail chat=%s: %s", cid, e)
+    @app.get("/metrics")
+    async def prometheus_metrics():
+        return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
 
-        return {"ok": True}
+    @app.get("/admin/profile")
+    async def admin_profile(req: Request, seconds: float = 10.0):
+        """Профиль процесса за N секунд (collapsed stacks). Только с ADMIN_TOKEN."""
+        if not ADMIN_TOKEN:
+            raise HTTPException(status_code=404, detail="Not Found")
+        if not hmac.compare_digest(req.headers.get("X-Admin-Token", ""), ADMIN_TOKEN):
+            raise HTTPException(status_code=403, detail="bad admin token")
+        seconds = max(0.1, min(seconds, PROFILE_MAX_SECONDS))
+        try:
+            # сэмплер — в отдельном потоке, event loop продолжает работать и попадает в профиль
+            stacks = await asyncio.to_thread(profiler.sample, seconds)
+        except profiler.ProfilerBusy:
+            raise HTTPException(status_code=409, detail="profiler is already running")
+        return PlainTextResponse(stacks)
 
     return app
@@ -1,49 +1,137 @@
 # -*- coding: utf-8 -*-
 from __future__ import annotations
-import threading
+import asyncio
+import contextlib
 import logging
 import os
-import time
+import signal
 import uvicorn
+from telegram import Update
 
 from app.bot import build_application
 from app.webhooks import create_app
-from app.config import PORT, JIRA_BASE_URL, PROJECT_KEY, DEPARTMENT_FIELD_ID
+from app.config import (
+    PORT, JIRA_BASE_URL, PROJECT_KEY, DEPARTMENT_FIELD_ID,
+    TG_MODE, TG_WEBHOOK_URL, TG_WEBHOOK_SECRET,
+)
+from app import runtime, tracing
 
 logging.basicConfig(
     level=getattr(logging, os.getenv("LOG_LEVEL", "INFO").upper(), logging.INFO),
-    format="%(asctime)s [%(levelname)s] %(name)s: %(message)s",
+    format="%(asctime)s [%(levelname)s] %(name)s [%(trace_id)s]: %(message)s",
 )
+tracing.install_log_filter()
 log = logging.getLogger("it_registry.server")
 log.info(
     "Start: JIRA_BASE_URL=%s, PROJECT_KEY=%s, DEPARTMENT_FIELD_ID=%s",
     JIRA_BASE_URL, PROJECT_KEY, DEPARTMENT_FIELD_ID
 )
 
-def run_api(app):
-    uvicorn.run(app, host="0.0.0.0", port=PORT, log_level="info")
+class _ApiServer(uvicorn.Server):
+    """
+    uvicorn после остановки заново поднимает перехваченный сигнал, и процесс
+    умирает раньше, чем успеем остановить бота и сбросить очереди.
+    Здесь сигнал только завершает serve(), остальное доделывает serve() ниже.
+    """
 
-def main():
+    @contextlib.contextmanager
+    def capture_signals(self):
+        sigs = (signal.SIGINT, signal.SIGTERM)
+        original = {sig: signal.signal(sig, self.handle_exit) for sig in sigs}
+        try:
+            yield
+        finally:
+            for sig, handler in original.items():
+                signal.signal(sig, handler)
+
+async def _start_webhook_mode(tg_app) -> bool:
+    """
+    TG_MODE=webhook: апдейты приходят в FastAPI (create_app -> TG_WEBHOOK_PATH).
+    False — режим не включён или вебхук не зарегистрировался (тогда polling).
+    """
+    if TG_MODE != "webhook":
+        return False
+    if not TG_WEBHOOK_URL:
+        log.info("Telegram webhook mode without TG_WEBHOOK_URL: waiting for updates from a local stand-in")
+        return True
+    try:
+        await tg_app.bot.set_webhook(
+            TG_WEBHOOK_URL,
+            secret_token=TG_WEBHOOK_SECRET,
+            allowed_updates=Update.ALL_TYPES,
+        )
+    except Exception as e:
+        log.warning("set_webhook(%s) failed: %s. Falling back to polling", TG_WEBHOOK_URL, e)
+        return False
+    log.info("Telegram webhook registered: %s", TG_WEBHOOK_URL)
+    return True
+
+async def _start_telegram(tg_app) -> None:
+    """
+    Initialize/start бота и polling или webhook — в фоне, с повторами:
+    пока Telegram недоступен, /jira-webhook, /health и /metrics уже работают,
+    а уведомления копятся в очереди notifier.
+    """
+    delay = 5.0
+    while True:
+        try:
+            await tg_app.initialize()  # get_me
+            await tg_app.start()
+            if not await _start_webhook_mode(tg_app):
+                # сетевые сбои updater переживает сам (повторы с backoff)
+                log.info("Starting Telegram polling...")
+                await tg_app.updater.start_polling()
+            return
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            log.warning("Telegram start failed: %s. Retrying in %.0fs", e, delay)
+            if tg_app.running:
+                await tg_app.stop()
+            await asyncio.sleep(delay)
+            delay = min(60.0, delay * 2)
+
+async def serve() -> None:
+    """
+    FastAPI (uvicorn) и Telegram Application в одном event loop:
+    Jira-клиент, кэши и очередь уведомлений общие, без межпоточных вызовов.
+    API поднимается сразу, бот — в фоне (_start_telegram).
+    Остановка — по SIGINT/SIGTERM (их перехватывает uvicorn).
+    """
+    if TG_MODE == "webhook" and not TG_WEBHOOK_SECRET:
+        # без секрета любой, кто знает адрес, может слать боту поддельные апдейты
+        raise SystemExit("TG_MODE=webhook requires TG_WEBHOOK_SECRET")
     tg_app = build_application()
     fastapi_app = create_app(tg_app)
-
-    t = threading.Thread(target=run_api, args=(fastapi_app,), daemon=True)
-    t.start()
+    api = _ApiServer(uvicorn.Config(fastapi_app, host="0.0.0.0", port=PORT, log_level="info"))
 
     # allow disabling telegram polling for diagnostics
     if os.getenv("DISABLE_TG", "").strip() == "1":
         log.warning("Telegram polling disabled by DISABLE_TG=1, API stays up")
-        while True:
-            time.sleep(60)
-
-    # resilient polling loop so container does not crash on network hiccups
-    while True:
+        await runtime.startup(None)
         try:
-            log.info("Starting Telegram polling...")
-            tg_app.run_polling(close_loop=False)
-        except Exception as e:
-            log.exception("Polling crashed: %s. Retrying in 10s...", e)
-            time.sleep(10)
+            await api.serve()
+        finally:
+            await runtime.shutdown(None)
+        return
+
+    await runtime.startup(tg_app)
+    tg_task = asyncio.get_running_loop().create_task(_start_telegram(tg_app))
+    try:
+        await api.serve()
+    finally:
+        tg_task.cancel()
+        with contextlib.suppress(asyncio.CancelledError):
+            await tg_task
+        if tg_app.updater.running:
+            await tg_app.updater.stop()
+        if tg_app.running:
+            await tg_app.stop()
+        await runtime.shutdown(tg_app)
+        await tg_app.shutdown()
+
+def main():
+    asyncio.run(serve())
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,12 @@
+# -*- coding: utf-8 -*-
+import os
+import sys
+import tempfile
+
+# app.store создаёт DATA_DIR при импорте — до него подставляем временный каталог
+os.environ.setdefault("DATA_DIR", tempfile.mkdtemp(prefix="it_registry_tests_"))
+os.environ.setdefault("TELEGRAM_BOT_TOKEN", "123456:tests")
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# tools/ — фейки Jira/Telegram и стенд вебхука, как в бенчмарке
+sys.path[:0] = [ROOT, os.path.join(ROOT, "tools")]
@@ -0,0 +1,78 @@
+# -*- coding: utf-8 -*-
+import pytest
+
+from app import breaker as breaker_mod
+from app.breaker import CircuitBreaker, CircuitOpenError, CLOSED, OPEN, HALF_OPEN
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(breaker_mod.time, "monotonic", lambda: now[0])
+    return now
+
+
+def _fail(b, n=1):
+    for _ in range(n):
+        b.record(False, "ConnectError", b.before())
+
+
+def test_opens_after_consecutive_failures(clock):
+    b = CircuitBreaker("Jira", failures=3, reset_after=30)
+    _fail(b, 2)
+    b.record(True, "", b.before())       # успех сбрасывает счётчик
+    _fail(b, 2)
+    assert b.state == CLOSED
+    _fail(b)
+    assert b.state == OPEN
+    with pytest.raises(CircuitOpenError):
+        b.before()
+    assert b.stats()["rejected"] == 1
+
+
+def test_half_open_probe_closes_or_reopens(clock):
+    b = CircuitBreaker("Jira", failures=1, reset_after=30)
+    _fail(b)
+    clock[0] += 31
+    probe = b.before()
+    assert probe and b.state == HALF_OPEN
+    with pytest.raises(CircuitOpenError):  # пока идёт проба, остальные отклоняются
+        b.before()
+    b.record(False, "ReadTimeout", probe)
+    assert b.state == OPEN
+
+    clock[0] += 31
+    probe = b.before()
+    b.record(True, "", probe)
+    assert b.state == CLOSED
+    assert b.before() is False
+
+
+def test_only_probe_changes_half_open_state(clock):
+    b = CircuitBreaker("Jira", failures=1, reset_after=30)
+    late = b.before()                     # отправлен, пока цепь была закрыта
+    _fail(b)
+    clock[0] += 31
+    probe = b.before()
+    # запоздавший ответ не закрывает цепь и не освобождает место пробы
+    b.record(True, "", late)
+    assert b.state == HALF_OPEN
+    with pytest.raises(CircuitOpenError):
+        b.before()
+    b.record(True, "", probe)
+    assert b.state == CLOSED
+
+
+def test_interrupted_probe_allows_next_probe(clock):
+    b = CircuitBreaker("Jira", failures=1, reset_after=30)
+    _fail(b)
+    clock[0] += 31
+    b.record(None, "", b.before())
+    assert b.state == HALF_OPEN
+    assert b.before() is True
+
+
+def test_disabled_breaker_never_rejects():
+    b = CircuitBreaker("Jira", failures=0, reset_after=30)
+    _fail(b, 10)
+    assert b.state == CLOSED and b.before() is False
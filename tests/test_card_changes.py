@@ -0,0 +1,61 @@
+# -*- coding: utf-8 -*-
+import asyncio
+
+import pytest
+
+from app import card_changes, webhooks
+
+
+def _issue(status, updated="2026-10-17T09:00:00.000+0000"):
+    return {"key": "REG-1", "fields": {"updated": updated, "status": {"name": status}}}
+
+
+@pytest.fixture(autouse=True)
+def fresh_prints(monkeypatch):
+    monkeypatch.setattr(card_changes, "_prints", card_changes.OrderedDict())
+
+
+def test_changed_fields_does_not_remember():
+    card_changes.remember("REG-1", card_changes.fingerprint(_issue("Open")))
+    assert card_changes.changed_fields(_issue("Done")) == ["Статус"]
+    # пока вызывающий не вызвал remember, изменение видно снова
+    assert card_changes.changed_fields(_issue("Done")) == ["Статус"]
+
+
+@pytest.fixture
+def pipeline(monkeypatch):
+    state = {"issue": None, "sent": [], "fail": False}
+
+    async def get_issue(key, refresh=False):
+        return state["issue"]
+
+    async def nothing(*a, **kw):
+        return None
+
+    def submit(chat_ids, text):
+        if state["fail"]:
+            raise RuntimeError("queue down")
+        state["sent"].append(text)
+
+    monkeypatch.setattr(webhooks, "get_issue", get_issue)
+    monkeypatch.setattr(webhooks.mirror, "lookup", nothing)
+    monkeypatch.setattr(webhooks.mirror, "observe_issue", nothing)
+    monkeypatch.setattr(webhooks.values_index, "observe_issue", lambda issue: None)
+    monkeypatch.setattr(webhooks.notifier, "submit", submit)
+    monkeypatch.setattr(webhooks, "NOTIFY_ONLY_CARD_CHANGES", True)
+    return state
+
+
+def test_failed_submit_does_not_swallow_change(pipeline):
+    card_changes.remember("REG-1", card_changes.fingerprint(_issue("Open")))
+    pipeline["issue"] = _issue("Done", "2026-10-17T09:05:00.000+0000")
+    pipeline["fail"] = True
+    with pytest.raises(RuntimeError):
+        asyncio.run(webhooks._process_issue_event("REG-1", {}, 1))
+
+    pipeline["fail"] = False
+    asyncio.run(webhooks._process_issue_event("REG-1", {}, 1))
+    assert len(pipeline["sent"]) == 1
+    # та же версия повторно — карточка не изменилась, уведомления нет
+    asyncio.run(webhooks._process_issue_event("REG-1", {}, 1))
+    assert len(pipeline["sent"]) == 1
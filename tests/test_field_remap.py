@@ -0,0 +1,41 @@
+# -*- coding: utf-8 -*-
+import asyncio
+
+import pytest
+
+from app import fields, formatters, store, values_index
+
+
+@pytest.fixture
+def catalogue(monkeypatch):
+    """Каталог Jira, где поле «Лицензии» получило новый ID."""
+    old = formatters.FIELD_ID["Лицензии"]
+    new = "customfield_99999"
+    items = [{"id": fid, "name": label} for label, fid in formatters.FIELD_ID.items()]
+    items = [{"id": new, "name": "Лицензии"} if it["id"] == old else it for it in items]
+
+    async def fake_list_fields():
+        return items
+
+    monkeypatch.setattr(fields, "list_fields", fake_list_fields)
+    yield old, new
+    formatters.apply_field_ids({"Лицензии": old})
+    formatters._renamed_ids.clear()
+
+
+def test_remap_moves_subscriptions_and_index(catalogue):
+    old, new = catalogue
+    store.set_pref(501, dept="Закупки", field_id=old, value="MS Office")
+    with values_index._lock:
+        values_index._values[old] = {"MS Office"}
+
+    asyncio.run(fields.refresh())
+
+    assert formatters.DEPT_TO_FIELD["Закупки"] == new
+    assert store.get_pref(501)["filters"] == {new: "MS Office"}
+    assert store.users_by_dept_and_filter("Закупки", new, "MS Office") == [501]
+    assert store.users_by_dept_and_filter("Закупки", old, "MS Office") == []
+    assert old not in values_index._values
+    assert not values_index.is_ready()
+    # кнопка opt:<старый ID>, выданная до замены
+    assert formatters.current_field_id(old) == new
@@ -0,0 +1,60 @@
+# -*- coding: utf-8 -*-
+import asyncio
+import time
+
+import pytest
+
+from app import groups
+
+
+@pytest.fixture
+def jira(monkeypatch):
+    """Подменённая выгрузка группы; members=None — Jira недоступна."""
+    monkeypatch.setattr(groups, "_groups", {})
+    monkeypatch.setattr(groups, "GROUP_CACHE_TTL", 10)
+    monkeypatch.setattr(groups, "GROUP_CACHE_MAX_STALE", 100)
+    state = {"members": {"alice", "bob"}, "calls": 0}
+
+    async def fake_list_group_members(group, limit):
+        state["calls"] += 1
+        if state["members"] is None:
+            raise OSError("jira down")
+        return set(state["members"])
+
+    monkeypatch.setattr(groups, "list_group_members", fake_list_group_members)
+    return state
+
+
+def _age(group, seconds):
+    members, _ = groups._groups[group]
+    groups._groups[group] = (members, time.monotonic() - seconds)
+
+
+def test_stale_entry_answers_from_cache(jira):
+    async def run():
+        assert await groups.is_member("Alice", "g")
+        _age("g", 50)
+        jira["members"] = None
+        # в пределах GROUP_CACHE_MAX_STALE — старый состав, обновление в фоне
+        assert await groups.is_member("alice", "g")
+        await asyncio.sleep(0)
+    asyncio.run(run())
+
+
+def test_too_stale_entry_is_reloaded(jira):
+    async def run():
+        assert await groups.is_member("bob", "g")
+        _age("g", 500)
+        jira["members"] = {"alice"}
+        assert not await groups.is_member("bob", "g")
+    asyncio.run(run())
+    assert jira["calls"] == 2
+
+
+def test_too_stale_entry_fails_closed(jira):
+    async def run():
+        assert await groups.is_member("bob", "g")
+        _age("g", 500)
+        jira["members"] = None
+        assert not await groups.is_member("bob", "g")
+    asyncio.run(run())
@@ -0,0 +1,43 @@
+# -*- coding: utf-8 -*-
+import asyncio
+import re
+from types import SimpleNamespace
+
+import httpx
+
+from app import handlers
+
+
+class _Message:
+    def __init__(self):
+        self.texts = []
+
+    async def reply_text(self, text, **kw):
+        self.texts.append(text)
+
+
+def _issue(n):
+    return {"key": f"REG-{n}", "fields": {}}
+
+
+def test_stale_fallback_does_not_repeat_sent_cards(monkeypatch):
+    async def jira_dies_midway(dept, limit):
+        for n in range(1, 4):
+            yield _issue(n)
+        raise httpx.ConnectError("jira down")
+
+    async def mirror_dept(dept, limit):
+        return [_issue(n) for n in range(1, 6)]
+
+    monkeypatch.setattr(handlers, "iter_issues_by_department", jira_dies_midway)
+    monkeypatch.setattr(handlers.mirror, "dept_issues", mirror_dept)
+    monkeypatch.setattr(handlers, "format_issue_card", lambda issue: "card")
+    # по карточке на сообщение: третья ещё в буфере, когда Jira падает
+    monkeypatch.setattr(handlers, "TG_MESSAGE_LIMIT", 20)
+
+    msg = _Message()
+    asyncio.run(handlers._info_batch(SimpleNamespace(message=msg), [], "IDM"))
+
+    keys = [k for t in msg.texts for k in re.findall(r"REG-\d+", t)]
+    assert keys == ["REG-1", "REG-2", "REG-3", "REG-4", "REG-5"]
+    assert handlers.STALE_NOTE in msg.texts
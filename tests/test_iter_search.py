@@ -0,0 +1,25 @@
+# -*- coding: utf-8 -*-
+import asyncio
+
+from app import jira_client
+
+
+def test_ordered_pages_follow_start_at(monkeypatch):
+    total, page = 50, 10
+
+    async def fake_page(c, jql, fields, start_at, max_results, extra=None):
+        # чем дальше страница, тем быстрее она приходит
+        await asyncio.sleep((total - start_at) / 1000)
+        keys = range(start_at, min(total, start_at + max_results))
+        return {"total": total, "issues": [{"key": f"REG-{n}"} for n in keys]}
+
+    monkeypatch.setattr(jira_client, "_search_page", fake_page)
+
+    async def collect(ordered):
+        return [it["key"] async for it in jira_client.iter_search(
+            "ORDER BY key ASC", "key", page_size=page, concurrency=4, ordered=ordered)]
+
+    expected = [f"REG-{n}" for n in range(total)]
+    assert asyncio.run(collect(True)) == expected
+    unordered = asyncio.run(collect(False))
+    assert unordered != expected and sorted(unordered) == sorted(expected)
@@ -0,0 +1,30 @@
+# -*- coding: utf-8 -*-
+import sqlite3
+
+import pytest
+
+from app import mirror
+from app.formatters import FIELD_ID
+
+
+@pytest.fixture
+def like_mirror(monkeypatch):
+    """Зеркало в памяти без FTS5 — /find идёт через LIKE."""
+    conn = sqlite3.connect(":memory:")
+    conn.executescript(mirror._SCHEMA)
+    monkeypatch.setattr(mirror, "_conn", conn)
+    monkeypatch.setattr(mirror, "_fts", False)
+    systems = {"REG-1": "Скидка 50% на лицензии", "REG-2": "Скидка 50 лицензий",
+               "REG-3": "backup_daily", "REG-4": "backupXdaily", "REG-5": r"C:\Tools"}
+    mirror.upsert_many({"key": k, "fields": {FIELD_ID["Система"]: v}} for k, v in systems.items())
+    return conn
+
+
+@pytest.mark.parametrize("query, keys", [
+    ("50%", ["REG-1"]),
+    ("backup_daily", ["REG-3"]),
+    ("C:\\Tools", ["REG-5"]),
+    ("Скидка", ["REG-1", "REG-2"]),
+])
+def test_like_fallback_matches_wildcards_literally(like_mirror, query, keys):
+    assert [r["key"] for r in mirror.search(query, 10)] == keys
@@ -0,0 +1,69 @@
+# -*- coding: utf-8 -*-
+import asyncio
+import socket
+
+from bench_fakes import FakeTelegram, serve
+from app import bot as bot_module, notifier, tracing
+
+
+class _Bot:
+    def __init__(self):
+        self.seen = []
+
+    async def send_message(self, chat_id, text, parse_mode=None):
+        with tracing.span("telegram sendMessage"):
+            t = tracing._current.get()
+            self.seen.append((chat_id, tracing.current_id(), t.name if t else None))
+
+
+def test_send_runs_in_trace_of_submitter(monkeypatch):
+    monkeypatch.setattr(notifier, "TG_GLOBAL_RATE", 1000.0)
+    monkeypatch.setattr(notifier, "TG_CHAT_RATE", 1000.0)
+    bot = _Bot()
+
+    async def run():
+        notifier.start(bot)
+        try:
+            with tracing.trace("jira event", "REG-1#2"):
+                notifier.submit([1, 2], "card")
+            notifier.submit([3], "no trace")
+        finally:
+            await notifier.stop()
+
+    asyncio.run(run())
+    assert sorted(bot.seen) == [(1, "REG-1#2", "telegram send"),
+                                (2, "REG-1#2", "telegram send"),
+                                (3, "-", None)]
+
+
+def test_sends_overlap_over_bot_api(monkeypatch):
+    s = socket.socket()
+    s.bind(("127.0.0.1", 0))
+    port = s.getsockname()[1]
+    s.close()
+    monkeypatch.setattr(bot_module, "TELEGRAM_API_BASE", f"http://127.0.0.1:{port}/bot")
+    monkeypatch.setattr(notifier, "TG_GLOBAL_RATE", 1000.0)
+    monkeypatch.setattr(notifier, "TG_CHAT_RATE", 1000.0)
+    tg = FakeTelegram(latency=0.1)
+    chats = list(range(1, notifier.TG_SEND_WORKERS + 1))
+
+    async def run():
+        async with serve(tg.app, port):
+            app = bot_module.build_application()
+            await app.initialize()
+            notifier.start(app.bot)
+            try:
+                notifier.submit(chats, "card")
+                assert await tg.wait_sent(len(chats), 5)
+            finally:
+                await notifier.stop()
+                await app.shutdown()
+
+    asyncio.run(run())
+    # все воркеры отправляют одновременно, а не по одному через общее соединение
+    assert tg.max_in_flight == notifier.TG_SEND_WORKERS
+
+
+def test_jira_event_trace_ids_are_unique():
+    a, b = tracing.unique_id("REG-5#1"), tracing.unique_id("REG-5#1")
+    assert a != b and a.startswith("REG-5#1.") and b.startswith("REG-5#1.")
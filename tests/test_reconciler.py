@@ -0,0 +1,105 @@
+# -*- coding: utf-8 -*-
+import asyncio
+import datetime as dt
+
+import pytest
+
+from app import reconciler
+
+T0 = dt.datetime(2026, 10, 17, 9, 0, tzinfo=dt.timezone.utc)
+
+
+def _raw(minute: int) -> str:
+    return (T0 + dt.timedelta(minutes=minute)).strftime("%Y-%m-%dT%H:%M:%S.000+0000")
+
+
+def _issue(key: str, minute: int):
+    return {"key": key, "fields": {"updated": _raw(minute)}}
+
+
+@pytest.fixture
+def jira(monkeypatch, tmp_path):
+    """Подменённый поиск Jira: отдаёт rows по возрастанию updated, как ORDER BY updated ASC."""
+    monkeypatch.setattr(reconciler, "STATE_FILE", str(tmp_path / "reconciler.json"))
+    monkeypatch.setattr(reconciler, "_handled", reconciler.OrderedDict())
+    monkeypatch.setattr(reconciler, "_cursor", T0)
+    monkeypatch.setattr(reconciler, "_loaded", True)
+    state = {"rows": [], "jql": []}
+
+    async def fake_iter_search(jql, fields, limit=100_000, **kw):
+        state["jql"].append(jql)
+        for it in sorted(state["rows"], key=lambda i: i["fields"]["updated"])[:limit]:
+            yield it
+
+    monkeypatch.setattr(reconciler, "iter_search", fake_iter_search)
+    return state
+
+
+def _run(submit):
+    return asyncio.run(reconciler.reconcile_once(submit))
+
+
+def test_first_pass_only_initialises_cursor(jira):
+    reconciler._cursor = None
+    sent = []
+    assert _run(sent.append) == 0
+    assert sent == [] and jira["jql"] == []
+    assert reconciler._cursor is not None
+
+
+def test_skips_versions_handled_by_webhook(jira):
+    jira["rows"] = [_issue("REG-1", 1), _issue("REG-2", 2), _issue("REG-3", 3)]
+    reconciler.mark_handled(_issue("REG-1", 1))
+    reconciler.mark_handled(_issue("REG-2", 0))   # webhook видел более старую версию
+    sent = []
+    assert _run(sent.append) == 2
+    assert sent == ["REG-2", "REG-3"]
+    assert reconciler._cursor == T0 + dt.timedelta(minutes=3)
+
+
+def test_window_includes_overlap(jira, monkeypatch):
+    monkeypatch.setattr(reconciler, "RECONCILE_OVERLAP_SEC", 600)
+    reconciler._cursor = dt.datetime.now(dt.timezone.utc) - dt.timedelta(minutes=4, seconds=30)
+    _run(lambda key: None)
+    # 4.5 минуты с курсора + 10 минут перекрытия, с округлением вверх
+    assert 'updated >= "-15m"' in jira["jql"][0]
+
+
+def test_cap_counts_only_unhandled_and_resumes(jira, monkeypatch):
+    monkeypatch.setattr(reconciler, "RECONCILE_MAX", 2)
+    handled = [_issue(f"REG-{n}", n) for n in range(1, 6)]
+    missed = [_issue(f"REG-{n}", n) for n in range(6, 10)]
+    jira["rows"] = handled + missed
+    for it in handled:
+        reconciler.mark_handled(it)
+
+    sent = []
+
+    def submit(key):
+        sent.append(key)
+        reconciler.mark_handled(next(i for i in jira["rows"] if i["key"] == key))
+
+    # окно целиком из обработанных задач не мешает дойти до пропущенных
+    assert _run(submit) == 2
+    assert sent == ["REG-6", "REG-7"]
+    # курсор — на последней просмотренной задаче, не на самой новой в окне
+    assert reconciler._cursor == T0 + dt.timedelta(minutes=7)
+
+    assert _run(submit) == 2
+    assert sent == ["REG-6", "REG-7", "REG-8", "REG-9"]
+    assert reconciler._cursor == T0 + dt.timedelta(minutes=9)
+    assert _run(submit) == 0
+
+
+def test_state_survives_restart(jira, monkeypatch):
+    jira["rows"] = [_issue("REG-1", 1)]
+    reconciler.mark_handled(_issue("REG-1", 1))
+    _run(lambda key: None)
+
+    monkeypatch.setattr(reconciler, "_handled", reconciler.OrderedDict())
+    monkeypatch.setattr(reconciler, "_cursor", None)
+    monkeypatch.setattr(reconciler, "_loaded", False)
+    reconciler._load_state()
+    assert reconciler._cursor == T0 + dt.timedelta(minutes=1)
+    assert reconciler.is_handled(_issue("REG-1", 1))
+    assert not reconciler.is_handled(_issue("REG-1", 2))
@@ -0,0 +1,53 @@
+# -*- coding: utf-8 -*-
+import asyncio
+import socket
+
+import httpx
+
+import server
+from app import bot as bot_module
+
+
+def _free_port() -> int:
+    s = socket.socket()
+    s.bind(("127.0.0.1", 0))
+    port = s.getsockname()[1]
+    s.close()
+    return port
+
+
+def test_api_is_up_while_telegram_is_down(monkeypatch):
+    port = _free_port()
+    # Bot API не отвечает: порт никто не слушает
+    monkeypatch.setattr(bot_module, "TELEGRAM_API_BASE", f"http://127.0.0.1:{_free_port()}/bot")
+    monkeypatch.setattr(server, "PORT", port)
+    monkeypatch.setattr(server, "TG_MODE", "polling")
+    servers = []
+
+    class _Server(server._ApiServer):
+        def __init__(self, config):
+            config.host = "127.0.0.1"
+            super().__init__(config)
+            servers.append(self)
+
+    monkeypatch.setattr(server, "_ApiServer", _Server)
+
+    async def run():
+        task = asyncio.get_running_loop().create_task(server.serve())
+        try:
+            async with httpx.AsyncClient() as c:
+                for _ in range(100):
+                    try:
+                        r = await c.get(f"http://127.0.0.1:{port}/health")
+                        break
+                    except httpx.TransportError:
+                        await asyncio.sleep(0.05)
+                else:
+                    raise AssertionError("API did not start")
+            assert r.status_code == 200
+            assert not task.done()
+        finally:
+            servers[0].should_exit = True
+            await asyncio.wait_for(task, 10)
+
+    asyncio.run(run())
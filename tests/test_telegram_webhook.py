@@ -0,0 +1,65 @@
+# -*- coding: utf-8 -*-
+import asyncio
+from types import SimpleNamespace
+
+import httpx
+import pytest
+
+import server
+from app import webhooks
+from app.config import TG_WEBHOOK_PATH
+from tg_webhook_standin import make_message_update
+
+SECRET = "s3cret"
+
+
+def _tg_app():
+    """Запущенное Application, насколько его видит маршрут: running, bot, update_queue."""
+    return SimpleNamespace(running=True, bot=None, update_queue=asyncio.Queue())
+
+
+def _post(api, update, headers):
+    async def run():
+        transport = httpx.ASGITransport(app=api)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bot") as c:
+            return await c.post(TG_WEBHOOK_PATH, json=update, headers=headers)
+    return asyncio.run(run())
+
+
+@pytest.fixture
+def webhook_mode(monkeypatch):
+    monkeypatch.setattr(webhooks, "TG_MODE", "webhook")
+    monkeypatch.setattr(webhooks, "TG_WEBHOOK_SECRET", SECRET)
+
+
+def test_update_with_valid_secret_is_queued(webhook_mode):
+    tg = _tg_app()
+    update = make_message_update(42, "/info REG-1")
+    r = _post(webhooks.create_app(tg), update, {"X-Telegram-Bot-Api-Secret-Token": SECRET})
+    assert r.status_code == 200
+    queued = tg.update_queue.get_nowait()
+    assert queued.update_id == update["update_id"]
+    assert queued.message.text == "/info REG-1"
+
+
+@pytest.mark.parametrize("headers", [{}, {"X-Telegram-Bot-Api-Secret-Token": "wrong"}])
+def test_missing_or_wrong_secret_is_rejected(webhook_mode, headers):
+    tg = _tg_app()
+    r = _post(webhooks.create_app(tg), make_message_update(42, "/start"), headers)
+    assert r.status_code == 403
+    assert tg.update_queue.empty()
+
+
+def test_route_is_absent_in_polling_mode(monkeypatch):
+    monkeypatch.setattr(webhooks, "TG_MODE", "polling")
+    monkeypatch.setattr(webhooks, "TG_WEBHOOK_SECRET", SECRET)
+    r = _post(webhooks.create_app(_tg_app()), make_message_update(42, "/start"),
+              {"X-Telegram-Bot-Api-Secret-Token": SECRET})
+    assert r.status_code == 404
+
+
+def test_serve_refuses_webhook_mode_without_secret(monkeypatch):
+    monkeypatch.setattr(server, "TG_MODE", "webhook")
+    monkeypatch.setattr(server, "TG_WEBHOOK_SECRET", "")
+    with pytest.raises(SystemExit, match="TG_WEBHOOK_SECRET"):
+        asyncio.run(server.serve())
@@ -0,0 +1,53 @@
+# -*- coding: utf-8 -*-
+import asyncio
+import threading
+
+import pytest
+
+from app import values_index
+from app.settings import DEPARTMENT_FIELD_ID
+
+
+@pytest.fixture
+def index(monkeypatch, tmp_path):
+    monkeypatch.setattr(values_index, "INDEX_FILE", str(tmp_path / "values_index.json"))
+    monkeypatch.setattr(values_index, "_values", {})
+    monkeypatch.setattr(values_index, "_PERSIST_DELAY", 0.05)
+    writes = []
+    save = values_index.save_json
+
+    def recording_save(path, data):
+        writes.append((threading.current_thread() is threading.main_thread(), data))
+        save(path, data)
+
+    monkeypatch.setattr(values_index, "save_json", recording_save)
+    return writes
+
+
+def _issue(dept):
+    return {"key": "REG-1", "fields": {DEPARTMENT_FIELD_ID: {"value": dept}}}
+
+
+def test_new_values_are_saved_once_off_the_loop(index):
+    async def run():
+        for dept in ("IDM", "HelpDesk", "Закупки"):
+            values_index.observe_issue(_issue(dept))
+        assert index == []                  # webhook не ждёт диска
+        await asyncio.sleep(0.2)
+
+    asyncio.run(run())
+    assert len(index) == 1
+    on_loop_thread, data = index[0]
+    assert not on_loop_thread
+    assert sorted(data["fields"][DEPARTMENT_FIELD_ID]) == ["HelpDesk", "IDM", "Закупки"]
+
+
+def test_flush_saves_pending_values(index, monkeypatch):
+    monkeypatch.setattr(values_index, "_PERSIST_DELAY", 60)
+
+    async def run():
+        values_index.observe_issue(_issue("IDM"))
+        await values_index.flush()
+
+    asyncio.run(run())
+    assert [d["fields"][DEPARTMENT_FIELD_ID] for _, d in index] == [["IDM"]]
@@ -0,0 +1,301 @@
+# -*- coding: utf-8 -*-
+"""
+Офлайн-бенчмарк бота: настоящий код app/ против фейковых Jira и Telegram
+(tools/bench_fakes.py) в одном процессе, без сети и без реальных токенов.
+
+    python tools/bench.py --issues 10000 --out before.json
+    python tools/bench.py --issues 10000 --baseline before.json
+
+Что меряется (мс):
+  start_cold    — первый /start на пустом DATA_DIR (строится индекс отделов);
+  start_warm    — /start после запуска фоновых сервисов;
+  pick_dept     — выбор отдела со вторым фильтром (callback dept:...);
+  info_miss     — /info KEY, задачи нет в кэше;
+  info_hit      — тот же /info повторно;
+  info_dept     — /info * <отдел> (пакетная выдача);
+  mirror_sync   — полная выгрузка проекта в локальное зеркало (один замер);
+  find          — /find по зеркалу;
+  webhook_ack   — ответ POST /jira-webhook;
+  webhook_fanout — от POST /jira-webhook до последнего sendMessage подписчикам;
+  reconcile     — правки без вебхука: проход сверки до последнего sendMessage.
+Память — RSS всего процесса (фейки живут в нём же), поэтому сравнивать
+имеет смысл прогоны с одинаковыми параметрами.
+
+Переменные окружения приложения (ISSUE_CACHE_SIZE, SEARCH_PAGE_SIZE,
+SELECT_OPTIONS_FROM_META, ...) можно задавать как обычно; Jira, Telegram
+и DATA_DIR бенчмарк всегда подменяет своими.
+"""
+from __future__ import annotations
+import argparse
+import asyncio
+import json
+import logging
+import os
+import random
+import resource
+import socket
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Dict, List
+
+ROOT = Path(__file__).resolve().parent.parent
+BENCH_WEBHOOK_SECRET = "bench-secret"
+sys.path.insert(0, str(ROOT))
+
+log = logging.getLogger("it_registry.bench")
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _rss_mb() -> float:
+    with open("/proc/self/statm") as f:
+        pages = int(f.read().split()[1])
+    return round(pages * os.sysconf("SC_PAGE_SIZE") / 2 ** 20, 1)
+
+
+def _peak_rss_mb() -> float:
+    # Linux: ru_maxrss в килобайтах
+    return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+
+
+def _summary(samples: List[float]) -> Dict[str, Any]:
+    ordered = sorted(samples)
+    return {
+        "n": len(ordered),
+        "mean": round(statistics.fmean(ordered), 2),
+        "p50": round(ordered[len(ordered) // 2], 2),
+        "p95": round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))], 2),
+        "max": round(ordered[-1], 2),
+    }
+
+
+def _configure_env(args: argparse.Namespace, data_dir: str, jira_port: int, tg_port: int) -> None:
+    # куда ходит бот — всегда фейки и временный каталог
+    os.environ.update({
+        "JIRA_BASE_URL": f"http://127.0.0.1:{jira_port}",
+        "TELEGRAM_API_BASE": f"http://127.0.0.1:{tg_port}/bot",
+        "TELEGRAM_BOT_TOKEN": "123456:bench",
+        "DATA_DIR": data_dir,
+        "DB_PATH": os.path.join(data_dir, "bot.db"),
+        # полям из payload v2 бот доверяет только при заданном секрете
+        "JIRA_WEBHOOK_SECRET": BENCH_WEBHOOK_SECRET,
+    })
+    # остальное — если не задано снаружи
+    os.environ.setdefault("WEBHOOK_DEBOUNCE_SEC", str(args.debounce))
+    os.environ.setdefault("TG_GLOBAL_RATE", str(args.tg_rate))
+    os.environ.setdefault("TG_CHAT_RATE", str(args.tg_rate))
+    # сверку бенчмарк запускает сам (сценарий reconcile)
+    os.environ.setdefault("RECONCILE_INTERVAL_SEC", "0")
+
+
+async def _run(args: argparse.Namespace, data_dir: str) -> Dict[str, Any]:
+    jira_port, tg_port = _free_port(), _free_port()
+    _configure_env(args, data_dir, jira_port, tg_port)
+
+    # app.* читает окружение при импорте
+    import httpx
+    from telegram import Update
+    from app.bot import build_application
+    from app.webhooks import create_app, enqueue_reconciled
+    from app import runtime, store, mirror, reconciler
+    from app.formatters import card_field_ids
+    from bench_fakes import SyntheticRegistry, FakeJira, FakeTelegram, serve
+    from tg_webhook_standin import make_message_update, make_callback_update
+
+    rnd = random.Random(args.seed)
+    registry = SyntheticRegistry(args.issues)
+    jira = FakeJira(registry, latency=args.jira_latency / 1000)
+    tg = FakeTelegram(latency=args.tg_latency / 1000)
+    results: Dict[str, Any] = {}
+    memory: Dict[str, float] = {"rss_start": _rss_mb()}
+    jira_calls: Dict[str, int] = {}
+
+    async with serve(jira.app, jira_port), serve(tg.app, tg_port):
+        tg_app = build_application()
+        api = create_app(tg_app)
+        await tg_app.initialize()
+        chat_ids = iter(range(10_000_000, 20_000_000))
+
+        async def timed(update: Dict[str, Any]) -> float:
+            t0 = time.perf_counter()
+            await tg_app.process_update(Update.de_json(update, tg_app.bot))
+            return (time.perf_counter() - t0) * 1000
+
+        async def scenario(name: str, updates: List[Dict[str, Any]]) -> None:
+            before = sum(jira.requests.values())
+            samples = [await timed(u) for u in updates]
+            results[name] = _summary(samples)
+            jira_calls[name] = sum(jira.requests.values()) - before
+            log.info("%s: %s", name, results[name])
+
+        try:
+            # индекс отделов ещё не построен — первый /start идёт в Jira
+            await scenario("start_cold", [make_message_update(next(chat_ids), "/start")])
+            memory["rss_after_index"] = _rss_mb()
+            await runtime.startup(tg_app)
+            # выгрузка зеркала идёт в фоне с запуска — дожидаемся, чтобы не мешала замерам
+            t0 = time.perf_counter()
+            await mirror.ensure_synced()
+            results["mirror_sync"] = _summary([(time.perf_counter() - t0) * 1000])
+            # курсор сверки — с момента запуска
+            await reconciler.reconcile_once(enqueue_reconciled)
+
+            await scenario("start_warm", [make_message_update(next(chat_ids), "/start")
+                                          for _ in range(args.repeat)])
+            await scenario("pick_dept", [make_callback_update(next(chat_ids), "dept:Закупки")
+                                         for _ in range(args.repeat)])
+
+            keys = [registry.key(i) for i in rnd.sample(range(args.issues), min(args.repeat, args.issues))]
+            info_chat = next(chat_ids)
+            await scenario("info_miss", [make_message_update(info_chat, f"/info {k}") for k in keys])
+            await scenario("info_hit", [make_message_update(info_chat, f"/info {k}") for k in keys])
+            await scenario("info_dept", [make_message_update(info_chat, "/info * IDM")
+                                         for _ in range(max(1, args.repeat // 10))])
+            queries = ["Вендор 3", "deploy_1", "support7 vendor", "Система 05", "check"]
+            await scenario("find", [make_message_update(info_chat, f"/find {queries[n % len(queries)]}")
+                                    for n in range(args.repeat)])
+            memory["rss_after_commands"] = _rss_mb()
+
+            # подписчики отдела без второго фильтра
+            dept = "IDM"
+            for _ in range(args.subscribers):
+                store.set_pref(next(chat_ids), dept=dept)
+            dept_issues = registry.of_dept(dept)
+            acks: List[float] = []
+            fanouts: List[float] = []
+            before = sum(jira.requests.values())
+            transport = httpx.ASGITransport(app=api)
+            async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+                for _ in range(args.webhooks):
+                    i = rnd.choice(dept_issues)
+                    registry.touch(i)
+                    tg.reset()
+                    t0 = time.perf_counter()
+                    if args.payload == "v2":
+                        # как Groovy/groovyListener.groovy: поля карточки и changelog
+                        body = {"v": 2, "webhookEvent": "IssueEvent",
+                                "issue": registry.issue(i, card_field_ids()),
+                                "changelog": {"items": [{"field": "Инструкция", "toString": "…"}]}}
+                    else:
+                        body = {"webhookEvent": "jira:issue_updated", "issue": {"key": registry.key(i)}}
+                    r = await client.post("/jira-webhook", json=body,
+                                          headers={"X-Webhook-Secret": BENCH_WEBHOOK_SECRET})
+                    r.raise_for_status()
+                    acks.append((time.perf_counter() - t0) * 1000)
+                    if not await tg.wait_sent(args.subscribers, args.timeout):
+                        raise RuntimeError(f"only {tg.sent}/{args.subscribers} notifications "
+                                           f"arrived within {args.timeout}s")
+                    fanouts.append((tg.last_sent_at - t0) * 1000)
+            results["webhook_ack"] = _summary(acks)
+            results["webhook_fanout"] = _summary(fanouts)
+            jira_calls["webhook_fanout"] = sum(jira.requests.values()) - before
+            memory["rss_after_fanout"] = _rss_mb()
+
+            # правки, о которых вебхук не пришёл; уже разосланные сверка пропускает
+            missed = rnd.sample(dept_issues, min(args.webhooks, len(dept_issues)))
+            for i in missed:
+                registry.touch(i)
+            tg.reset()
+            before = sum(jira.requests.values())
+            t0 = time.perf_counter()
+            found = await reconciler.reconcile_once(enqueue_reconciled)
+            if found != len(missed):
+                raise RuntimeError(f"reconciler found {found} of {len(missed)} missed changes")
+            if not await tg.wait_sent(args.subscribers * len(missed), args.timeout):
+                raise RuntimeError(f"only {tg.sent}/{args.subscribers * len(missed)} reconciled "
+                                   f"notifications arrived within {args.timeout}s")
+            results["reconcile"] = _summary([(tg.last_sent_at - t0) * 1000])
+            jira_calls["reconcile"] = sum(jira.requests.values()) - before
+        finally:
+            await runtime.shutdown(tg_app)
+            await tg_app.shutdown()
+
+    memory["peak_rss"] = _peak_rss_mb()
+    return {
+        "params": {
+            "issues": args.issues,
+            "subscribers": args.subscribers,
+            "repeat": args.repeat,
+            "webhooks": args.webhooks,
+            "jira_latency_ms": args.jira_latency,
+            "tg_latency_ms": args.tg_latency,
+            "tg_rate": float(os.environ["TG_GLOBAL_RATE"]),
+            "debounce_sec": float(os.environ["WEBHOOK_DEBOUNCE_SEC"]),
+            "payload": args.payload,
+        },
+        "latency_ms": results,
+        "jira_requests": jira_calls,
+        "memory_mb": memory,
+    }
+
+
+def _compare(current: Dict[str, Any], baseline: Dict[str, Any]) -> str:
+    """Таблица p50/p95 и памяти: база -> сейчас (изменение в %)."""
+    def pct(old: float, new: float) -> str:
+        return f"{(new - old) / old * 100:+.1f}%" if old else "n/a"
+
+    lines = [f"{'metric':<24}{'baseline':>12}{'current':>12}{'change':>10}"]
+    for name, cur in current["latency_ms"].items():
+        old = baseline.get("latency_ms", {}).get(name)
+        if not old:
+            continue
+        for q in ("p50", "p95"):
+            lines.append(f"{name + ' ' + q:<24}{old[q]:>12.2f}{cur[q]:>12.2f}{pct(old[q], cur[q]):>10}")
+    for name, cur in current["memory_mb"].items():
+        old = baseline.get("memory_mb", {}).get(name)
+        if old is not None:
+            lines.append(f"{name + ' MB':<24}{old:>12.1f}{cur:>12.1f}{pct(old, cur):>10}")
+    if baseline.get("params") != current["params"]:
+        lines.append("warning: baseline was recorded with different parameters")
+    return "\n".join(lines)
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser(description="Offline benchmark against fake Jira and Telegram")
+    ap.add_argument("--issues", type=int, default=10_000, help="размер синтетического проекта (1k–100k)")
+    ap.add_argument("--subscribers", type=int, default=500, help="подписчиков отдела для рассылки")
+    ap.add_argument("--repeat", type=int, default=50, help="повторов каждой команды")
+    ap.add_argument("--webhooks", type=int, default=5, help="событий Jira для замера рассылки")
+    ap.add_argument("--jira-latency", type=float, default=5.0, help="задержка ответа фейковой Jira, мс")
+    ap.add_argument("--tg-latency", type=float, default=0.0, help="задержка ответа фейкового Bot API, мс")
+    ap.add_argument("--tg-rate", type=float, default=1000.0,
+                    help="лимит отправки, сообщений/с (25 — как в проде; по умолчанию почти без лимита)")
+    ap.add_argument("--payload", choices=("key", "v2"), default="v2",
+                    help="тело /jira-webhook: только ключ (задача из Jira) или v2 с полями карточки")
+    ap.add_argument("--debounce", type=float, default=0.0, help="WEBHOOK_DEBOUNCE_SEC на время замера")
+    ap.add_argument("--timeout", type=float, default=120.0, help="ожидание рассылки одного события, с")
+    ap.add_argument("--seed", type=int, default=1)
+    ap.add_argument("--out", help="сохранить результат в JSON")
+    ap.add_argument("--baseline", help="JSON прошлого прогона для сравнения")
+    ap.add_argument("--log-level", default="WARNING")
+    args = ap.parse_args()
+
+    logging.basicConfig(
+        level=getattr(logging, args.log_level.upper(), logging.WARNING),
+        format="%(asctime)s [%(levelname)s] %(name)s: %(message)s",
+    )
+    log.setLevel(logging.INFO)
+
+    with tempfile.TemporaryDirectory(prefix="it-registry-bench-") as data_dir:
+        report = asyncio.run(_run(args, data_dir))
+
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.out:
+        Path(args.out).write_text(text, encoding="utf-8")
+    print(text)
+    if args.baseline:
+        baseline = json.loads(Path(args.baseline).read_text(encoding="utf-8"))
+        print()
+        print(_compare(report, baseline))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,449 @@
+# -*- coding: utf-8 -*-
+"""
+Фейковые Jira REST и Telegram Bot API для офлайн-бенчмарка (tools/bench.py).
+
+FakeJira — синтетический проект REG на N задач (1k–100k). Задачи не хранятся:
+задача i строится по номеру, поэтому проект на 100k записей почти не занимает
+памяти. Поддерживается ровно тот JQL, который строит app/jira_client.py:
+project = "...", cf[NNN] = "значение", key in (...), ORDER BY.
+
+FakeTelegram — принимает вызовы Bot API, отвечает валидными объектами
+и считает sendMessage, чтобы бенчмарк мог дождаться последнего уведомления.
+
+Модуль импортирует app.formatters/app.config — переменные окружения
+(DEPARTMENT_FIELD_ID и т.п.) нужно выставить до импорта.
+"""
+from __future__ import annotations
+import asyncio
+import contextlib
+import datetime as dt
+import json
+import re
+import time
+import urllib.parse
+from typing import Any, Dict, Iterable, List, Optional, Sequence
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+from app.config import DEPARTMENTS
+from app.formatters import DEPARTMENT_FIELD_ID, FIELD_ID, FIELD_TYPE
+
+_BASE_TS = dt.datetime(2024, 1, 1, 9, 0, 0, tzinfo=dt.timezone(dt.timedelta(hours=3)))
+_STATUSES = ("Открыта", "В работе", "Актуальна")
+
+_CLAUSE_KEYS = re.compile(r'^key\s+in\s*\((?P<keys>[^)]*)\)$', re.I)
+_CLAUSE_UPDATED = re.compile(r'^updated\s*>=\s*"-(?P<minutes>\d+)m"$', re.I)
+_CLAUSE_EQ = re.compile(r'^(?P<field>cf\[\d+\]|"[^"]+"|\w+)\s*=\s*"(?P<value>[^"]*)"$', re.I)
+
+
+def _jira_ts(t: dt.datetime) -> str:
+    return f"{t:%Y-%m-%dT%H:%M:%S}.{t.microsecond // 1000:03d}{t:%z}"
+
+
+class SyntheticRegistry:
+    """Задачи REG-1..REG-N; значения полей детерминированно зависят от номера."""
+
+    def __init__(self, size: int, project: str = "REG", noise_fields: int = 30,
+                 systems: int = 40, licenses: int = 12, owners: int = 300):
+        self.size = size
+        self.project = project
+        self.noise_fields = noise_fields
+        self.systems = systems
+        self.licenses = licenses
+        self.owners = owners
+        # номер задачи -> сколько раз её «редактировали» (сдвигает updated)
+        self._edits: Dict[int, int] = {}
+        # номер задачи -> время последней правки (для updated >= "-Nm")
+        self._touched: Dict[int, dt.datetime] = {}
+        self._match_cache: Dict[str, List[int]] = {}
+
+    # ---- значения полей ----
+
+    def key(self, i: int) -> str:
+        return f"{self.project}-{i + 1}"
+
+    def index_of(self, key: str) -> Optional[int]:
+        prefix, _, num = key.strip().upper().rpartition("-")
+        if prefix != self.project or not num.isdigit():
+            return None
+        i = int(num) - 1
+        return i if 0 <= i < self.size else None
+
+    def dept(self, i: int) -> str:
+        return DEPARTMENTS[i % len(DEPARTMENTS)]
+
+    def of_dept(self, dept: str) -> range:
+        """Номера задач отдела (отдел задачи i — DEPARTMENTS[i % len])."""
+        d = DEPARTMENTS.index(dept)
+        return range(d, self.size, len(DEPARTMENTS))
+
+    def select_options(self) -> Dict[str, List[str]]:
+        """field_id -> все варианты Select-поля (для createmeta/editmeta)."""
+        return {
+            DEPARTMENT_FIELD_ID: list(DEPARTMENTS),
+            FIELD_ID["Система"]: [f"Система {n:02d}" for n in range(self.systems)],
+            FIELD_ID["Лицензии"]: [f"Лицензия {n:02d}" for n in range(self.licenses)],
+        }
+
+    def touch(self, i: int) -> None:
+        """Задача изменилась: updated сдвигается вперёд (как после правки в Jira)."""
+        self._edits[i] = self._edits.get(i, 0) + 1
+        self._touched[i] = dt.datetime.now(_BASE_TS.tzinfo)
+
+    def fields(self, i: int) -> Dict[str, Any]:
+        edits = self._edits.get(i, 0)
+        created = _BASE_TS + dt.timedelta(minutes=i)
+        updated = self._touched.get(i) or created + dt.timedelta(days=1, minutes=edits)
+        owners = [(i + k) % self.owners for k in range(2)]
+        f: Dict[str, Any] = {
+            "summary": f"Запись реестра {i + 1}",
+            "status": {"name": _STATUSES[i % len(_STATUSES)], "id": str(10000 + i % len(_STATUSES))},
+            "created": _jira_ts(created),
+            "updated": _jira_ts(updated),
+            DEPARTMENT_FIELD_ID: {"value": self.dept(i), "id": str(20000 + i % len(DEPARTMENTS))},
+            FIELD_ID["Система"]: {"value": f"Система {i % self.systems:02d}"},
+            FIELD_ID["Лицензии"]: {"value": f"Лицензия {i % self.licenses:02d}"},
+            FIELD_ID["Актуальные скрипты"]: f"scripts/deploy_{i}.sh\nscripts/check_{i}.sh",
+            FIELD_ID["Вендоры"]: f"Вендор {i % 25}" + (f", Вендор {i % 7 + 25}" if i % 3 == 0 else ""),
+            FIELD_ID["Инструкция"]: f"1. Открыть консоль.\n2. Выполнить deploy_{i}.sh (правка {edits}).",
+            FIELD_ID["Контакты поставщиков"]: f"support{i % 25}@vendor.example, +7 495 000-{i % 100:02d}-{i % 97:02d}",
+            FIELD_ID["Ответственные"]: [
+                {"name": f"user{n}", "key": f"user{n}", "displayName": f"Пользователь {n}",
+                 "emailAddress": f"user{n}@example.local", "active": True}
+                for n in owners
+            ],
+            FIELD_ID["Ссылки на документацию"]: f"https://wiki.example.local/display/REG/{i + 1}",
+        }
+        # «лишние» поля: так выглядит ответ Jira без проекции fields=
+        for n in range(self.noise_fields):
+            f[f"customfield_{19000 + n}"] = f"Служебное значение {n} задачи {i + 1} " * 3
+        return f
+
+    def issue(self, i: int, fields: Optional[Sequence[str]] = None) -> Dict[str, Any]:
+        full = self.fields(i)
+        if fields:
+            wanted = [x for x in fields if x not in ("*all", "*navigable")]
+            if len(wanted) == len(fields):
+                full = {k: full[k] for k in wanted if k in full}
+        return {"id": str(100000 + i), "key": self.key(i), "self": f"/rest/api/2/issue/{100000 + i}",
+                "fields": full}
+
+    # ---- JQL ----
+
+    def _value_of(self, field: str, i: int) -> Optional[str]:
+        fid = field
+        if field.startswith("cf["):
+            fid = f"customfield_{field[3:-1]}"
+        elif field.startswith('"'):
+            name = field.strip('"')
+            fid = FIELD_ID.get(name, name)
+        v = self.fields(i).get(fid)
+        if isinstance(v, dict):
+            v = v.get("value") or v.get("name")
+        return None if v is None else str(v)
+
+    def match(self, jql: str) -> List[int]:
+        """Номера задач под JQL; ValueError — запрос, который фейк не понимает."""
+        parts = re.split(r"\s+ORDER\s+BY\s+", jql.strip(), maxsplit=1, flags=re.I)
+        where, order = parts[0], (parts[1] if len(parts) > 1 else "")
+        cached = self._match_cache.get(jql)
+        if cached is not None:
+            return cached
+
+        candidates: Iterable[int] = range(self.size)
+        checks = []
+        relative = False
+        for clause in re.split(r"\s+AND\s+", where, flags=re.I):
+            clause = clause.strip()
+            if not clause:
+                continue
+            m = _CLAUSE_KEYS.match(clause)
+            if m:
+                idx = (self.index_of(k) for k in m.group("keys").split(","))
+                candidates = sorted({i for i in idx if i is not None})
+                continue
+            m = _CLAUSE_UPDATED.match(clause)
+            if m:
+                # недавно менялись только задачи, которые трогал бенчмарк
+                since = dt.datetime.now(_BASE_TS.tzinfo) - dt.timedelta(minutes=int(m.group("minutes")))
+                recent = {i for i, t in self._touched.items() if t >= since}
+                candidates = sorted(recent.intersection(candidates))
+                relative = True
+                continue
+            m = _CLAUSE_EQ.match(clause)
+            if not m:
+                raise ValueError(f"Unsupported JQL clause: {clause}")
+            field, value = m.group("field"), m.group("value")
+            if field.lower() == "project":
+                if value.upper() != self.project:
+                    candidates = []
+                continue
+            if field == f"cf[{DEPARTMENT_FIELD_ID.split('_', 1)[1]}]" and value in DEPARTMENTS:
+                # отдел = номер по модулю: без перебора всего проекта
+                if isinstance(candidates, range):
+                    candidates = self.of_dept(value)
+                else:
+                    candidates = [i for i in candidates if self.dept(i) == value]
+                continue
+            checks.append((field, value))
+
+        result = [i for i in candidates if all(self._value_of(f, i) == v for f, v in checks)]
+        if "created desc" in order.lower():
+            result.reverse()
+        elif "updated" in order.lower():
+            result.sort(key=lambda i: (self._touched.get(i) or _BASE_TS, i),
+                        reverse="desc" in order.lower())
+        if relative:
+            # зависит от текущего времени — не кэшируем
+            return result
+        if len(self._match_cache) > 256:
+            self._match_cache.clear()
+        self._match_cache[jql] = result
+        return result
+
+
+class FakeJira:
+    """Jira DC REST API поверх SyntheticRegistry (только эндпоинты, которые вызывает бот)."""
+
+    def __init__(self, registry: SyntheticRegistry, latency: float = 0.0,
+                 group: str = "reg_editors", group_size: int = 50, max_results: int = 1000):
+        self.registry = registry
+        self.latency = latency
+        self.group = group
+        self.group_size = group_size
+        self.max_results = max_results
+        self.requests: Dict[str, int] = {}
+        self.app = self._build()
+
+    def _count(self, name: str) -> None:
+        self.requests[name] = self.requests.get(name, 0) + 1
+
+    async def _delay(self) -> None:
+        if self.latency > 0:
+            await asyncio.sleep(self.latency)
+
+    def _field_meta(self) -> List[Dict[str, Any]]:
+        out = []
+        for fid, values in self.registry.select_options().items():
+            out.append({
+                "fieldId": fid,
+                "name": fid,
+                "schema": {"type": "option", "custom": "select"},
+                "allowedValues": [{"id": str(30000 + n), "value": v, "disabled": False}
+                                  for n, v in enumerate(values)],
+            })
+        return out
+
+    def _build(self) -> FastAPI:
+        app = FastAPI()
+        reg = self.registry
+
+        @app.get("/rest/api/2/search")
+        async def search(jql: str, startAt: int = 0, maxResults: int = 50, fields: str = ""):
+            self._count("search")
+            await self._delay()
+            try:
+                matched = reg.match(jql)
+            except ValueError as e:
+                return JSONResponse({"errorMessages": [str(e)], "errors": {}}, status_code=400)
+            size = max(0, min(maxResults, self.max_results))
+            page = matched[startAt:startAt + size]
+            wanted = [x for x in fields.split(",") if x] or None
+            return {
+                "startAt": startAt,
+                "maxResults": size,
+                "total": len(matched),
+                "issues": [reg.issue(i, wanted) for i in page],
+            }
+
+        @app.get("/rest/api/2/issue/{key}")
+        async def issue(key: str, fields: str = ""):
+            self._count("issue")
+            await self._delay()
+            i = reg.index_of(key)
+            if i is None:
+                return JSONResponse({"errorMessages": ["Issue Does Not Exist"], "errors": {}}, status_code=404)
+            return reg.issue(i, [x for x in fields.split(",") if x] or None)
+
+        @app.get("/rest/api/2/issue/{key}/editmeta")
+        async def editmeta(key: str):
+            self._count("editmeta")
+            await self._delay()
+            return {"fields": {m.pop("fieldId"): m for m in self._field_meta()}}
+
+        @app.get("/rest/api/2/issue/createmeta/{project}/issuetypes")
+        async def createmeta_types(project: str):
+            self._count("createmeta")
+            await self._delay()
+            return {"startAt": 0, "maxResults": 50, "total": 1, "isLast": True,
+                    "values": [{"id": "10001", "name": "Запись реестра"}]}
+
+        @app.get("/rest/api/2/issue/createmeta/{project}/issuetypes/{type_id}")
+        async def createmeta_fields(project: str, type_id: str):
+            self._count("createmeta")
+            await self._delay()
+            meta = self._field_meta()
+            return {"startAt": 0, "maxResults": 100, "total": len(meta), "isLast": True, "values": meta}
+
+        @app.get("/rest/api/2/field")
+        async def field_list():
+            self._count("field")
+            await self._delay()
+            out = [
+                {"id": "summary", "name": "Summary", "custom": False},
+                {"id": "status", "name": "Status", "custom": False},
+                {"id": "updated", "name": "Updated", "custom": False},
+                {"id": DEPARTMENT_FIELD_ID, "name": "Отдел", "custom": True},
+            ]
+            for label, fid in FIELD_ID.items():
+                out.append({"id": fid, "name": label, "custom": True,
+                            "schema": {"type": FIELD_TYPE.get(label, "string")}})
+            return out
+
+        @app.get("/rest/api/2/group/member")
+        async def group_member(groupname: str, startAt: int = 0, maxResults: int = 50):
+            self._count("group_member")
+            await self._delay()
+            if groupname != self.group:
+                return JSONResponse({"errorMessages": ["Group not found"]}, status_code=404)
+            end = min(self.group_size, startAt + maxResults)
+            return {
+                "startAt": startAt,
+                "maxResults": maxResults,
+                "total": self.group_size,
+                "isLast": end >= self.group_size,
+                "values": [{"name": f"editor{n}", "key": f"editor{n}", "active": True}
+                           for n in range(startAt, end)],
+            }
+
+        @app.get("/rest/api/2/user")
+        async def user(username: str):
+            self._count("user")
+            await self._delay()
+            name = username.lower()
+            if name.startswith("editor") and name[6:].isdigit():
+                groups = [{"name": self.group}] if int(name[6:]) < self.group_size else []
+            elif name.startswith("user") and name[4:].isdigit():
+                groups = []
+            else:
+                return JSONResponse({"errorMessages": ["User does not exist"]}, status_code=404)
+            return {"name": username, "key": username,
+                    "groups": {"size": len(groups), "items": groups}}
+
+        return app
+
+
+class FakeTelegram:
+    """Bot API /bot<token>/<method>: валидные ответы и учёт отправленных сообщений."""
+
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        self.calls: Dict[str, int] = {}
+        self.sent = 0
+        self.last_sent_at = 0.0
+        # sendMessage, обрабатываемые одновременно (сейчас и максимум)
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self._cond: Optional[asyncio.Condition] = None
+        self._message_id = 0
+        self.app = self._build()
+
+    def _condition(self) -> asyncio.Condition:
+        if self._cond is None:
+            self._cond = asyncio.Condition()
+        return self._cond
+
+    def reset(self) -> None:
+        self.sent = 0
+        self.last_sent_at = 0.0
+        self.max_in_flight = 0
+
+    async def wait_sent(self, n: int, timeout: float) -> bool:
+        """Дождаться, пока sendMessage будет вызван не меньше n раз."""
+        cond = self._condition()
+        async with cond:
+            try:
+                await asyncio.wait_for(cond.wait_for(lambda: self.sent >= n), timeout)
+            except asyncio.TimeoutError:
+                return False
+        return True
+
+    def _message(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        self._message_id += 1
+        return {
+            "message_id": self._message_id,
+            "date": int(time.time()),
+            "chat": {"id": int(params.get("chat_id") or 0), "type": "private"},
+            "from": {"id": 1, "is_bot": True, "first_name": "bench", "username": "bench_bot"},
+            "text": str(params.get("text") or ""),
+        }
+
+    def _build(self) -> FastAPI:
+        app = FastAPI()
+
+        @app.post("/bot{token}/{method}")
+        async def call(token: str, method: str, req: Request):
+            body = await req.body()
+            # python-multipart не обязателен: разбираем тело сами
+            if req.headers.get("content-type", "").startswith("application/json"):
+                params = json.loads(body or b"{}")
+            else:
+                params = {k: v[-1] for k, v in urllib.parse.parse_qs(body.decode()).items()}
+            self.calls[method] = self.calls.get(method, 0) + 1
+            if method == "sendMessage":
+                self.in_flight += 1
+                self.max_in_flight = max(self.max_in_flight, self.in_flight)
+            try:
+                if self.latency > 0:
+                    await asyncio.sleep(self.latency)
+            finally:
+                if method == "sendMessage":
+                    self.in_flight -= 1
+
+            if method == "getMe":
+                result: Any = {"id": 1, "is_bot": True, "first_name": "bench", "username": "bench_bot"}
+            elif method in ("sendMessage", "editMessageText"):
+                result = self._message(params)
+            elif method == "getUpdates":
+                # апдейтов нет; пауза вместо long polling, чтобы не крутить цикл
+                await asyncio.sleep(0.5)
+                result = []
+            else:
+                result = True
+
+            if method == "sendMessage":
+                cond = self._condition()
+                async with cond:
+                    self.sent += 1
+                    self.last_sent_at = time.perf_counter()
+                    cond.notify_all()
+            return {"ok": True, "result": result}
+
+        return app
+
+
+class _QuietServer(uvicorn.Server):
+    """uvicorn внутри чужого процесса: сигналы остаются за вызывающим кодом."""
+
+    @contextlib.contextmanager
+    def capture_signals(self):
+        yield
+
+
+@contextlib.asynccontextmanager
+async def serve(app: FastAPI, port: int):
+    """Поднять app на 127.0.0.1:port в текущем event loop на время блока."""
+    server = _QuietServer(uvicorn.Config(app, host="127.0.0.1", port=port,
+                                         log_level="warning", access_log=False, lifespan="off"))
+    task = asyncio.get_running_loop().create_task(server.serve())
+    while not server.started:
+        if task.done():
+            task.result()
+        await asyncio.sleep(0.01)
+    try:
+        yield server
+    finally:
+        server.should_exit = True
+        await task
@@ -0,0 +1,83 @@
+# -*- coding: utf-8 -*-
+"""
+Локальный «стенд» Telegram для режима TG_MODE=webhook без публичного адреса:
+отправляет в бота апдейт так же, как это делает Telegram.
+
+    TG_MODE=webhook TG_WEBHOOK_SECRET=s3cret python server.py
+    python tools/tg_webhook_standin.py --secret s3cret --chat-id 42 /start
+    python tools/tg_webhook_standin.py --secret s3cret --chat-id 42 "/info REG-1"
+    python tools/tg_webhook_standin.py --secret s3cret --chat-id 42 --callback "dept:IDM"
+
+Ответы бота уходят в настоящий Bot API (или в фейковый из tools/bench.py).
+"""
+from __future__ import annotations
+import argparse
+import itertools
+import sys
+import time
+
+import httpx
+
+_ids = itertools.count(int(time.time()))
+
+
+def make_message_update(chat_id: int, text: str, username: str = "standin") -> dict:
+    user = {"id": chat_id, "is_bot": False, "first_name": username, "username": username}
+    msg = {
+        "message_id": next(_ids) % 1_000_000,
+        "date": int(time.time()),
+        "chat": {"id": chat_id, "type": "private", "username": username},
+        "from": user,
+        "text": text,
+    }
+    if text.startswith("/"):
+        cmd_len = len(text.split()[0])
+        msg["entities"] = [{"type": "bot_command", "offset": 0, "length": cmd_len}]
+    return {"update_id": next(_ids), "message": msg}
+
+
+def make_callback_update(chat_id: int, data: str, username: str = "standin") -> dict:
+    user = {"id": chat_id, "is_bot": False, "first_name": username, "username": username}
+    return {
+        "update_id": next(_ids),
+        "callback_query": {
+            "id": str(next(_ids)),
+            "from": user,
+            "chat_instance": str(chat_id),
+            "data": data,
+            "message": {
+                "message_id": next(_ids) % 1_000_000,
+                "date": int(time.time()),
+                "chat": {"id": chat_id, "type": "private"},
+                "from": {"id": 1, "is_bot": True, "first_name": "bot"},
+                "text": "...",
+            },
+        },
+    }
+
+
+def post_update(url: str, update: dict, secret: str = "") -> httpx.Response:
+    headers = {"X-Telegram-Bot-Api-Secret-Token": secret} if secret else {}
+    return httpx.post(url, json=update, headers=headers, timeout=10)
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser(description="Post a fake Telegram update to the bot webhook")
+    ap.add_argument("text", nargs="?", default="/start", help="текст сообщения (по умолчанию /start)")
+    ap.add_argument("--url", default="http://localhost:8081/telegram-webhook")
+    ap.add_argument("--secret", default="", help="значение TG_WEBHOOK_SECRET")
+    ap.add_argument("--chat-id", type=int, default=100500)
+    ap.add_argument("--callback", default="", help="вместо сообщения — callback_query с этими data")
+    args = ap.parse_args()
+
+    if args.callback:
+        update = make_callback_update(args.chat_id, args.callback)
+    else:
+        update = make_message_update(args.chat_id, args.text)
+    r = post_update(args.url, update, args.secret)
+    print(r.status_code, r.text)
+    return 0 if r.is_success else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())